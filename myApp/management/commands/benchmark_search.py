@@ -0,0 +1,74 @@
+"""
+Management command to benchmark vector search latency and recall offline
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from myApp.utils.search_benchmark import PATHS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p95/p99 latency, QPS and recall@k on a synthetic organization (no OpenAI calls)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=1000, help='Synthetic properties (1k to 1M)')
+        parser.add_argument('--queries', type=int, default=200, help='Queries per path')
+        parser.add_argument('--k', type=int, default=5, help='Results per query scored for recall')
+        parser.add_argument('--dimensions', type=int, default=64, help='Embedding dimensions')
+        parser.add_argument('--chunks', type=int, default=1, help='Embedding chunks per property')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the corpus')
+        parser.add_argument(
+            '--path',
+            action='append',
+            choices=PATHS,
+            default=[],
+            help='index (PropertyVectorIndex only), service (search_similar_properties), '
+                 'chat (widget retrieval); repeatable, default all'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--min-recall', type=float, default=None, help='Fail if any path recalls less')
+        parser.add_argument('--max-p95-ms', type=float, default=None, help='Fail if any path has a slower p95')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or list(PATHS)
+
+        def report(done, total):
+            if done == total or done % 50000 == 0:
+                self.stderr.write(f'  seeded {done}/{total} properties')
+
+        reports = run_benchmark(
+            properties=options['properties'],
+            queries=options['queries'],
+            k=options['k'],
+            dimensions=options['dimensions'],
+            chunks=options['chunks'],
+            seed=options['seed'],
+            paths=paths,
+            progress=report,
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(reports, indent=2))
+        else:
+            self.stdout.write(
+                f"N={options['properties']} dims={options['dimensions']} chunks={options['chunks']} "
+                f"queries={options['queries']}"
+            )
+            self.stdout.write(
+                f"{'path':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'QPS':>9} {'recall':>8} {'build ms':>10}"
+            )
+            for path, result in reports.items():
+                self.stdout.write(
+                    f"{path:<8} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                    f"{result['qps']:>9.1f} {result['recall']:>8.3f} {result['build_ms']:>10.1f}"
+                    f"  (recall@{result['k']})"
+                )
+
+        failures = []
+        for path, result in reports.items():
+            if options['min_recall'] is not None and result['recall'] < options['min_recall']:
+                failures.append(f"{path} recall {result['recall']:.3f} < {options['min_recall']}")
+            if options['max_p95_ms'] is not None and result['p95_ms'] > options['max_p95_ms']:
+                failures.append(f"{path} p95 {result['p95_ms']:.2f}ms > {options['max_p95_ms']}ms")
+        if failures:
+            raise CommandError('Benchmark gate failed: ' + '; '.join(failures))
@@ -0,0 +1,50 @@
+"""
+Management command to (re)build property embeddings in batches
+"""
+from django.core.management.base import BaseCommand, CommandError
+from myApp.models import Organization, Property
+from myApp.services_vector import vector_service
+
+
+class Command(BaseCommand):
+    help = 'Embed properties for an organization using batched embedding requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--org',
+            type=str,
+            required=True,
+            help='Organization slug'
+        )
+        parser.add_argument(
+            '--property',
+            type=str,
+            action='append',
+            default=[],
+            help='Only embed this property slug (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['org'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{options['org']}' not found")
+
+        properties = Property.objects.filter(organization=organization)
+        if options['property']:
+            properties = properties.filter(slug__in=options['property'])
+
+        self.stdout.write(f'Embedding {properties.count()} properties for {organization.name}...')
+
+        def report(done, total):
+            self.stdout.write(f'  {done}/{total} chunks embedded')
+
+        results = vector_service.batch_create_embeddings(organization, properties, progress_callback=report)
+
+        failed = [result['property'] for result in results if result['failed']]
+        chunks = sum(result['embeddings_count'] for result in results)
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Stored {chunks} chunks for {len(results) - len(failed)} properties')
+        )
+        for property_obj in failed:
+            self.stdout.write(self.style.ERROR(f'✗ Failed: {property_obj.slug}'))
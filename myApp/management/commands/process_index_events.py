@@ -0,0 +1,48 @@
+"""
+Management command to apply queued property changes to embeddings and search indexes
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from myApp.services_index_worker import index_worker
+
+
+class Command(BaseCommand):
+    help = 'Re-embed changed properties from the PropertyIndexEvent outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of events per batch (default INDEX_EVENT_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new events instead of exiting when the outbox is empty'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep between polls when --loop finds nothing to do'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = index_worker.process_pending(options['limit'])
+            if stats['completed']:
+                self.stdout.write(
+                    f"Processed {stats['events']} events for {stats['properties']} properties "
+                    f"in {stats['organizations']} organizations: "
+                    f"{stats['embedded']} embedded, {stats['removed']} removed, {stats['failed']} failed"
+                )
+                continue
+            if not options['loop']:
+                if stats['events']:
+                    self.stdout.write(self.style.WARNING(f"{stats['events']} events failed and will be retried"))
+                else:
+                    self.stdout.write(self.style.SUCCESS('✓ Index outbox drained'))
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+"""
+Management command to (re)create the property text search index
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from myApp.services_text_search import install_text_index, text_search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the property text index, e.g. after a migration rebuilt the property table on SQLite'
+
+    def handle(self, *args, **options):
+        backend = install_text_index(connection)
+        text_search.reset()
+        if backend == 'like':
+            self.stdout.write(self.style.WARNING('No text index available on this database; searches use LIKE scans'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt the property text index ({backend})'))
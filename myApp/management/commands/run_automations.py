@@ -2,7 +2,7 @@
 Management command to run background automation tasks
 """
 from django.core.management.base import BaseCommand
-from myApp.tasks import process_email_sequences, process_webhook_outbox
+from myApp.tasks import process_email_sequences, process_property_index_events, process_webhook_outbox
 
 
 class Command(BaseCommand):
@@ -12,7 +12,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--task',
             type=str,
-            choices=['email', 'webhooks', 'all'],
+            choices=['email', 'webhooks', 'index', 'all'],
             default='all',
             help='Which task to run',
         )
@@ -43,3 +43,15 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.ERROR(f'✗ Error processing webhooks: {e}')
                 )
+        
+        if task == 'index' or task == 'all':
+            self.stdout.write('Processing property index events...')
+            try:
+                result = process_property_index_events()
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ Processed {result} property index events')
+                )
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'✗ Error processing index events: {e}')
+                )
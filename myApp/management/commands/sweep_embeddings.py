@@ -0,0 +1,52 @@
+"""
+Management command to bring an organization's embeddings in line with its listings
+"""
+from django.core.management.base import BaseCommand, CommandError
+from myApp.models import Organization, Property
+from myApp.services_vector import vector_service
+
+
+class Command(BaseCommand):
+    help = 'Re-embed only the property chunks whose canonical text changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--org',
+            type=str,
+            required=True,
+            help='Organization slug'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without calling the embeddings API'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['org'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{options['org']}' not found")
+
+        properties = list(Property.objects.filter(organization=organization))
+        self.stdout.write(f'Sweeping {len(properties)} properties for {organization.name}...')
+
+        if options['dry_run']:
+            pending, work = vector_service.plan_property_embeddings(properties)
+            total = sum(len(state['hashes']) for state in pending.values())
+            missing = sum(len(waiters) for _, _, waiters in work)
+            self.stdout.write(f'  would skip:   {total - missing} chunks')
+            self.stdout.write(f'  would embed:  {missing} chunks ({len(work)} distinct texts)')
+            return
+
+        stats = {}
+        results = vector_service.batch_create_embeddings(organization, properties, stats=stats)
+        failed = sum(1 for result in results if result['failed'])
+
+        self.stdout.write(f"  skipped: {stats.get('skipped', 0)} chunks")
+        self.stdout.write(f"  updated: {stats.get('updated', 0)} chunks")
+        self.stdout.write(f"  deleted: {stats.get('deleted', 0)} chunks")
+        if failed:
+            self.stdout.write(self.style.ERROR(f'✗ {failed} properties failed and kept their previous embeddings'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Sweep complete'))
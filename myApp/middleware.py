@@ -1,36 +1,42 @@
 """
 Custom middleware for multi-tenancy and authentication
+
+Everything here runs in both sync (WSGI) and async (ASGI) chains. The
+project middleware are MiddlewareMixin subclasses, so under ASGI Django
+runs their process_request / process_response through sync_to_async and
+awaits async views such as chat_api_ask directly, instead of wrapping the
+whole chain in one thread and serializing chat requests again. WhiteNoise
+is sync-only in the pinned version; the subclass at the bottom adds the
+async path for it. allauth's AccountMiddleware stays sync-only (allauth
+insists on its own dotted path in MIDDLEWARE), which costs one adapted hop.
 """
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.shortcuts import redirect
 from django.contrib.auth import logout
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject, empty
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
 from .services import CompanyService
 from .utils.logging_config import get_company_logger, mask_pii
+from .utils.query_budget import QueryBudgetExceeded, QueryRecorder
 import uuid
 
 
-class CompanyContextMiddleware:
+class CompanyContextMiddleware(MiddlewareMixin):
     """Middleware to set company context on every request"""
     
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
-        # Set company context
-        request.company = CompanyService.get_company_from_request(request)
-        
-        response = self.get_response(request)
-        return response
+    def process_request(self, request):
+        # Set company context; resolved on first use so public pages that never read it skip the query
+        request.company = SimpleLazyObject(lambda: CompanyService.get_company_from_request(request))
 
 
-class WizardGatingMiddleware:
+class WizardGatingMiddleware(MiddlewareMixin):
     """Middleware to enforce wizard completion for authenticated users"""
     
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
+    def process_request(self, request):
         # Only apply to authenticated users
         if request.user.is_authenticated:
             # Check if user has completed Step 1 (company setup)
@@ -39,12 +45,10 @@ class WizardGatingMiddleware:
                 # Redirect to setup if no company access
                 if not request.path.startswith('/setup/') and not request.path.startswith('/logout/'):
                     return redirect('/setup/')
-        
-        response = self.get_response(request)
-        return response
+        return None
 
 
-class LoginRequiredMiddleware:
+class LoginRequiredMiddleware(MiddlewareMixin):
     """Middleware to protect internal routes"""
     
     # Routes that require authentication
@@ -73,10 +77,7 @@ class LoginRequiredMiddleware:
         '/password-reset',
     ]
     
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
+    def process_request(self, request):
         # Check if route is protected
         is_protected = any(request.path.startswith(route) for route in self.PROTECTED_ROUTES)
         is_public = any(request.path.startswith(route) for route in self.PUBLIC_ROUTES)
@@ -89,31 +90,37 @@ class LoginRequiredMiddleware:
         if is_public:
             pass  # Allow access
         
-        response = self.get_response(request)
-        return response
+        return None
 
 
-class RequestLoggingMiddleware:
+class RequestLoggingMiddleware(MiddlewareMixin):
     """Middleware for structured request logging"""
     
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.logger = get_company_logger('request')
     
-    def __call__(self, request):
+    @staticmethod
+    def _company_id(request):
+        """Company id if the request has resolved its company; logging alone never triggers the lookup"""
+        company = getattr(request, 'company', None)
+        if isinstance(company, SimpleLazyObject) and company._wrapped is empty:
+            return None
+        return str(company.id) if company else None
+    
+    def process_request(self, request):
         # Generate correlation ID
         correlation_id = str(uuid.uuid4())
         request.correlation_id = correlation_id
         
         # Get company context
-        company_id = None
-        if hasattr(request, 'company') and request.company:
-            company_id = str(request.company.id)
+        company_id = self._company_id(request)
         
         # Get user context
         user_id = None
         if hasattr(request, 'user') and request.user.is_authenticated:
             user_id = str(request.user.id)
+        request.logging_user_id = user_id
         
         # Log request
         self.logger.info(
@@ -127,22 +134,133 @@ class RequestLoggingMiddleware:
             user_agent=request.META.get('HTTP_USER_AGENT', '')[:100]
         )
         
-        # Process request
-        start_time = timezone.now()
-        response = self.get_response(request)
-        end_time = timezone.now()
+        request.logging_started_at = timezone.now()
+        return None
+    
+    def process_response(self, request, response):
+        if not hasattr(request, 'logging_started_at'):
+            # Answered by a middleware above this one before process_request ran
+            return response
         
         # Log response
-        duration_ms = (end_time - start_time).total_seconds() * 1000
+        duration_ms = (timezone.now() - request.logging_started_at).total_seconds() * 1000
         self.logger.info(
             f"Response: {response.status_code}",
-            company_id=company_id,
-            user_id=user_id,
+            company_id=self._company_id(request),
+            user_id=request.logging_user_id,
             route=request.path,
             action=request.method,
             status=response.status_code,
-            correlation_id=correlation_id,
+            correlation_id=request.correlation_id,
             duration_ms=round(duration_ms, 2)
         )
         
         return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Record each request's queries and check them against the view's budget
+
+    QUERY_BUDGET_MODE is 'raise' (fail the request, used under ``manage.py
+    test``), 'log' (warn, the DEBUG default) or 'off'. Views declare limits
+    with ``@query_budget``; others get QUERY_BUDGET_DEFAULT and
+    QUERY_BUDGET_MAX_REPEATS. Queries made by middleware below this one count
+    towards the budget.
+
+    A streaming response's queries run while the server consumes it, after
+    this middleware has returned. Sync streams are wrapped so those queries
+    are recorded too and checked once the stream ends; X-Query-Count only
+    covers the queries made before streaming started.
+
+    Only sync chains (WSGI, the test client) are recorded. Under ASGI the
+    queries run in sync_to_async threads this middleware cannot see, so it
+    passes requests straight through.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.logger = get_company_logger('query_budget')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        mode = settings.QUERY_BUDGET_MODE
+        if mode == 'off':
+            return self.get_response(request)
+        
+        request.query_budget = (settings.QUERY_BUDGET_DEFAULT, settings.QUERY_BUDGET_MAX_REPEATS)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(len(recorder))
+        
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._record_stream(request, recorder, response.streaming_content, mode)
+        else:
+            self._check(request, recorder, mode)
+        return response
+    
+    def _record_stream(self, request, recorder, content, mode):
+        """Yield the stream's chunks, recording the queries made producing each, then check the total"""
+        chunks = iter(content)
+        while True:
+            with recorder:
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+        self._check(request, recorder, mode)
+    
+    def _check(self, request, recorder, mode):
+        max_queries, max_repeats = request.query_budget
+        problems = recorder.problems(max_queries, max_repeats)
+        if problems:
+            message = f"Query budget exceeded for {request.method} {request.path}: " + '; '.join(problems)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message + '\n' + recorder.report())
+            self.logger.warning(
+                message,
+                route=request.path,
+                action=request.method,
+                correlation_id=getattr(request, 'correlation_id', None),
+            )
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        declared = getattr(view_func, 'query_budget', None)
+        if declared is not None:
+            max_queries, max_repeats = declared
+            if max_repeats is None:
+                max_repeats = settings.QUERY_BUDGET_MAX_REPEATS
+            request.query_budget = (max_queries, max_repeats)
+        return None
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise with an async path; static files are still served from a sync file iterator"""
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+    
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -1,27 +1,24 @@
 """
 Organization middleware for multi-tenancy
+
+MiddlewareMixin subclasses, so they run in both sync and async (ASGI) chains.
 """
 from django.shortcuts import redirect
 from django.contrib.auth import logout
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
 from .models import Organization, Membership
 from .utils.logging_config import get_company_logger, mask_pii
 import uuid
 
 
-class OrganizationContextMiddleware:
+class OrganizationContextMiddleware(MiddlewareMixin):
     """Middleware to set organization context on every request"""
     
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
+    def process_request(self, request):
         # Set organization context
         request.organization = self.get_organization_from_request(request)
-        
-        response = self.get_response(request)
-        return response
     
     def get_organization_from_request(self, request):
         """Resolve organization from session or subdomain"""
@@ -75,7 +72,7 @@ class OrganizationContextMiddleware:
         return None
 
 
-class OrganizationRequiredMiddleware:
+class OrganizationRequiredMiddleware(MiddlewareMixin):
     """Middleware to enforce organization access for protected routes"""
     
     # Routes that require organization context
@@ -105,10 +102,7 @@ class OrganizationRequiredMiddleware:
         '/chat/',  # Public chat URLs
     ]
     
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
+    def process_request(self, request):
         # Check if route is protected
         is_protected = any(request.path.startswith(route) for route in self.PROTECTED_ROUTES)
         is_public = any(request.path.startswith(route) for route in self.PUBLIC_ROUTES)
@@ -120,17 +114,13 @@ class OrganizationRequiredMiddleware:
                 if not request.path.startswith('/onboarding'):
                     return redirect('/onboarding')
         
-        response = self.get_response(request)
-        return response
+        return None
 
 
-class OrganizationPermissionsMiddleware:
+class OrganizationPermissionsMiddleware(MiddlewareMixin):
     """Middleware to check organization permissions"""
     
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
-    def __call__(self, request):
+    def process_request(self, request):
         # Add permission helpers to request
         if hasattr(request, 'organization') and request.organization:
             request.is_org_owner = self.check_role(request, 'owner')
@@ -140,9 +130,6 @@ class OrganizationPermissionsMiddleware:
             request.is_org_owner = False
             request.is_org_admin = False
             request.is_org_member = False
-        
-        response = self.get_response(request)
-        return response
     
     def check_role(self, request, roles):
         """Check if user has any of the specified roles in the organization"""
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0009_alter_messagelog_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyembedding',
+            name='vector',
+            field=models.BinaryField(blank=True, help_text='Packed little-endian vector', null=True),
+        ),
+        migrations.AddField(
+            model_name='propertyembedding',
+            name='vector_dims',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='propertyembedding',
+            name='vector_dtype',
+            field=models.CharField(choices=[('float32', 'float32'), ('float16', 'float16'), ('int8', 'int8 (per-row scale)')], default='float32', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='propertyembedding',
+            name='vector_scale',
+            field=models.FloatField(default=1.0, help_text='Dequantization scale for int8 vectors'),
+        ),
+        migrations.AlterField(
+            model_name='propertyembedding',
+            name='embedding',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
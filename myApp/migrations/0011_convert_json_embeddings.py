@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.db import migrations
+
+from myApp.utils import vector_storage
+
+BATCH_SIZE = 500
+
+
+def pack_json_embeddings(apps, schema_editor):
+    """Move legacy JSON vectors into the packed binary column"""
+    PropertyEmbedding = apps.get_model('myApp', 'PropertyEmbedding')
+    dtype = getattr(settings, 'EMBEDDING_STORAGE_DTYPE', vector_storage.FLOAT32)
+
+    pending = []
+    rows = PropertyEmbedding.objects.filter(vector__isnull=True, embedding__isnull=False)
+    for row in rows.only('id', 'embedding').iterator(chunk_size=BATCH_SIZE):
+        row.vector, row.vector_dims, row.vector_scale = vector_storage.encode_vector(row.embedding, dtype)
+        row.vector_dtype = dtype
+        row.embedding = None
+        pending.append(row)
+        if len(pending) >= BATCH_SIZE:
+            PropertyEmbedding.objects.bulk_update(
+                pending, ['vector', 'vector_dims', 'vector_scale', 'vector_dtype', 'embedding']
+            )
+            pending = []
+
+    if pending:
+        PropertyEmbedding.objects.bulk_update(
+            pending, ['vector', 'vector_dims', 'vector_scale', 'vector_dtype', 'embedding']
+        )
+
+
+def unpack_binary_embeddings(apps, schema_editor):
+    """Restore JSON vectors so the previous schema keeps working"""
+    PropertyEmbedding = apps.get_model('myApp', 'PropertyEmbedding')
+
+    pending = []
+    rows = PropertyEmbedding.objects.filter(vector__isnull=False)
+    for row in rows.only('id', 'vector', 'vector_dtype', 'vector_scale').iterator(chunk_size=BATCH_SIZE):
+        row.embedding = vector_storage.decode_vector(row.vector, row.vector_dtype, row.vector_scale).tolist()
+        pending.append(row)
+        if len(pending) >= BATCH_SIZE:
+            PropertyEmbedding.objects.bulk_update(pending, ['embedding'])
+            pending = []
+
+    if pending:
+        PropertyEmbedding.objects.bulk_update(pending, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0010_propertyembedding_binary_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_json_embeddings, unpack_binary_embeddings),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0011_convert_json_embeddings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyembedding',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the model name and chunk text', max_length=64),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0012_propertyembedding_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Archived properties are hidden from public search and chat'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['organization', 'is_active'], name='property_org_active_idx'),
+        ),
+    ]
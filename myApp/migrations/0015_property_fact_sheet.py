@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0014_propertyindexevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='fact_sheet',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='fact_sheet_version',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
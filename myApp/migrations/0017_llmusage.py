@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0016_conversation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('call_site', models.CharField(max_length=50)),
+                ('period_start', models.DateTimeField(help_text='Start of the hour these calls fall in')),
+                ('requests', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('latency_ms_total', models.BigIntegerField(default=0)),
+                ('latency_histogram', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='myApp.organization')),
+            ],
+            options={
+                'ordering': ['-period_start'],
+                'indexes': [models.Index(fields=['organization', 'period_start'], name='myApp_llmus_organiz_41896e_idx')],
+                'unique_together': {('organization', 'call_site', 'period_start')},
+            },
+        ),
+    ]
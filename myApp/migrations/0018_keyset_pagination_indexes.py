@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0017_llmusage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='lead_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['organization', 'created_at', 'id'], name='property_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['organization', 'price_amount', 'id'], name='property_org_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['organization', 'beds', 'id'], name='property_org_beds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['organization', 'title', 'id'], name='property_org_title_idx'),
+        ),
+    ]
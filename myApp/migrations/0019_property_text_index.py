@@ -0,0 +1,77 @@
+import sqlite3
+
+from django.db import migrations
+
+# The SQL is frozen here rather than imported from myApp.services_text_search,
+# so later changes to the service cannot change what this migration does
+TEXT_FIELDS = ('title', 'area', 'city', 'description', 'badges')
+COLUMNS = ', '.join(TEXT_FIELDS)
+INSERT_NEW = (
+    f'INSERT INTO myApp_property_fts(rowid, property_id, {COLUMNS}) '
+    f"VALUES (NEW.rowid, NEW.id, {', '.join(f'NEW.{field}' for field in TEXT_FIELDS)});"
+)
+
+POSTGRES_FORWARD = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS property_{field}_trgm_idx ON "myApp_property" USING gin ((UPPER("{field}"::text)) gin_trgm_ops)'
+    for field in TEXT_FIELDS
+]
+POSTGRES_REVERSE = [f'DROP INDEX IF EXISTS property_{field}_trgm_idx' for field in TEXT_FIELDS]
+
+# FTS rows share the property's rowid, so trigger updates and deletes are key lookups
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE myApp_property_fts USING fts5(property_id UNINDEXED, {COLUMNS}, tokenize='trigram')",
+    f'CREATE TRIGGER myApp_property_fts_insert AFTER INSERT ON "myApp_property" BEGIN {INSERT_NEW} END',
+    f'CREATE TRIGGER myApp_property_fts_update AFTER UPDATE OF {COLUMNS} ON "myApp_property" BEGIN '
+    f'DELETE FROM myApp_property_fts WHERE rowid = OLD.rowid; {INSERT_NEW} END',
+    'CREATE TRIGGER myApp_property_fts_delete AFTER DELETE ON "myApp_property" BEGIN '
+    'DELETE FROM myApp_property_fts WHERE rowid = OLD.rowid; END',
+    f'INSERT INTO myApp_property_fts(rowid, property_id, {COLUMNS}) SELECT rowid, id, {COLUMNS} FROM "myApp_property"',
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS myApp_property_fts_insert',
+    'DROP TRIGGER IF EXISTS myApp_property_fts_update',
+    'DROP TRIGGER IF EXISTS myApp_property_fts_delete',
+    'DROP TABLE IF EXISTS myApp_property_fts',
+]
+
+
+def fts5_trigram_supported(connection):
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def run(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def create_text_index(apps, schema_editor):
+    """Trigram GIN indexes on Postgres; an FTS5 trigram table kept in sync by triggers on SQLite"""
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        run(connection, POSTGRES_FORWARD)
+    elif connection.vendor == 'sqlite' and fts5_trigram_supported(connection):
+        run(connection, SQLITE_REVERSE + SQLITE_FORWARD)
+
+
+def remove_text_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        run(connection, POSTGRES_REVERSE)
+    elif connection.vendor == 'sqlite':
+        run(connection, SQLITE_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0018_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_text_index, remove_text_index),
+    ]
@@ -0,0 +1,67 @@
+import sqlite3
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Frozen copy of the SQLite text index SQL from 0019
+TEXT_FIELDS = ('title', 'area', 'city', 'description', 'badges')
+COLUMNS = ', '.join(TEXT_FIELDS)
+INSERT_NEW = (
+    f'INSERT INTO myApp_property_fts(rowid, property_id, {COLUMNS}) '
+    f"VALUES (NEW.rowid, NEW.id, {', '.join(f'NEW.{field}' for field in TEXT_FIELDS)});"
+)
+
+# FTS rows share the property's rowid, so trigger updates and deletes are key lookups
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE myApp_property_fts USING fts5(property_id UNINDEXED, {COLUMNS}, tokenize='trigram')",
+    f'CREATE TRIGGER myApp_property_fts_insert AFTER INSERT ON "myApp_property" BEGIN {INSERT_NEW} END',
+    f'CREATE TRIGGER myApp_property_fts_update AFTER UPDATE OF {COLUMNS} ON "myApp_property" BEGIN '
+    f'DELETE FROM myApp_property_fts WHERE rowid = OLD.rowid; {INSERT_NEW} END',
+    'CREATE TRIGGER myApp_property_fts_delete AFTER DELETE ON "myApp_property" BEGIN '
+    'DELETE FROM myApp_property_fts WHERE rowid = OLD.rowid; END',
+    f'INSERT INTO myApp_property_fts(rowid, property_id, {COLUMNS}) SELECT rowid, id, {COLUMNS} FROM "myApp_property"',
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS myApp_property_fts_insert',
+    'DROP TRIGGER IF EXISTS myApp_property_fts_update',
+    'DROP TRIGGER IF EXISTS myApp_property_fts_delete',
+    'DROP TABLE IF EXISTS myApp_property_fts',
+]
+
+
+def fts5_trigram_supported(connection):
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def run(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def reinstall_text_index(apps, schema_editor):
+    """SQLite rebuilds the table to add the column, which drops the FTS triggers and renumbers rowids"""
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and fts5_trigram_supported(connection):
+        run(connection, SQLITE_REVERSE + SQLITE_FORWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0019_property_text_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(reinstall_text_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-17 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0020_property_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyindexevent',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='propertyindexevent',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myApp', '0021_index_event_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyindexevent',
+            name='available_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.core import validators
 from django.contrib.auth.models import User
 
+from .utils import vector_storage
+
 
 class Company(models.Model):
     """Multi-tenant company entity for row-level security"""
@@ -43,6 +45,7 @@ class Property(models.Model):
     badges = models.CharField(max_length=128, blank=True)
     affiliate_source = models.CharField(max_length=64, blank=True)
     commissionable = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True, help_text='Archived properties are hidden from public search and chat')
     
     # Property IQ enrichment fields
     narrative = models.TextField(blank=True, help_text='AI-generated property analysis')
@@ -51,14 +54,32 @@ class Property(models.Model):
     last_updated = models.DateTimeField(null=True, blank=True, help_text='Last enrichment update')
     source = models.CharField(max_length=50, blank=True, help_text='Data source (rentcast, etc.)')
     
+    # Prompt-ready summary, re-rendered on save (services_fact_sheets)
+    fact_sheet = models.TextField(blank=True, editable=False)
+    fact_sheet_version = models.CharField(max_length=16, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['organization', 'is_active'], name='property_org_active_idx'),
+            # Keyset pagination on the dashboard sort keys (utils/keyset_pagination.py)
+            models.Index(fields=['organization', 'created_at', 'id'], name='property_org_created_idx'),
+            models.Index(fields=['organization', 'price_amount', 'id'], name='property_org_price_idx'),
+            models.Index(fields=['organization', 'beds', 'id'], name='property_org_beds_idx'),
+            models.Index(fields=['organization', 'title', 'id'], name='property_org_title_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.city})"
 
+    @property
+    def cache_version(self) -> str:
+        """Changes on every save; keys cached page fragments and ETags"""
+        return f"{self.updated_at.timestamp():.6f}" if self.updated_at else "0"
+
 
 class Lead(models.Model):
     RENT = "rent"
@@ -92,6 +113,10 @@ class Lead(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of the leads page (utils/keyset_pagination.py)
+            models.Index(fields=['company', 'created_at', 'id'], name='lead_company_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} ({self.phone})"
@@ -640,7 +665,13 @@ class PropertyEmbedding(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE)
     doc_id = models.CharField(max_length=100)
     chunk = models.IntegerField()
-    embedding = models.JSONField()
+    # Legacy JSON list of floats; new rows store the packed `vector` instead
+    embedding = models.JSONField(null=True, blank=True)
+    vector = models.BinaryField(null=True, blank=True, help_text='Packed little-endian vector')
+    vector_dtype = models.CharField(max_length=10, choices=vector_storage.DTYPE_CHOICES, default=vector_storage.FLOAT32)
+    vector_dims = models.IntegerField(default=0)
+    vector_scale = models.FloatField(default=1.0, help_text='Dequantization scale for int8 vectors')
+    content_hash = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the model name and chunk text')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -653,6 +684,52 @@ class PropertyEmbedding(models.Model):
     def __str__(self) -> str:
         return f"{self.property.title} - Chunk {self.chunk}"
 
+    def set_vector(self, values, dtype=None):
+        """Pack a vector into binary storage and clear the legacy JSON copy"""
+        from django.conf import settings
+        dtype = dtype or settings.EMBEDDING_STORAGE_DTYPE
+        self.vector, self.vector_dims, self.vector_scale = vector_storage.encode_vector(values, dtype)
+        self.vector_dtype = dtype
+        self.embedding = None
+
+    def get_vector(self):
+        """Return the vector as a float32 NumPy array"""
+        if self.vector:
+            return vector_storage.decode_vector(self.vector, self.vector_dtype, self.vector_scale)
+        return vector_storage.decode_vector(vector_storage.encode_vector(self.embedding or [])[0])
+
+
+class PropertyIndexEvent(models.Model):
+    """Outbox of property changes waiting to be applied to embeddings and search indexes"""
+    KIND_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    # Not a foreign key: delete events must outlive the property row
+    property_id = models.UUIDField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='upsert')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Batch token of the worker processing the event; the claim lapses after INDEX_EVENT_CLAIM_SECONDS
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # Failed events are not claimed again before this (exponential backoff)
+    available_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['processed_at', 'id']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.property_id} ({'done' if self.processed_at else 'pending'})"
+
 
 class WebhookOutbox(models.Model):
     """Outbox pattern for reliable webhook delivery"""
@@ -690,3 +767,69 @@ class WebhookOutbox(models.Model):
         return f"{self.event_kind} -> {self.target} ({self.status})"
 
 
+
+
+class Conversation(models.Model):
+    """Chat transcript kept server-side; the visitor's session only holds its id"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
+    channel = models.CharField(max_length=30, default='webhook_chat')
+    session_key = models.CharField(max_length=40, blank=True)
+    # Next turn sequence number; turns below next_seq - CONVERSATION_MAX_TURNS are pruned
+    next_seq = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self) -> str:
+        return f"{self.channel} conversation {self.id}"
+
+
+class ConversationTurn(models.Model):
+    """One append-only message of a Conversation"""
+    ROLE_CHOICES = [
+        ('user', 'User'),
+        ('assistant', 'Assistant'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='turns')
+    seq = models.IntegerField()
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['conversation', 'seq']
+        unique_together = [['conversation', 'seq']]
+
+    def __str__(self) -> str:
+        return f"{self.role} #{self.seq}"
+
+
+class LLMUsage(models.Model):
+    """Hourly LLM usage per organization and call site, flushed in batches by services_llm_usage"""
+    id = models.BigAutoField(primary_key=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
+    call_site = models.CharField(max_length=50)
+    period_start = models.DateTimeField(help_text='Start of the hour these calls fall in')
+    requests = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    latency_ms_total = models.BigIntegerField(default=0)
+    # Call counts per services_llm_usage.LATENCY_BUCKETS_MS upper bound, plus one overflow bucket
+    latency_histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-period_start']
+        unique_together = [['organization', 'call_site', 'period_start']]
+        indexes = [
+            models.Index(fields=['organization', 'period_start']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.call_site} @ {self.period_start:%Y-%m-%d %H:00} ({self.requests} calls)"
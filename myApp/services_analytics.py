@@ -35,6 +35,9 @@ class AnalyticsService:
         # Conversion metrics
         metrics['conversions'] = self.get_conversion_metrics(organization, start_date, end_date)
         
+        # LLM usage metrics
+        metrics['llm'] = self.get_llm_metrics(organization, start_date)
+        
         return metrics
     
     def get_lead_metrics(self, organization, start_date, end_date):
@@ -118,6 +121,22 @@ class AnalyticsService:
             'daily_activity': list(daily_chats)
         }
     
+    def get_llm_metrics(self, organization, start_date):
+        """Get LLM tokens, latency and errors per call site"""
+        from .services_llm_usage import llm_usage
+        
+        call_sites = llm_usage.breakdown(organization, since=start_date)
+        requests = sum(site['requests'] for site in call_sites)
+        errors = sum(site['errors'] for site in call_sites)
+        
+        return {
+            'requests': requests,
+            'errors': errors,
+            'error_rate': (errors / requests * 100) if requests > 0 else 0,
+            'total_tokens': sum(site['total_tokens'] for site in call_sites),
+            'call_sites': call_sites
+        }
+    
     def get_campaign_metrics(self, organization, start_date, end_date):
         """Get campaign-related metrics"""
         campaigns = Campaign.objects.filter(organization=organization)
@@ -304,18 +323,18 @@ class AnalyticsService:
     
     def get_campaign_performance_data(self, organization, start_date, end_date):
         """Get campaign performance data for chart"""
-        campaigns = Campaign.objects.filter(organization=organization)
+        in_range = Q(message_logs__sent_at__range=[start_date, end_date])
+        campaigns = Campaign.objects.filter(organization=organization).annotate(
+            total_sent=Count('message_logs', filter=in_range),
+            total_opened=Count('message_logs', filter=in_range & Q(message_logs__status='opened')),
+            total_clicked=Count('message_logs', filter=in_range & Q(message_logs__status='clicked')),
+        )
         
         campaign_data = []
         for campaign in campaigns:
-            message_logs = MessageLog.objects.filter(
-                campaign=campaign,
-                created_at__range=[start_date, end_date]
-            )
-            
-            total_sent = message_logs.count()
-            total_opened = message_logs.filter(status='opened').count()
-            total_clicked = message_logs.filter(status='clicked').count()
+            total_sent = campaign.total_sent
+            total_opened = campaign.total_opened
+            total_clicked = campaign.total_clicked
             
             campaign_data.append({
                 'name': campaign.name,
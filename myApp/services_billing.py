@@ -262,18 +262,16 @@ class BillingService:
     
     def get_current_usage(self, organization, resource_type):
         """Get current usage for a resource type"""
-        from .models import Property, Event, Membership
+        from .models import Property, Membership
         
         if resource_type == 'listings':
             return Property.objects.filter(organization=organization).count()
-        elif resource_type == 'ai_calls':
-            # Count AI-related events in the last 30 days
-            thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-            return Event.objects.filter(
-                organization=organization,
-                kind__in=['chat.message_agent', 'property.enriched'],
-                created_at__gte=thirty_days_ago
-            ).count()
+        elif resource_type in ('ai_calls', 'ai_tokens'):
+            # LLM calls / tokens in the last 30 days, from the aggregated usage rows;
+            # failed calls (including ones refused before dispatch) don't count against the quota
+            from .services_llm_usage import llm_usage
+            totals = llm_usage.totals(organization, since=timezone.now() - timezone.timedelta(days=30))
+            return totals['requests'] - totals['errors'] if resource_type == 'ai_calls' else totals['total_tokens']
         elif resource_type == 'seats':
             return Membership.objects.filter(
                 organization=organization,
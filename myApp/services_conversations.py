@@ -0,0 +1,100 @@
+"""
+Server-side store for chat transcripts
+
+Chat views used to keep the whole transcript in ``request.session``, so the
+session row grew with every turn and each request re-serialized all of it.
+Transcripts now live in Conversation/ConversationTurn rows:
+
+    - turns are append-only, numbered per conversation
+    - reads return a window of the last N turns
+    - each conversation keeps at most CONVERSATION_MAX_TURNS turns of at most
+      CONVERSATION_MAX_TURN_CHARS characters; older turns are pruned on append
+
+The session only stores the conversation id, so its size stays constant.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Conversation, ConversationTurn
+
+SESSION_KEY = 'conversation_id'
+
+
+class ConversationStore:
+    """Append-only chat transcripts with windowed reads and a per-conversation cap"""
+
+    def __init__(self, max_turns=None, max_turn_chars=None, window=None):
+        self.max_turns = max_turns or settings.CONVERSATION_MAX_TURNS
+        self.max_turn_chars = max_turn_chars or settings.CONVERSATION_MAX_TURN_CHARS
+        self.window = window or settings.CONVERSATION_WINDOW_TURNS
+
+    def start(self, session=None, channel='webhook_chat', organization=None):
+        """Begin a new conversation and, given a session, make it the session's current one"""
+        conversation = Conversation.objects.create(
+            organization=organization,
+            channel=channel,
+            session_key=(session.session_key or '') if session is not None else '',
+        )
+        if session is not None:
+            session[SESSION_KEY] = str(conversation.id)
+        return conversation.id
+
+    def for_session(self, session, channel='webhook_chat', organization=None):
+        """The session's current conversation id, starting one if it has none"""
+        conversation_id = session.get(SESSION_KEY)
+        if conversation_id and Conversation.objects.filter(pk=conversation_id).exists():
+            return conversation_id
+        return self.start(session, channel=channel, organization=organization)
+
+    def append(self, conversation_id, *turns):
+        """
+        Append (role, content) turns in one transaction
+
+        Returns the sequence numbers assigned to the turns.
+        """
+        if not turns:
+            return []
+        with transaction.atomic():
+            # Lock the conversation row so concurrent appends get distinct numbers
+            first = Conversation.objects.select_for_update().values_list('next_seq', flat=True).get(pk=conversation_id)
+            ConversationTurn.objects.bulk_create([
+                ConversationTurn(
+                    conversation_id=conversation_id,
+                    seq=first + offset,
+                    role=role,
+                    content=(content or '')[:self.max_turn_chars],
+                )
+                for offset, (role, content) in enumerate(turns)
+            ])
+            next_seq = first + len(turns)
+            Conversation.objects.filter(pk=conversation_id).update(next_seq=F('next_seq') + len(turns))
+            if next_seq > self.max_turns:
+                ConversationTurn.objects.filter(
+                    conversation_id=conversation_id, seq__lt=next_seq - self.max_turns,
+                ).delete()
+        return list(range(first, next_seq))
+
+    async def astart(self, session=None, channel='webhook_chat', organization=None):
+        return await sync_to_async(self.start)(session, channel=channel, organization=organization)
+
+    async def afor_session(self, session, channel='webhook_chat', organization=None):
+        return await sync_to_async(self.for_session)(session, channel=channel, organization=organization)
+
+    async def aappend(self, conversation_id, *turns):
+        return await sync_to_async(self.append)(conversation_id, *turns)
+
+    def recent(self, conversation_id, limit=None):
+        """The last ``limit`` turns (default CONVERSATION_WINDOW_TURNS), oldest first"""
+        turns = list(
+            ConversationTurn.objects.filter(conversation_id=conversation_id)
+            .order_by('-seq')
+            .values('seq', 'role', 'content', 'created_at')[:limit or self.window]
+        )
+        turns.reverse()
+        return turns
+
+
+# Global instance
+conversation_store = ConversationStore()
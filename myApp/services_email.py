@@ -56,13 +56,19 @@ class EmailCampaignService:
                 status__in=['new', 'contacted', 'qualified']
             )
         
+        # Every lead gets the same first step; look it up once rather than per lead
+        first_step = campaign.steps.first()
+        if first_step:
+            subject = first_step.subject
+            body_template = first_step.body_template
+        else:
+            subject = "Message from " + campaign.organization.name
+            body_template = "Hello {{ lead.name }}, thank you for your interest!"
+        
         results = []
         for lead in leads:
             try:
                 # Render email content
-                subject = campaign.steps.first().subject if campaign.steps.exists() else "Message from " + campaign.organization.name
-                body_template = campaign.steps.first().body_template if campaign.steps.exists() else "Hello {{ lead.name }}, thank you for your interest!"
-                
                 rendered_subject = self.render_template(subject, {'lead': lead, 'organization': campaign.organization})
                 rendered_body = self.render_template(body_template, {'lead': lead, 'organization': campaign.organization})
                 
@@ -0,0 +1,220 @@
+"""
+Embedding providers behind one interface
+
+VectorEmbeddingService only ever calls ``provider.embed(texts)``. Which
+backend answers is chosen by EMBEDDING_PROVIDER:
+
+    openai   OpenAI embeddings API (default)
+    local    in-process sentence-transformers model, no network
+    http     OpenAI-compatible /embeddings endpoint (TEI, llama.cpp, Ollama...)
+    hashing  deterministic feature hashing; offline tests and CI
+
+The provider's ``model`` name is part of every chunk's content hash, so
+switching providers or models re-embeds everything on the next sweep
+instead of mixing incompatible vectors.
+"""
+import hashlib
+import logging
+import re
+
+import numpy as np
+import openai
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider:
+    """Base class: turn a list of texts into a list of equal-length float vectors"""
+
+    name = ''
+
+    def __init__(self, model, dimensions):
+        self.model = model
+        self.dimensions = dimensions
+
+    @property
+    def available(self):
+        """False when the backend is known to be unusable (e.g. missing credentials)"""
+        return True
+
+    def embed(self, texts):
+        """Return one vector (list of floats) per text, in input order"""
+        raise NotImplementedError
+
+    async def aembed(self, texts):
+        """embed() for async views; backends without an async client run it in a worker thread"""
+        return await sync_to_async(self.embed, thread_sensitive=False)(texts)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = 'openai'
+
+    # Native output sizes; anything else is requested via the `dimensions` parameter
+    NATIVE_DIMENSIONS = {
+        'text-embedding-3-small': 1536,
+        'text-embedding-3-large': 3072,
+        'text-embedding-ada-002': 1536,
+    }
+
+    def __init__(self, model=None, dimensions=None, client=None):
+        super().__init__(model or settings.EMBEDDING_MODEL, dimensions or settings.VECTOR_DIMENSIONS)
+        self.has_credentials = client is not None or bool(settings.OPENAI_API_KEY)
+        # An injected client is used for async calls too; otherwise aembed() uses the shared pool
+        self.custom_client = client is not None
+        self.client = client or openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+
+    @property
+    def available(self):
+        return self.has_credentials
+
+    def _request_kwargs(self, texts):
+        kwargs = {'model': self.model, 'input': list(texts)}
+        if self.NATIVE_DIMENSIONS.get(self.model, self.dimensions) != self.dimensions:
+            kwargs['dimensions'] = self.dimensions
+        return kwargs
+
+    def _vectors(self, response, count):
+        # The API returns items with an index; do not rely on response order
+        vectors = [None] * count
+        for item in response.data:
+            vectors[item.index] = item.embedding
+        return vectors
+
+    def embed(self, texts):
+        response = self.client.embeddings.create(**self._request_kwargs(texts))
+        return self._vectors(response, len(texts))
+
+    async def aembed(self, texts):
+        if self.custom_client:
+            return await super().aembed(texts)
+        from .services_http import get_async_openai_client
+        response = await get_async_openai_client().embeddings.create(**self._request_kwargs(texts))
+        return self._vectors(response, len(texts))
+
+
+class HTTPEmbeddingProvider(EmbeddingProvider):
+    """Any server speaking the OpenAI /embeddings request and response shape"""
+
+    name = 'http'
+
+    def __init__(self, url=None, model=None, dimensions=None, timeout=None):
+        super().__init__(model or settings.EMBEDDING_MODEL, dimensions or settings.VECTOR_DIMENSIONS)
+        self.url = url or settings.EMBEDDING_HTTP_URL
+        self.timeout = timeout or settings.EMBEDDING_HTTP_TIMEOUT
+        self.session = requests.Session()
+
+    def embed(self, texts):
+        response = self.session.post(
+            self.url,
+            json={'model': self.model, 'input': list(texts)},
+            timeout=self.timeout,
+        )
+        return self._vectors(response)
+
+    async def aembed(self, texts):
+        from .services_http import get_async_http_client
+        response = await get_async_http_client().post(
+            self.url,
+            json={'model': self.model, 'input': list(texts)},
+            timeout=self.timeout,
+        )
+        return self._vectors(response)
+
+    def _vectors(self, response):
+        response.raise_for_status()
+        data = sorted(response.json()['data'], key=lambda item: item.get('index', 0))
+        return [item['embedding'] for item in data]
+
+
+class LocalModelEmbeddingProvider(EmbeddingProvider):
+    """In-process sentence-transformers model, loaded on first use rather than at import"""
+
+    name = 'local'
+
+    def __init__(self, model=None, dimensions=None, device=None):
+        super().__init__(model or settings.EMBEDDING_MODEL, dimensions or settings.VECTOR_DIMENSIONS)
+        self.device = device or settings.EMBEDDING_LOCAL_DEVICE or None
+        self._encoder = None
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "EMBEDDING_PROVIDER=local needs the sentence-transformers package "
+                    "(pip install sentence-transformers)"
+                ) from e
+            self._encoder = SentenceTransformer(self.model, device=self.device)
+            native = self._encoder.get_sentence_embedding_dimension()
+            if native != self.dimensions:
+                logger.warning(
+                    f"Local embedding model {self.model} produces {native} dimensions, "
+                    f"not VECTOR_DIMENSIONS={self.dimensions}; using {native}"
+                )
+                self.dimensions = native
+        return self._encoder
+
+    def embed(self, texts):
+        vectors = self.encoder.encode(
+            list(texts),
+            batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return vectors.astype(np.float32).tolist()
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Signed feature hashing of word unigrams and bigrams
+
+    No model and no network: identical text always maps to the identical unit
+    vector and texts sharing words land close together, which is enough to
+    exercise chunking, storage, indexing and ranking end to end.
+    """
+
+    name = 'hashing'
+    TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+    def __init__(self, dimensions=None):
+        dimensions = dimensions or settings.VECTOR_DIMENSIONS
+        super().__init__(f"hashing-{dimensions}", dimensions)
+
+    def _features(self, text):
+        tokens = self.TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector /= norm
+            vectors.append(vector.tolist())
+        return vectors
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (OpenAIEmbeddingProvider, HTTPEmbeddingProvider, LocalModelEmbeddingProvider, HashingEmbeddingProvider)
+}
+
+
+def get_embedding_provider(name=None):
+    """Instantiate the provider named by EMBEDDING_PROVIDER (or ``name``)"""
+    name = (name or settings.EMBEDDING_PROVIDER).lower()
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{name}'; expected one of {', '.join(sorted(PROVIDERS))}")
+    return provider_class()
@@ -0,0 +1,252 @@
+"""
+Per-organization facet counts for list filters
+
+The properties page ran ``values_list('city').distinct()`` on every load and
+the leads page ran an unscoped ``utm_source`` DISTINCT over every tenant's
+leads. Filter dropdowns now read counts from ``facet_counts`` instead:
+
+    properties (per organization)   city, beds bucket, price bucket
+    public (active, all orgs)       same facets, for the public results page
+    leads (per company)             utm_source
+
+A scope is built on first use with a few GROUP BY queries and kept in
+process. Property and Lead signals then apply each write as a delta (old
+values out, new values in), so counts stay exact for writes made by this
+process without re-querying. Writes that skip signals (queryset.update(),
+bulk_create) and writes made by other processes show up after
+FACET_TTL_SECONDS, when the scope is rebuilt.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+PROPERTY_FIELDS = ('organization_id', 'is_active', 'city', 'beds', 'price_amount')
+LEAD_FIELDS = ('company_id', 'utm_source')
+
+# (exclusive upper bound, filter value, label); each bucket starts at the previous bound,
+# inclusive, so a listing at exactly $300K is in '300000-500000', as the price filters have it
+PRICE_BUCKETS = (
+    (300_000, '0-300000', 'Under $300K'),
+    (500_000, '300000-500000', '$300K - $500K'),
+    (1_000_000, '500000-1000000', '$500K - $1M'),
+    (None, '1000000+', 'Over $1M'),
+)
+# Bedroom counts from this up share one bucket
+BEDS_TOP_BUCKET = 4
+
+
+def price_bucket(amount):
+    if amount is None:
+        return None
+    for upper, value, _ in PRICE_BUCKETS:
+        if upper is None or amount < upper:
+            return value
+    return None
+
+
+def price_bucket_filter(value):
+    """Q selecting the price bucket ``value`` ('300000-500000', ...), or None for an unknown value"""
+    lower = None
+    for upper, bucket, _ in PRICE_BUCKETS:
+        if bucket == value:
+            condition = Q(price_amount__isnull=False)
+            if lower is not None:
+                condition &= Q(price_amount__gte=lower)
+            if upper is not None:
+                condition &= Q(price_amount__lt=upper)
+            return condition
+        lower = upper
+    return None
+
+
+def beds_bucket(beds):
+    if beds is None:
+        return None
+    return f'{BEDS_TOP_BUCKET}+' if beds >= BEDS_TOP_BUCKET else str(beds)
+
+
+def property_facets(row):
+    return {'city': row['city'] or None, 'beds': beds_bucket(row['beds']), 'price': price_bucket(row['price_amount'])}
+
+
+def property_scopes(row):
+    scopes = []
+    if row['organization_id']:
+        scopes.append(('properties', str(row['organization_id'])))
+    if row['is_active']:
+        scopes.append(('public', None))
+    return scopes
+
+
+def lead_facets(row):
+    return {'utm_source': row['utm_source'] or None}
+
+
+def lead_scopes(row):
+    return [('leads', str(row['company_id']))] if row['company_id'] else []
+
+
+def sorted_options(counts):
+    """[(value, count), ...] in value order"""
+    return sorted(counts.items(), key=lambda item: str(item[0]).lower())
+
+
+def price_options(counts):
+    """[(filter value, label, count), ...] for every price bucket"""
+    return [(value, label, counts.get(value, 0)) for _, value, label in PRICE_BUCKETS]
+
+
+def bed_options(counts):
+    """[('1', listings with 1+ beds), ..., ('4', listings with 4+ beds)] for the "N+" beds filter"""
+    exact = {int(bucket.rstrip('+')): count for bucket, count in counts.items()}
+    return [
+        (str(minimum), sum(count for beds, count in exact.items() if beds >= minimum))
+        for minimum in range(1, BEDS_TOP_BUCKET + 1)
+    ]
+
+
+class FacetCounts:
+    """Facet counts per scope, built once and then maintained from model signals"""
+
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.FACET_TTL_SECONDS
+        # (kind, scope id) -> (expires_at, {facet: Counter})
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def properties(self, organization):
+        """{'city': {...}, 'beds': {...}, 'price': {...}} for all of the organization's properties"""
+        return self._get(('properties', str(getattr(organization, 'id', organization))))
+
+    def public_properties(self):
+        """The same facets over active properties of every organization"""
+        return self._get(('public', None))
+
+    def leads(self, company):
+        """{'utm_source': {...}} for the company's leads"""
+        if company is None:
+            return {'utm_source': {}}
+        return self._get(('leads', str(getattr(company, 'id', company))))
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached is None or cached[0] <= now:
+            cached = (now + self.ttl_seconds, self._load(*key))
+            with self._lock:
+                self._counts[key] = cached
+        with self._lock:
+            return {facet: dict(counts) for facet, counts in cached[1].items()}
+
+    def _load(self, kind, scope_id):
+        from .models import Lead, Property
+
+        if kind == 'leads':
+            rows = (
+                Lead.objects.filter(company_id=scope_id).exclude(utm_source='')
+                .values('utm_source').annotate(n=Count('id')).order_by()
+            )
+            return {'utm_source': Counter({row['utm_source']: row['n'] for row in rows})}
+
+        if kind == 'properties':
+            queryset = Property.objects.filter(organization_id=scope_id)
+        else:
+            queryset = Property.objects.filter(is_active=True)
+        counts = {'city': Counter(), 'beds': Counter(), 'price': Counter()}
+        for row in queryset.exclude(city='').values('city').annotate(n=Count('id')).order_by():
+            counts['city'][row['city']] += row['n']
+        for row in queryset.values('beds').annotate(n=Count('id')).order_by():
+            bucket = beds_bucket(row['beds'])
+            if bucket is not None:
+                counts['beds'][bucket] += row['n']
+        price_counts = {value: Count('id', filter=price_bucket_filter(value)) for _, value, _ in PRICE_BUCKETS}
+        for value, count in queryset.aggregate(**price_counts).items():
+            if count:
+                counts['price'][value] = count
+        return counts
+
+    def is_tracking(self, *kinds):
+        """Whether any scope of these kinds is built in this process"""
+        with self._lock:
+            return any(key[0] in kinds for key in self._counts)
+
+    def apply(self, scopes, facets, delta):
+        """Add ``delta`` to each facet value in the given scopes; scopes not built yet are skipped"""
+        with self._lock:
+            for key in scopes:
+                cached = self._counts.get(key)
+                if cached is None:
+                    continue
+                for facet, value in facets.items():
+                    if value is None:
+                        continue
+                    counts = cached[1][facet]
+                    counts[value] += delta
+                    if counts[value] <= 0:
+                        del counts[value]
+
+    def before_save(self, instance):
+        """Remember the stored facet values of a row about to be updated (pre_save)"""
+        fields, _, _, kinds = TRACKED[type(instance).__name__]
+        instance._facet_previous = None
+        # Skip the lookup while nothing is built; after_save then has nothing to adjust
+        if not instance._state.adding and instance.pk is not None and self.is_tracking(*kinds):
+            instance._facet_previous = type(instance)._default_manager.filter(pk=instance.pk).values(*fields).first()
+
+    def after_save(self, instance, created):
+        """Move the row's counts from its previous to its saved values (post_save)"""
+        fields, scopes_of, facets_of, kinds = TRACKED[type(instance).__name__]
+        previous = getattr(instance, '_facet_previous', None)
+        instance._facet_previous = None
+        current = _row_values(instance, fields)
+        if current is None or (previous is None and not created):
+            # Old or new values unknown: rebuild this model's scopes on next read
+            self.invalidate(*self._built(*kinds))
+            return
+        if previous is not None:
+            self.apply(scopes_of(previous), facets_of(previous), -1)
+        self.apply(scopes_of(current), facets_of(current), 1)
+
+    def after_delete(self, instance):
+        """Remove the deleted row's counts (post_delete)"""
+        fields, scopes_of, facets_of, kinds = TRACKED[type(instance).__name__]
+        current = _row_values(instance, fields)
+        if current is None:
+            self.invalidate(*self._built(*kinds))
+            return
+        self.apply(scopes_of(current), facets_of(current), -1)
+
+    def _built(self, *kinds):
+        with self._lock:
+            return [key for key in self._counts if key[0] in kinds]
+
+    def invalidate(self, *scopes):
+        with self._lock:
+            for key in scopes:
+                self._counts.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+def _row_values(instance, fields):
+    """The instance's values for ``fields``, or None if any of them is deferred"""
+    if instance.get_deferred_fields() & set(fields):
+        return None
+    return {field: getattr(instance, field) for field in fields}
+
+
+# Model name -> (fields read, scopes of a row, facet values of a row, scope kinds)
+TRACKED = {
+    'Property': (PROPERTY_FIELDS, property_scopes, property_facets, ('properties', 'public')),
+    'Lead': (LEAD_FIELDS, lead_scopes, lead_facets, ('leads',)),
+}
+
+
+# Global instance
+facet_counts = FacetCounts()
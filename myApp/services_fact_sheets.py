@@ -0,0 +1,162 @@
+"""
+Compact, versioned property fact sheets for LLM prompts
+
+Every prompt that describes a listing (property Q&A, widget chat, vector
+chat context) draws from one fact sheet instead of formatting fields itself:
+
+    Sunny Loft | Makati, Poblacion
+    $35,000 | 2 bed | 1 bath | 45 sqm | parking
+    Tags: pet friendly, furnished
+    About: Bright corner unit near ...
+
+The sheet is rendered in Property's pre_save signal and stored with a
+fingerprint of the fields it was built from. ``fact_sheet_for`` returns the
+stored text while the fingerprint still matches and re-renders in memory
+otherwise (queryset.update(), bulk_create, rows saved before the columns
+existed), so a prompt never describes an outdated listing.
+
+Comparables for the property Q&A prompt come from ``area_summaries``: one
+query per organization and city, kept in process until a property of the
+organization changes or AREA_SUMMARY_TTL_SECONDS pass.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+
+# Bump when the rendered format changes so stored sheets are re-rendered
+FACT_SHEET_FORMAT = 1
+FACT_SHEET_FIELDS = (
+    'title', 'city', 'area', 'price_amount', 'beds', 'baths', 'floor_area_sqm',
+    'parking', 'badges', 'description', 'narrative', 'estimate', 'neighborhood_avg',
+)
+DESCRIPTION_CHARS = 300
+NARRATIVE_CHARS = 200
+
+
+def property_version(property_obj):
+    """Short fingerprint of the fields (and format) a fact sheet is built from"""
+    payload = '\x1f'.join(
+        [str(FACT_SHEET_FORMAT)] + [str(getattr(property_obj, field, '') or '') for field in FACT_SHEET_FIELDS]
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _clip(text, limit):
+    text = ' '.join((text or '').split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def render_fact_sheet(property_obj):
+    """Render the fact sheet text; empty fields are left out rather than printed as None"""
+    place = ', '.join(part for part in (property_obj.city, property_obj.area) if part)
+    lines = [f"{property_obj.title} | {place}" if place else property_obj.title]
+
+    specs = []
+    if property_obj.price_amount is not None:
+        specs.append(f"${property_obj.price_amount:,}")
+    if property_obj.beds is not None:
+        specs.append(f"{property_obj.beds} bed")
+    if property_obj.baths is not None:
+        specs.append(f"{property_obj.baths} bath")
+    if property_obj.floor_area_sqm:
+        specs.append(f"{property_obj.floor_area_sqm} sqm")
+    if property_obj.parking:
+        specs.append('parking')
+    if specs:
+        lines.append(' | '.join(specs))
+
+    if property_obj.badges:
+        lines.append(f"Tags: {property_obj.badges}")
+    if property_obj.estimate or property_obj.neighborhood_avg:
+        values = []
+        if property_obj.estimate:
+            values.append(f"estimate ${property_obj.estimate:,}")
+        if property_obj.neighborhood_avg:
+            values.append(f"neighborhood avg ${property_obj.neighborhood_avg:,}")
+        lines.append(f"Market: {', '.join(values)}")
+    if property_obj.description:
+        lines.append(f"About: {_clip(property_obj.description, DESCRIPTION_CHARS)}")
+    if property_obj.narrative:
+        lines.append(f"Analysis: {_clip(property_obj.narrative, NARRATIVE_CHARS)}")
+    return '\n'.join(lines)
+
+
+def refresh_fact_sheet(property_obj):
+    """Re-render the stored sheet if its fields changed; returns whether it did"""
+    version = property_version(property_obj)
+    if property_obj.fact_sheet and property_obj.fact_sheet_version == version:
+        return False
+    property_obj.fact_sheet = render_fact_sheet(property_obj)
+    property_obj.fact_sheet_version = version
+    return True
+
+
+def fact_sheet_for(property_obj):
+    """The property's current fact sheet, from the stored copy when it is up to date"""
+    if property_obj.fact_sheet and property_obj.fact_sheet_version == property_version(property_obj):
+        return property_obj.fact_sheet
+    return render_fact_sheet(property_obj)
+
+
+def format_fact_sheets(properties, empty="No properties are currently available."):
+    """Fact sheets of several properties as one prompt block"""
+    sheets = [fact_sheet_for(prop) for prop in properties]
+    return "\n\n".join(sheets) if sheets else empty
+
+
+class AreaSummaries:
+    """
+    Per-city comparables for property prompts, cached per organization
+
+    Replaces a related-properties query per chat message with one query per
+    (organization, city) until invalidate() or the TTL.
+    """
+
+    def __init__(self, limit=5, ttl_seconds=None):
+        self.limit = limit
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.AREA_SUMMARY_TTL_SECONDS
+        # organization id -> {city: (expires_at, [(property id, line), ...])}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def comparables(self, property_obj):
+        """Compact lines for other active listings in the property's city"""
+        org_key = str(property_obj.organization_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._summaries.get(org_key, {}).get(property_obj.city)
+        if cached is None or cached[0] <= now:
+            rows = self._load(property_obj.organization_id, property_obj.city)
+            cached = (now + self.ttl_seconds, rows)
+            with self._lock:
+                self._summaries.setdefault(org_key, {})[property_obj.city] = cached
+        return [line for prop_id, line in cached[1] if prop_id != property_obj.id][:self.limit]
+
+    def _load(self, organization_id, city):
+        from .models import Property
+        # One spare row so the listing being asked about can be excluded
+        properties = Property.objects.filter(
+            organization_id=organization_id, city=city, is_active=True,
+        ).only('id', 'title', 'area', 'price_amount', 'beds', 'baths')[:self.limit + 1]
+        return [
+            (prop.id, ' | '.join(part for part in (
+                prop.title, prop.area, f"${prop.price_amount:,}", f"{prop.beds} bed", f"{prop.baths} bath",
+            ) if part))
+            for prop in properties
+        ]
+
+    def invalidate(self, organization_id):
+        with self._lock:
+            self._summaries.pop(str(organization_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._summaries.clear()
+
+
+# Global instance
+area_summaries = AreaSummaries()
@@ -0,0 +1,162 @@
+"""
+Precomputed structured-filter columns for property search
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Property
+
+FILTER_FIELDS = ('id', 'price_amount', 'beds', 'city', 'area', 'is_active')
+
+
+class PropertyFilterIndex:
+    """
+    Sorted arrays and bitmaps over one scope's properties
+
+    Range filters (price, beds) are binary searches over pre-sorted columns,
+    equality filters (city, area, is_active) are precomputed bitmaps, and
+    intersecting them is a handful of vectorised ANDs.
+    """
+
+    def __init__(self):
+        self.property_ids = []
+        self.positions = {}
+        self.price_order = np.zeros(0, dtype=np.int64)
+        self.price_sorted = np.zeros(0, dtype=np.int64)
+        self.beds_order = np.zeros(0, dtype=np.int64)
+        self.beds_sorted = np.zeros(0, dtype=np.int64)
+        self.location_bitmaps = {}
+        self.active = np.zeros(0, dtype=bool)
+        self.signature = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self.property_ids)
+
+    def build(self, rows):
+        """Index (id, price_amount, beds, city, area, is_active) tuples"""
+        ids, prices, beds, active = [], [], [], []
+        locations = {}
+        for position, (property_id, price, bed_count, city, area, is_active) in enumerate(rows):
+            ids.append(str(property_id))
+            prices.append(price or 0)
+            beds.append(bed_count or 0)
+            active.append(bool(is_active))
+            for value in {(city or '').strip().lower(), (area or '').strip().lower()}:
+                if value:
+                    locations.setdefault(value, []).append(position)
+
+        count = len(ids)
+        self.property_ids = ids
+        self.positions = {property_id: position for position, property_id in enumerate(ids)}
+        prices = np.asarray(prices, dtype=np.int64)
+        beds = np.asarray(beds, dtype=np.int64)
+        self.price_order = np.argsort(prices, kind='stable')
+        self.price_sorted = prices[self.price_order]
+        self.beds_order = np.argsort(beds, kind='stable')
+        self.beds_sorted = beds[self.beds_order]
+        self.active = np.asarray(active, dtype=bool)
+        self.location_bitmaps = {}
+        for value, positions in locations.items():
+            bitmap = np.zeros(count, dtype=bool)
+            bitmap[positions] = True
+            self.location_bitmaps[value] = bitmap
+        self.built_at = time.monotonic()
+
+    def _range(self, order, sorted_values, low=None, high=None):
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        end = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side='right')
+        bitmap = np.zeros(len(self), dtype=bool)
+        bitmap[order[start:end]] = True
+        return bitmap
+
+    def mask(self, filters):
+        """
+        Bitmap of properties satisfying every filter
+
+        Args:
+            filters: dict with optional price_min, price_max, beds_min,
+                city (substring of city or area) and is_active
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if not filters:
+            return mask
+        if filters.get('price_min') is not None or filters.get('price_max') is not None:
+            mask &= self._range(self.price_order, self.price_sorted, filters.get('price_min'), filters.get('price_max'))
+        if filters.get('beds_min') is not None:
+            mask &= self._range(self.beds_order, self.beds_sorted, low=filters['beds_min'])
+        if filters.get('city'):
+            needle = filters['city'].strip().lower()
+            location = np.zeros(len(self), dtype=bool)
+            # Distinct cities/areas per org are few; substring match over the keys, not the rows
+            for value, bitmap in self.location_bitmaps.items():
+                if needle in value:
+                    location |= bitmap
+            mask &= location
+        if filters.get('is_active') is not None:
+            mask &= self.active == bool(filters['is_active'])
+        return mask
+
+    def allowed_ids(self, filters):
+        """Property ids satisfying the filters, or None when nothing is filtered out"""
+        if not any(value is not None and value != '' for value in (filters or {}).values()):
+            return None
+        mask = self.mask(filters)
+        if mask.all():
+            return None
+        return {self.property_ids[position] for position in np.flatnonzero(mask)}
+
+
+class FilterIndexRegistry:
+    """Per-organization filter indexes, rebuilt when rows change"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _signature(self, organization_id):
+        stats = Property.objects.filter(organization_id=organization_id).aggregate(
+            rows=Count('id'),
+            latest=Max('updated_at'),  # Moves on edits too, not just inserts
+        )
+        return (stats['rows'], stats['latest'])
+
+    def get(self, organization):
+        organization_id = str(organization.id)
+        now = time.monotonic()
+        with self._lock:
+            index = self._indexes.get(organization_id)
+
+        if index is not None and now - index.built_at < settings.SEARCH_INDEX_MAX_AGE_SECONDS:
+            if now - index.checked_at < settings.SEARCH_INDEX_REFRESH_SECONDS:
+                return index
+            index.checked_at = now
+            if index.signature == self._signature(organization_id):
+                return index
+
+        index = PropertyFilterIndex()
+        index.build(
+            Property.objects.filter(organization_id=organization_id).order_by('-created_at').values_list(*FILTER_FIELDS)
+        )
+        index.signature = self._signature(organization_id)
+        index.checked_at = time.monotonic()
+        with self._lock:
+            self._indexes[organization_id] = index
+        return index
+
+    def allowed_ids(self, organization, filters):
+        """Property ids in the organization satisfying the filters (None = unrestricted)"""
+        return self.get(organization).allowed_ids(filters)
+
+    def invalidate(self, organization_id):
+        with self._lock:
+            self._indexes.pop(str(organization_id), None)
+
+
+# Global instance
+filter_index_registry = FilterIndexRegistry()
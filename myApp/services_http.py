@@ -0,0 +1,77 @@
+"""
+Shared async HTTP clients for ASGI views
+
+One httpx.AsyncClient (and one AsyncOpenAI wrapping it) per event loop, so
+concurrent chat requests reuse pooled keep-alive connections instead of
+opening a TLS session per call. Under daphne/uvicorn there is one loop per
+process and therefore one pool; clients are bound to their loop, so a
+different loop (tests, async_to_sync under WSGI) gets its own. Each client
+is closed when its loop shuts down: asyncio.run, which async_to_sync uses
+for a per-request loop, cancels the client's closer task on the way out.
+
+``acquire_slot`` waits on a threading semaphore without blocking the loop,
+for concurrency limits that have to hold across every loop and thread in
+the process rather than within one loop.
+"""
+import asyncio
+import time
+import weakref
+
+import httpx
+import openai
+from django.conf import settings
+
+_http_clients = weakref.WeakKeyDictionary()
+_openai_clients = weakref.WeakKeyDictionary()
+_closers = set()  # strong references; the loop only keeps weak ones to its tasks
+
+
+async def _close_with_loop(loop, client):
+    """Wait until the loop shuts down (cancelling this task), then close ``client``"""
+    try:
+        await asyncio.Future()
+    finally:
+        if _http_clients.get(loop) is client:
+            del _http_clients[loop]
+            _openai_clients.pop(loop, None)
+        await client.aclose()
+
+
+def get_async_http_client():
+    """Pooled httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.ASYNC_HTTP_TIMEOUT, connect=settings.ASYNC_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ASYNC_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+        _http_clients[loop] = client
+        closer = loop.create_task(_close_with_loop(loop, client))
+        _closers.add(closer)
+        closer.add_done_callback(_closers.discard)
+    return client
+
+
+def get_async_openai_client():
+    """AsyncOpenAI client sharing the loop's connection pool; retries are left to services_llm"""
+    loop = asyncio.get_running_loop()
+    http_client = get_async_http_client()
+    cached = _openai_clients.get(loop)
+    if cached is None or cached[0] is not http_client:
+        cached = (http_client, openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client, max_retries=0))
+        _openai_clients[loop] = cached
+    return cached[1]
+
+
+async def acquire_slot(semaphore, timeout, poll_interval=0.01):
+    """Acquire a threading semaphore from async code, polling; False if ``timeout`` seconds pass first"""
+    deadline = time.monotonic() + timeout
+    while not semaphore.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(poll_interval)
+    return True
@@ -0,0 +1,161 @@
+"""
+Keeps property embeddings and search indexes in sync with property changes
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Organization, Property, PropertyIndexEvent
+
+logger = logging.getLogger(__name__)
+
+
+def record_property_changes(organization_id, property_ids, kind='upsert'):
+    """
+    Append change events to the outbox
+
+    Call this wherever properties change without a post_save/post_delete
+    signal (queryset.update(), raw SQL). Signals cover everything else.
+    """
+    if organization_id is None:
+        return
+    PropertyIndexEvent.objects.bulk_create([
+        PropertyIndexEvent(organization_id=organization_id, property_id=property_id, kind=kind)
+        for property_id in property_ids
+    ])
+
+
+class PropertyIndexWorker:
+    """
+    Drains PropertyIndexEvent in batches
+
+    Events are coalesced per property, so a listing saved ten times is
+    re-embedded once. Re-embedding is hash-incremental (only changed chunks
+    hit the API) and never patches a live index in place: each touched
+    organization gets a fresh index built off to the side and swapped in.
+
+    Workers claim a batch before processing it, so the Celery task and
+    ``process_index_events --loop`` never embed the same events twice.
+    Failed events are released with an exponential backoff, so a listing
+    that keeps failing is not retried on every pass.
+    """
+
+    def _claim(self, limit):
+        """Mark up to ``limit`` unclaimed pending events that are due as this batch's and return them"""
+        token = uuid.uuid4().hex
+        now = timezone.now()
+        claimable = Q(processed_at__isnull=True) & (
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=settings.INDEX_EVENT_CLAIM_SECONDS))
+        ) & (Q(available_at__isnull=True) | Q(available_at__lte=now))
+        with transaction.atomic():
+            pending = PropertyIndexEvent.objects.filter(claimable).order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            ids = list(pending.values_list('id', flat=True)[:limit])
+            # Re-checked in the UPDATE, so without row locks (SQLite) a batch claimed first elsewhere is skipped
+            PropertyIndexEvent.objects.filter(claimable, id__in=ids).update(claimed_by=token, claimed_at=now)
+        return list(PropertyIndexEvent.objects.filter(claimed_by=token).order_by('id'))
+
+    def process_pending(self, limit=None):
+        """
+        Process up to ``limit`` pending events
+
+        Returns:
+            dict: events, completed, properties, organizations, embedded, removed, failed
+        """
+        limit = limit or settings.INDEX_EVENT_BATCH_SIZE
+        events = self._claim(limit)
+        stats = {
+            'events': len(events), 'completed': 0, 'properties': 0, 'organizations': 0,
+            'embedded': 0, 'removed': 0, 'failed': 0,
+        }
+        if not events:
+            return stats
+
+        # Latest event per property wins
+        latest = {}
+        for event in events:
+            latest[(event.organization_id, event.property_id)] = event
+        by_organization = {}
+        for (organization_id, property_id), event in latest.items():
+            by_organization.setdefault(organization_id, {})[property_id] = event.kind
+        stats['properties'] = len(latest)
+        stats['organizations'] = len(by_organization)
+
+        failed_ids = set()
+        for organization_id, changes in by_organization.items():
+            try:
+                failed_ids |= self._process_organization(organization_id, changes, stats)
+            except Exception as e:
+                logger.error(f"Index maintenance failed for organization {organization_id}: {e}", exc_info=True)
+                failed_ids |= set(changes)
+
+        stats['completed'] = self._finish(events, failed_ids)
+        return stats
+
+    def _process_organization(self, organization_id, changes, stats):
+        """Re-embed upserted properties and refresh the organization's indexes; returns failed property ids"""
+        from .services_filter_index import filter_index_registry
+        from .services_search import search_engine
+        from .services_vector import vector_service
+        from .services_vector_index import vector_index_registry
+        from .services_vector_shards import shard_store
+
+        organization = Organization.objects.get(id=organization_id)
+        upserts = [property_id for property_id, kind in changes.items() if kind == 'upsert']
+        properties = list(Property.objects.filter(organization=organization, id__in=upserts))
+        # Deleted after the upsert event was written; embeddings went with the row
+        stats['removed'] += len(changes) - len(properties)
+
+        failed = set()
+        if properties:
+            results = vector_service.batch_create_embeddings(organization, properties, refresh_index=False)
+            for result in results:
+                if result['failed']:
+                    failed.add(result['property'].id)
+                else:
+                    stats['embedded'] += 1
+        stats['failed'] += len(failed)
+
+        # With shards, publishing here means web workers only have to map the new file
+        if shard_store.enabled or vector_index_registry.is_loaded(organization_id):
+            vector_index_registry.rebuild(organization_id)
+        search_engine.invalidate(organization_id)
+        filter_index_registry.invalidate(organization_id)
+        return failed
+
+    def _retry_delay(self, attempts):
+        """Seconds before a failed event is due again: base * 2^(attempts - 1), capped"""
+        return min(settings.INDEX_EVENT_RETRY_MAX_SECONDS, settings.INDEX_EVENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+    def _finish(self, events, failed_ids):
+        """Mark events done, returning how many; failed ones are released, with a backoff, until they run out of attempts"""
+        now = timezone.now()
+        done, retry = [], []
+        for event in events:
+            if event.property_id in failed_ids:
+                event.attempts += 1
+                event.last_error = 'Embedding failed'
+                event.claimed_by, event.claimed_at = '', None
+                event.available_at = now + timedelta(seconds=self._retry_delay(event.attempts))
+                if event.attempts >= settings.INDEX_EVENT_MAX_ATTEMPTS:
+                    event.processed_at = now
+                    logger.error(f"Giving up on index event {event.id} for property {event.property_id}")
+                retry.append(event)
+            else:
+                done.append(event.id)
+
+        with transaction.atomic():
+            PropertyIndexEvent.objects.filter(id__in=done).update(processed_at=now)
+            if retry:
+                PropertyIndexEvent.objects.bulk_update(retry, ['attempts', 'last_error', 'claimed_by', 'claimed_at', 'available_at', 'processed_at'])
+        return len(done) + sum(1 for event in retry if event.processed_at)
+
+
+# Global instance
+index_worker = PropertyIndexWorker()
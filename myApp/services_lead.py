@@ -12,6 +12,7 @@ from django.contrib.auth.models import User
 from django.db.models import Q
 from .models import Lead, WebhookOutbox, Event, Organization, LeadMessage, LeadPropertyLink, Property
 from .services_vector import vector_service
+from .services_text_search import text_search
 import uuid
 import logging
 
@@ -397,7 +398,7 @@ class LeadQualificationService:
         mls_matches = re.findall(mls_pattern, text, re.IGNORECASE)
         for code in mls_matches:
             props = Property.objects.filter(
-                Q(badges__icontains=code) | Q(description__icontains=code),
+                text_search.q(code, fields=('badges', 'description')),
                 organization=organization,
                 is_active=True
             )
@@ -435,7 +436,7 @@ class LeadQualificationService:
             if city_matches:
                 city_query = Q()
                 for city in city_matches:
-                    city_query |= Q(city__icontains=city) | Q(area__icontains=city)
+                    city_query |= text_search.q(city, fields=('city', 'area'))
                 query = query.filter(city_query)
             
             # Filter by price proximity (±20%)
@@ -448,7 +449,7 @@ class LeadQualificationService:
             if title_keywords:
                 title_query = Q()
                 for keyword in title_keywords[:5]:  # Limit to first 5 keywords
-                    title_query |= Q(title__icontains=keyword)
+                    title_query |= text_search.q(keyword, fields=('title',))
                 query = query.filter(title_query)
             
             matched_props = list(query[:5])  # Limit results
@@ -482,11 +483,15 @@ class LeadQualificationService:
                     limit=3
                 )
                 
-                if similar_props:
-                    # Use first result if vector search returns meaningful results
-                    # In production, you'd check similarity scores from pgvector
+                # Only ranked hits count; the unranked fallback list carries similarity=None
+                if similar_props and similar_props[0].similarity is not None:
                     prop = similar_props[0]
-                    return self._create_link(message.lead, prop, 0.78, "Vector similarity search")
+                    return self._create_link(
+                        message.lead,
+                        prop,
+                        0.78,
+                        f"Vector similarity search (cosine {prop.similarity:.2f})"
+                    )
             except Exception as e:
                 logger.warning(f"Vector search failed: {e}")
         
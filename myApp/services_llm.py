@@ -0,0 +1,382 @@
+"""
+Single gateway for chat-completion calls
+
+Every LLM call goes through ``llm_gateway`` so they share:
+
+    - one pooled keep-alive HTTP client (sync) / services_http pool (async)
+    - a per-call timeout
+    - bounded retries with full jitter, drawn from a retry budget so an
+      outage does not multiply load with retry storms
+    - a circuit breaker that fails fast while the API is down, so callers
+      drop straight to their rule-based fallbacks (simple_answer, regex
+      extraction, demo previews) instead of waiting out timeouts
+    - a per-organization concurrency limit, so one busy tenant cannot take
+      every connection
+
+Callers catch ``LLMError`` (or Exception, as the views already do) and fall
+back exactly as before. Each call is reported to services_llm_usage under
+the caller's ``call_site`` name with its tokens, latency and outcome.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import httpx
+import openai
+from django.conf import settings
+
+from .services_http import acquire_slot, get_async_openai_client
+from .services_llm_usage import estimate_tokens, llm_usage
+from .utils.text_chunker import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAT_MODEL = 'gpt-4o-mini'
+
+# Transient failures worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMError(Exception):
+    """A completion could not be produced"""
+
+
+class LLMUnavailable(LLMError):
+    """Failed fast without calling the API: no key, circuit open or organization at its concurrency limit"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker
+
+    Closed until ``failure_threshold`` calls fail in a row, then open for
+    ``reset_seconds``; after that one trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit. A trial that never
+    reports back (cancelled request) is written off after another
+    ``reset_seconds``.
+    """
+
+    def __init__(self, failure_threshold=None, reset_seconds=None):
+        self.failure_threshold = failure_threshold or settings.LLM_CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds if reset_seconds is not None else settings.LLM_CIRCUIT_RESET_SECONDS
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return 'closed'
+        if now - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == 'closed':
+                return True
+            if state == 'half_open' and (
+                self._trial_started is None or now - self._trial_started >= self.reset_seconds
+            ):
+                self._trial_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_started is not None or self.failures >= self.failure_threshold:
+                logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._trial_started = None
+
+
+class RetryBudget:
+    """
+    Token bucket capping retries to a fraction of traffic
+
+    Each request deposits ``ratio`` tokens (up to ``capacity``) and each
+    retry spends one, so sustained failures settle at ratio retries per
+    request rather than max_retries per request.
+    """
+
+    def __init__(self, ratio=None, capacity=None):
+        self.ratio = ratio if ratio is not None else settings.LLM_RETRY_BUDGET_RATIO
+        self.capacity = capacity if capacity is not None else settings.LLM_RETRY_BUDGET_CAPACITY
+        self.tokens = float(self.capacity)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class LLMGateway:
+    """Chat completions with pooling, timeouts, retries, a circuit breaker and per-organization limits"""
+
+    def __init__(self, client=None, async_client=None, breaker=None, retry_budget=None):
+        self._client = client
+        self._async_client = async_client
+        self._client_lock = threading.Lock()
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        # threading semaphores, shared by sync and async calls on every loop
+        self._org_semaphores = {}
+
+    @property
+    def available(self):
+        return self._client is not None or self._async_client is not None or bool(settings.OPENAI_API_KEY)
+
+    @property
+    def client(self):
+        """Sync OpenAI client over one keep-alive connection pool; the gateway does its own retries"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = openai.OpenAI(
+                        api_key=settings.OPENAI_API_KEY,
+                        max_retries=0,
+                        http_client=httpx.Client(
+                            timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.ASYNC_HTTP_CONNECT_TIMEOUT),
+                            limits=httpx.Limits(
+                                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=settings.ASYNC_HTTP_MAX_KEEPALIVE,
+                            ),
+                        ),
+                    )
+        return self._client
+
+    def async_client(self):
+        return self._async_client or get_async_openai_client()
+
+    def _request(self, messages, model, timeout, options):
+        return {
+            'model': model or DEFAULT_CHAT_MODEL,
+            'messages': messages,
+            'timeout': timeout or settings.LLM_TIMEOUT_SECONDS,
+            **options,
+        }
+
+    def _check_available(self):
+        """Cheap checks made before queueing for a concurrency slot"""
+        if not self.available:
+            raise LLMUnavailable('OpenAI API key not configured')
+        if self.breaker.state == 'open':
+            raise LLMUnavailable('LLM circuit is open')
+
+    def _admit(self):
+        """Final breaker check once a slot is held; claims the half-open trial if it is free"""
+        if not self.breaker.allow():
+            raise LLMUnavailable('LLM circuit is open')
+
+    def _backoff(self, attempt):
+        """Full jitter: uniform over [0, min(cap, base * 2^attempt)]"""
+        ceiling = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _should_retry(self, error, attempt):
+        return (
+            isinstance(error, RETRYABLE_ERRORS)
+            and attempt < settings.LLM_MAX_RETRIES
+            and self.retry_budget.withdraw()
+        )
+
+    def _org_key(self, organization):
+        return getattr(organization, 'id', organization)
+
+    def _org_semaphore(self, organization):
+        key = self._org_key(organization)
+        with self._client_lock:
+            semaphore = self._org_semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(settings.LLM_ORG_MAX_CONCURRENCY)
+                self._org_semaphores[key] = semaphore
+            return semaphore
+
+    async def _aacquire(self, organization):
+        semaphore = self._org_semaphore(organization)
+        if not await acquire_slot(semaphore, settings.LLM_ORG_QUEUE_TIMEOUT):
+            raise LLMUnavailable(f"Organization {self._org_key(organization)} is at its LLM concurrency limit")
+        return semaphore
+
+    def complete(self, messages, model=None, organization=None, timeout=None, call_site=None, **options):
+        """
+        Run a chat completion and return the message content
+
+        Args:
+            organization: Organization (or id) the call is made for; None
+                shares one unscoped limit
+            timeout: per-attempt seconds, default LLM_TIMEOUT_SECONDS
+            call_site: name the call's usage is recorded under
+            options: passed through (temperature, max_tokens, ...)
+
+        Raises:
+            LLMUnavailable: failed fast without calling the API
+            LLMError: the API call failed after retries
+        """
+        started = time.monotonic()
+        try:
+            self._check_available()
+            semaphore = self._org_semaphore(organization)
+            if not semaphore.acquire(timeout=settings.LLM_ORG_QUEUE_TIMEOUT):
+                raise LLMUnavailable(f"Organization {self._org_key(organization)} is at its LLM concurrency limit")
+            try:
+                self._admit()
+                response = self._complete_with_retry(self._request(messages, model, timeout, options))
+            finally:
+                semaphore.release()
+        except LLMError:
+            self._record_usage(organization, call_site, started, messages, error=True)
+            raise
+        content = response.choices[0].message.content
+        self._record_usage(organization, call_site, started, messages, content, getattr(response, 'usage', None))
+        return content
+
+    def _complete_with_retry(self, request):
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = self.client.chat.completions.create(**request)
+            except Exception as e:
+                if self._should_retry(e, attempt):
+                    delay = self._backoff(attempt)
+                    logger.info(f"Retrying LLM call in {delay:.2f}s after {type(e).__name__} (attempt {attempt + 1})")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self._record_error(e)
+                raise LLMError(str(e)) from e
+            self.breaker.record_success()
+            return response
+
+    async def acomplete(self, messages, model=None, organization=None, timeout=None, call_site=None, **options):
+        """complete() for async views, on the shared async connection pool"""
+        started = time.monotonic()
+        try:
+            self._check_available()
+            semaphore = await self._aacquire(organization)
+            try:
+                self._admit()
+                response = await self._acomplete_with_retry(self._request(messages, model, timeout, options))
+            finally:
+                semaphore.release()
+        except LLMError:
+            self._record_usage(organization, call_site, started, messages, error=True)
+            raise
+        content = response.choices[0].message.content
+        self._record_usage(organization, call_site, started, messages, content, getattr(response, 'usage', None))
+        return content
+
+    async def _acomplete_with_retry(self, request):
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await self.async_client().chat.completions.create(**request)
+            except Exception as e:
+                if self._should_retry(e, attempt):
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._record_error(e)
+                raise LLMError(str(e)) from e
+            self.breaker.record_success()
+            return response
+
+    async def astream(self, messages, model=None, organization=None, timeout=None, call_site=None, **options):
+        """
+        Yield completion text deltas as they arrive
+
+        Retries only happen before the first delta; once text has been
+        yielded a failure is raised to the caller, who already showed it.
+        """
+        started = time.monotonic()
+        parts = []
+        usage = None
+        try:
+            self._check_available()
+            semaphore = await self._aacquire(organization)
+            try:
+                self._admit()
+                request = self._request(messages, model, timeout, options)
+                self.retry_budget.deposit()
+                attempt = 0
+                while True:
+                    try:
+                        stream = await self.async_client().chat.completions.create(
+                            stream=True, stream_options={'include_usage': True}, **request
+                        )
+                        async for chunk in stream:
+                            usage = getattr(chunk, 'usage', None) or usage
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                    except Exception as e:
+                        if not parts and self._should_retry(e, attempt):
+                            await asyncio.sleep(self._backoff(attempt))
+                            attempt += 1
+                            continue
+                        self._record_error(e)
+                        raise LLMError(str(e)) from e
+                    self.breaker.record_success()
+                    break
+            finally:
+                semaphore.release()
+        except LLMError:
+            self._record_usage(organization, call_site, started, messages, ''.join(parts), error=True)
+            raise
+        self._record_usage(organization, call_site, started, messages, ''.join(parts), usage)
+
+    def _record_usage(self, organization, call_site, started, messages, content=None, usage=None, error=False):
+        """Report a finished call; token counts are estimated when the response has no usage block"""
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            # A failed call that produced no text was not billed
+            prompt_tokens = estimate_tokens(messages) if content or not error else 0
+            completion_tokens = count_tokens(content) if content else 0
+        llm_usage.record(
+            organization, call_site, (time.monotonic() - started) * 1000,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, error=error,
+        )
+
+    def _record_error(self, error):
+        # A rejected request says nothing about the API's health
+        if isinstance(error, RETRYABLE_ERRORS):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+
+# Global instance
+llm_gateway = LLMGateway()
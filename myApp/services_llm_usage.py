@@ -0,0 +1,213 @@
+"""
+Per-organization LLM token, latency and error accounting
+
+``llm_gateway`` reports every call here with the organization and a call
+site name ('chat.widget', 'import.extract', ...). Calls are aggregated in
+process per (organization, call site, hour) and written to LLMUsage in one
+transaction once LLM_USAGE_FLUSH_EVERY calls are pending or
+LLM_USAGE_FLUSH_SECONDS have passed, on a background thread so the request
+that trips the threshold does not wait for the write.
+
+Reads (billing quotas, the dashboard) combine the stored rows with this
+process's pending aggregates, so a quota check never needs to scan events.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .utils.text_chunker import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket counts slower calls
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+COUNTERS = ('requests', 'errors', 'prompt_tokens', 'completion_tokens', 'latency_ms_total')
+
+
+def _empty_aggregate():
+    aggregate = dict.fromkeys(COUNTERS, 0)
+    aggregate['latency_histogram'] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    return aggregate
+
+
+def _bucket(latency_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def estimate_tokens(messages):
+    """Prompt token estimate for responses that carry no usage block"""
+    return sum(count_tokens(str(message.get('content') or '')) + 4 for message in messages)
+
+
+def latency_percentile(histogram, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of calls; None past the last bound"""
+    total = sum(histogram)
+    if not total:
+        return 0
+    threshold = fraction * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= threshold:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+class LLMUsageRecorder:
+    """Batches LLM call metrics in memory and flushes them to LLMUsage"""
+
+    def __init__(self, flush_every=None, flush_seconds=None):
+        self.flush_every = flush_every or settings.LLM_USAGE_FLUSH_EVERY
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.LLM_USAGE_FLUSH_SECONDS
+        # (organization id or None, call site, hour) -> aggregate
+        self._pending = {}
+        self._pending_calls = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+
+    def record(self, organization, call_site, latency_ms, prompt_tokens=0, completion_tokens=0, error=False):
+        """Count one LLM call (tokens are 0 for calls that failed)"""
+        org_id = getattr(organization, 'id', organization)
+        key = (str(org_id) if org_id else None, call_site or 'unspecified', _hour(timezone.now()))
+        with self._lock:
+            aggregate = self._pending.get(key)
+            if aggregate is None:
+                aggregate = self._pending[key] = _empty_aggregate()
+            aggregate['requests'] += 1
+            aggregate['errors'] += 1 if error else 0
+            aggregate['prompt_tokens'] += prompt_tokens or 0
+            aggregate['completion_tokens'] += completion_tokens or 0
+            aggregate['latency_ms_total'] += int(latency_ms)
+            aggregate['latency_histogram'][_bucket(latency_ms)] += 1
+            self._pending_calls += 1
+            due = (
+                self._pending_calls >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_seconds
+            )
+        if due:
+            self._flush_in_background()
+
+    def _flush_in_background(self):
+        if not self._flushing.acquire(blocking=False):
+            return  # A flush is already running and will pick these up next time
+
+        def run():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"LLM usage flush failed, will retry: {e}")
+            finally:
+                connection.close()
+                self._flushing.release()
+
+        threading.Thread(target=run, name='llm-usage-flush', daemon=True).start()
+
+    def flush(self):
+        """Write pending aggregates; returns the number of rows touched"""
+        from .models import LLMUsage
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_calls = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                for (org_id, call_site, period_start), aggregate in pending.items():
+                    row, _ = LLMUsage.objects.select_for_update().get_or_create(
+                        organization_id=org_id, call_site=call_site, period_start=period_start,
+                        defaults={'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)},
+                    )
+                    for counter in COUNTERS:
+                        setattr(row, counter, getattr(row, counter) + aggregate[counter])
+                    stored = row.latency_histogram or []
+                    row.latency_histogram = [
+                        (stored[index] if index < len(stored) else 0) + count
+                        for index, count in enumerate(aggregate['latency_histogram'])
+                    ]
+                    row.save()
+        except Exception:
+            self._restore(pending)
+            raise
+        return len(pending)
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, aggregate in pending.items():
+                self._pending_calls += aggregate['requests']
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = aggregate
+                    continue
+                for counter in COUNTERS:
+                    current[counter] += aggregate[counter]
+                current['latency_histogram'] = [
+                    a + b for a, b in zip(current['latency_histogram'], aggregate['latency_histogram'])
+                ]
+
+    def breakdown(self, organization, since=None):
+        """
+        Usage per call site since ``since`` (default: 30 days ago)
+
+        Returns a list of dicts with the COUNTERS, total_tokens,
+        avg_latency_ms and p95_latency_ms, most-called site first.
+        """
+        from .models import LLMUsage
+
+        since = _hour(since or timezone.now() - timedelta(days=30))
+        org_id = str(getattr(organization, 'id', organization))
+        sites = {}
+        rows = LLMUsage.objects.filter(organization_id=org_id, period_start__gte=since).values(
+            'call_site', 'latency_histogram', *COUNTERS,
+        )
+        with self._lock:
+            pending = [
+                dict(aggregate, call_site=key[1])
+                for key, aggregate in self._pending.items()
+                if key[0] == org_id and key[2] >= since
+            ]
+        for row in list(rows) + pending:
+            site = sites.get(row['call_site'])
+            if site is None:
+                site = sites[row['call_site']] = _empty_aggregate()
+                site['call_site'] = row['call_site']
+            for counter in COUNTERS:
+                site[counter] += row[counter]
+            site['latency_histogram'] = [
+                a + b for a, b in zip(site['latency_histogram'], row['latency_histogram'] or [])
+            ]
+
+        results = []
+        for site in sites.values():
+            site['total_tokens'] = site['prompt_tokens'] + site['completion_tokens']
+            site['avg_latency_ms'] = site['latency_ms_total'] / site['requests'] if site['requests'] else 0
+            site['p95_latency_ms'] = latency_percentile(site['latency_histogram'], 0.95)
+            results.append(site)
+        return sorted(results, key=lambda site: site['requests'], reverse=True)
+
+    def totals(self, organization, since=None):
+        """requests, errors, prompt/completion/total tokens summed over all call sites"""
+        totals = dict.fromkeys(('requests', 'errors', 'prompt_tokens', 'completion_tokens', 'total_tokens'), 0)
+        for site in self.breakdown(organization, since):
+            for field in totals:
+                totals[field] += site[field]
+        return totals
+
+
+# Global instance
+llm_usage = LLMUsageRecorder()
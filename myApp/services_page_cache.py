@@ -0,0 +1,137 @@
+"""
+Fragment cache for the public property pages
+
+Every anonymous visit to the home page, a property page, the quick-view
+modal or the homepage chat suggestions re-queried and re-rendered the same
+property cards. These pages now read through ``page_cache``:
+
+    snapshots   ppc:p:<id> holds a property's field values and ppc:slug:<slug>
+                maps a slug to its id, so a page can be rendered without a
+                query. Saves write the new snapshot through; deletes drop it.
+    fragments   ``{% pagecache "name" key ... %}`` blocks are stored under
+                their key parts. Property fragments use (id, cache_version),
+                and cache_version changes with updated_at on every save, so
+                edits and enrichment callbacks never serve an old card.
+    catalog     fragments that list several properties (home top picks) key
+                on a catalog version that any property save or delete bumps.
+
+Property pages also answer conditional GETs (ETag / Last-Modified) from the
+snapshot, so a revalidating browser gets a 304 without a query either.
+
+Entries live in the PAGE_CACHE_ALIAS Django cache. Point it at a shared
+cache so all workers see each other's invalidations; with the default
+per-process cache other workers catch up within PAGE_CACHE_TTL_SECONDS.
+"""
+import hashlib
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import quote_etag
+
+SNAPSHOT_KEY = 'ppc:p:{}'
+SLUG_KEY = 'ppc:slug:{}'
+FRAGMENT_KEY = 'ppc:f:{}:{}'
+CATALOG_KEY = 'ppc:catalog'
+
+
+def snapshot_of(property_obj):
+    """Plain copy of a property's field values that templates can render like the model"""
+    values = {field.attname: getattr(property_obj, field.attname) for field in property_obj._meta.concrete_fields}
+    values['pk'] = property_obj.pk
+    values['cache_version'] = property_obj.cache_version
+    return SimpleNamespace(**values)
+
+
+class PropertyPageCache:
+    """Snapshots, rendered fragments and validators for public property pages"""
+
+    def __init__(self, ttl_seconds=None, cache_alias=None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.PAGE_CACHE_TTL_SECONDS
+        self.cache_alias = cache_alias or settings.PAGE_CACHE_ALIAS
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def store(self, property_obj):
+        """Write a property's snapshot and slug mapping; returns the snapshot"""
+        snapshot = snapshot_of(property_obj)
+        self.cache.set_many({
+            SNAPSHOT_KEY.format(property_obj.pk): snapshot,
+            SLUG_KEY.format(property_obj.slug): str(property_obj.pk),
+        }, self.ttl_seconds)
+        return snapshot
+
+    def snapshot(self, slug):
+        """The property with this slug as a snapshot, or None if there is none"""
+        from .models import Property
+
+        property_id = self.cache.get(SLUG_KEY.format(slug))
+        if property_id is not None:
+            snapshot = self.cache.get(SNAPSHOT_KEY.format(property_id))
+            # A renamed property's old slug still maps to its id until the entry expires
+            if snapshot is not None and snapshot.slug == slug:
+                return snapshot
+        property_obj = Property.objects.filter(slug=slug).first()
+        return self.store(property_obj) if property_obj is not None else None
+
+    def snapshots(self, property_ids):
+        """Snapshots for these ids in the same order; ids that no longer exist are skipped"""
+        from .models import Property
+
+        property_ids = [str(property_id) for property_id in property_ids]
+        cached = self.cache.get_many([SNAPSHOT_KEY.format(property_id) for property_id in property_ids])
+        found = {str(snapshot.pk): snapshot for snapshot in cached.values()}
+        missing = [property_id for property_id in property_ids if property_id not in found]
+        if missing:
+            for property_obj in Property.objects.filter(pk__in=missing):
+                found[str(property_obj.pk)] = self.store(property_obj)
+        return [found[property_id] for property_id in property_ids if property_id in found]
+
+    def fragment(self, name, key_parts, render):
+        """Cached HTML for ``name`` under ``key_parts``, calling ``render()`` on a miss"""
+        digest = hashlib.sha1('\x1f'.join(str(part) for part in key_parts).encode('utf-8')).hexdigest()
+        key = FRAGMENT_KEY.format(name, digest)
+        html = self.cache.get(key)
+        if html is None:
+            html = render()
+            self.cache.set(key, html, self.ttl_seconds)
+        return html
+
+    def catalog_version(self):
+        """Token that changes whenever any property is saved or deleted"""
+        version = self.cache.get(CATALOG_KEY)
+        if version is None:
+            # Start from the clock so a restarted cache never reuses an old token
+            self.cache.add(CATALOG_KEY, int(time.time() * 1000), None)
+            version = self.cache.get(CATALOG_KEY)
+        return version
+
+    def _bump_catalog(self):
+        try:
+            self.cache.incr(CATALOG_KEY)
+        except ValueError:
+            pass  # Not set yet: the next catalog_version() starts a new token
+
+    def property_saved(self, property_obj):
+        if property_obj.get_deferred_fields():
+            self.cache.delete(SNAPSHOT_KEY.format(property_obj.pk))
+        else:
+            self.store(property_obj)
+        self._bump_catalog()
+
+    def invalidate(self, property_ids):
+        """Drop snapshots of deleted properties or of writes that bypass post_save (queryset.update())"""
+        self.cache.delete_many([SNAPSHOT_KEY.format(property_id) for property_id in property_ids])
+        self._bump_catalog()
+
+    def etag(self, snapshot, request):
+        # Signed-in visitors see a different page chrome for the same property
+        audience = 'user' if request.user.is_authenticated else 'public'
+        return quote_etag(f"{snapshot.pk}-{snapshot.cache_version}-{audience}")
+
+
+# Global instance
+page_cache = PropertyPageCache()
@@ -0,0 +1,148 @@
+"""
+Cache of query text -> embedding vector for chat and search
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    """Canonical form used as the cache key: case, spacing and edge punctuation don't matter"""
+    text = re.sub(r'\s+', ' ', (text or '').lower()).strip()
+    return text.strip('.,!?;:"\'')
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of normalized query -> float32 vector
+
+    The in-process tier is capped by bytes and TTL. When
+    QUERY_EMBEDDING_CACHE_ALIAS names a Django cache, misses fall through
+    to it so gunicorn workers share what any one of them has embedded.
+    """
+
+    def __init__(self, max_bytes=None, ttl_seconds=None, cache_alias=None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.QUERY_EMBEDDING_CACHE_MAX_BYTES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS
+        self.cache_alias = cache_alias if cache_alias is not None else settings.QUERY_EMBEDDING_CACHE_ALIAS
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, model, text):
+        return f"{model}:{normalize_query(text)}"
+
+    def _shared_key(self, key):
+        # Hashed so memcached's 250-byte key limit never applies
+        return 'qemb:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _shared_cache(self):
+        if not self.cache_alias:
+            return None
+        try:
+            return caches[self.cache_alias]
+        except Exception as e:
+            logger.warning(f"Query embedding cache alias '{self.cache_alias}' unavailable: {e}")
+            return None
+
+    def get(self, model, text):
+        """Return the cached vector or None"""
+        key = self._key(model, text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                self._remove(key)
+
+        shared = self._shared_cache()
+        if shared is not None:
+            blob = shared.get(self._shared_key(key))
+            if blob is not None:
+                vector = np.frombuffer(blob, dtype='<f4')
+                self._store(key, vector)
+                with self._lock:
+                    self.shared_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, model, text, vector):
+        """Cache a vector in both tiers"""
+        key = self._key(model, text)
+        vector = np.asarray(vector, dtype='<f4')
+        vector.setflags(write=False)
+        self._store(key, vector)
+
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(self._shared_key(key), vector.tobytes(), self.ttl_seconds)
+        return vector
+
+    def get_or_embed(self, model, text, embed):
+        """Return the cached vector, calling embed(text) and caching the result on a miss"""
+        vector = self.get(model, text)
+        if vector is None:
+            vector = self.set(model, text, embed(text))
+        return vector
+
+    def _store(self, key, vector):
+        size = vector.nbytes + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (vector, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[0].nbytes + len(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Counters for monitoring and tests"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+# Global instance
+query_embedding_cache = QueryEmbeddingCache()
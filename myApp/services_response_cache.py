@@ -0,0 +1,218 @@
+"""
+Cache of answers to visitor questions about a property
+
+Most property questions ("is there parking?", "how much is rent?") repeat
+across visitors. Answers are keyed by the property's content version, so
+editing any field of its fact sheet changes the key and stale answers are
+never served. Callers pass the rest of the prompt's data (the area's
+comparable listings) as ``context``, which is folded into the version the
+same way. Within a version a question hits on:
+
+    1. its normalized text (case, spacing and edge punctuation ignored), or
+    2. a cached question whose embedding is at least
+       PROPERTY_RESPONSE_CACHE_SIMILARITY cosine-similar and mentions the
+       same numbers ("under 30k" must not answer "under 40k")
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .services_fact_sheets import property_version
+from .services_query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*')
+
+
+def _numbers(text):
+    return tuple(NUMBER_RE.findall(text))
+
+
+def _version(property_obj, context):
+    version = property_version(property_obj)
+    if context:
+        version += ':' + hashlib.sha1(context.encode('utf-8')).hexdigest()[:16]
+    return version
+
+
+class PropertyResponseCache:
+    """
+    Per-property answer cache with exact and semantic lookup
+
+    In-process entries are grouped per property and only the newest version
+    of a property is kept. When PROPERTY_RESPONSE_CACHE_ALIAS names a Django
+    cache, exact-text answers are shared across workers through it too.
+    """
+
+    def __init__(self, max_properties=None, max_per_property=None, ttl_seconds=None, similarity=None, cache_alias=None):
+        self.max_properties = max_properties or settings.PROPERTY_RESPONSE_CACHE_MAX_PROPERTIES
+        self.max_per_property = max_per_property or settings.PROPERTY_RESPONSE_CACHE_MAX_PER_PROPERTY
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.PROPERTY_RESPONSE_CACHE_TTL_SECONDS
+        self.similarity = similarity if similarity is not None else settings.PROPERTY_RESPONSE_CACHE_SIMILARITY
+        self.cache_alias = cache_alias if cache_alias is not None else settings.PROPERTY_RESPONSE_CACHE_ALIAS
+        # property id -> {'version': str, 'entries': OrderedDict(normalized question -> entry)}
+        self._properties = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared_cache(self):
+        if not self.cache_alias:
+            return None
+        try:
+            return caches[self.cache_alias]
+        except Exception as e:
+            logger.warning(f"Property response cache alias '{self.cache_alias}' unavailable: {e}")
+            return None
+
+    def _shared_key(self, property_id, version, question):
+        raw = f"{property_id}:{version}:{question}"
+        return 'presp:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _bucket(self, property_id, version, create=False):
+        """The property's live entries for ``version``; older versions are dropped on sight"""
+        key = str(property_id)
+        bucket = self._properties.get(key)
+        if bucket is not None and bucket['version'] != version:
+            del self._properties[key]
+            bucket = None
+        if bucket is None and create:
+            bucket = {'version': version, 'entries': OrderedDict()}
+            self._properties[key] = bucket
+            while len(self._properties) > self.max_properties:
+                self._properties.popitem(last=False)
+        if bucket is not None:
+            self._properties.move_to_end(key)
+        return bucket
+
+    def get(self, property_obj, question, embed=None, context=None):
+        """
+        Return a cached answer or None
+
+        Args:
+            embed: optional callable text -> vector enabling semantic matches;
+                only called when the exact lookup misses
+            context: other text the answer was generated from; answers
+                cached with different context miss
+        """
+        version = _version(property_obj, context)
+        normalized = normalize_query(question)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._bucket(property_obj.id, version)
+            if bucket is not None:
+                entry = bucket['entries'].get(normalized)
+                if entry is not None and entry['expires_at'] > now:
+                    bucket['entries'].move_to_end(normalized)
+                    self.hits += 1
+                    return entry['answer']
+                candidates = [
+                    entry for entry in bucket['entries'].values()
+                    if entry['vector'] is not None and entry['expires_at'] > now
+                    and entry['numbers'] == _numbers(normalized)
+                ]
+            else:
+                candidates = []
+
+        shared = self._shared_cache()
+        if shared is not None:
+            answer = shared.get(self._shared_key(property_obj.id, version, normalized))
+            if answer is not None:
+                self._store(property_obj.id, version, normalized, answer, None)
+                with self._lock:
+                    self.shared_hits += 1
+                return answer
+
+        if candidates and embed is not None:
+            try:
+                vector = _unit(np.asarray(embed(question), dtype=np.float32))
+            except Exception as e:
+                logger.warning(f"Could not embed question for response cache: {e}")
+                vector = None
+            if vector is not None:
+                best, best_score = None, self.similarity
+                for entry in candidates:
+                    score = float(np.dot(vector, entry['vector']))
+                    if score >= best_score:
+                        best, best_score = entry, score
+                if best is not None:
+                    with self._lock:
+                        self.semantic_hits += 1
+                    return best['answer']
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, property_obj, question, answer, embed=None, context=None):
+        """Cache an answer; ``embed`` (text -> vector) makes it reachable by similar questions"""
+        version = _version(property_obj, context)
+        normalized = normalize_query(question)
+        vector = None
+        if embed is not None:
+            try:
+                vector = _unit(np.asarray(embed(question), dtype=np.float32))
+            except Exception as e:
+                logger.warning(f"Could not embed question for response cache: {e}")
+        self._store(property_obj.id, version, normalized, answer, vector)
+
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(self._shared_key(property_obj.id, version, normalized), answer, self.ttl_seconds)
+
+    def _store(self, property_id, version, normalized, answer, vector):
+        with self._lock:
+            entries = self._bucket(property_id, version, create=True)['entries']
+            entries.pop(normalized, None)
+            entries[normalized] = {
+                'answer': answer,
+                'vector': vector,
+                'numbers': _numbers(normalized),
+                'expires_at': time.monotonic() + self.ttl_seconds,
+            }
+            while len(entries) > self.max_per_property:
+                entries.popitem(last=False)
+
+    def invalidate(self, property_id):
+        """Drop a property's in-process answers (shared entries expire with the version key)"""
+        with self._lock:
+            self._properties.pop(str(property_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._properties.clear()
+
+    def stats(self):
+        """Counters for monitoring and tests"""
+        with self._lock:
+            hits = self.hits + self.semantic_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                'properties': len(self._properties),
+                'entries': sum(len(bucket['entries']) for bucket in self._properties.values()),
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Global instance
+property_response_cache = PropertyResponseCache()
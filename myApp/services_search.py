@@ -0,0 +1,293 @@
+"""
+Hybrid lexical (BM25) + vector retrieval for property search
+"""
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max, Q
+
+from .models import Property
+from .services_filter_index import PropertyFilterIndex
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_SCOPE = '*'
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'at', 'bed', 'for', 'i', 'in', 'is', 'looking', 'me', 'near', 'of',
+    'on', 'or', 'show', 'some', 'the', 'to', 'want', 'with',
+}
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens without stopwords"""
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def filters_q(filters):
+    """The structured filters as a Q, to re-check index results against the live rows"""
+    filters = filters or {}
+    condition = Q()
+    if filters.get('price_min') is not None:
+        condition &= Q(price_amount__gte=filters['price_min'])
+    if filters.get('price_max') is not None:
+        condition &= Q(price_amount__lte=filters['price_max'])
+    if filters.get('beds_min') is not None:
+        condition &= Q(beds__gte=filters['beds_min'])
+    if filters.get('city'):
+        needle = filters['city'].strip()
+        condition &= Q(city__icontains=needle) | Q(area__icontains=needle)
+    if filters.get('is_active') is not None:
+        condition &= Q(is_active=bool(filters['is_active']))
+    return condition
+
+
+def property_search_text(property_obj):
+    """Text indexed for a property; the same canonical document the embeddings use"""
+    from .services_vector import vector_service
+    return vector_service.build_property_document(property_obj)
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over one scope's properties
+
+    Structured columns live in a PropertyFilterIndex over the same document
+    order, so filters become a bitmap applied before ranking, never a table scan.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.property_ids = []
+        self.postings = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.avg_length = 0.0
+        self.vocabulary = []
+        self.filters = PropertyFilterIndex()
+        self.recency = np.zeros(0, dtype=np.int64)
+        self.signature = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self.property_ids)
+
+    def build(self, properties):
+        """Index an iterable of Property objects (expected newest first)"""
+        postings = {}
+        lengths = []
+        columns = []
+        for doc, property_obj in enumerate(properties):
+            tokens = tokenize(property_search_text(property_obj))
+            lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc, tf))
+            self.property_ids.append(str(property_obj.id))
+            columns.append((
+                property_obj.id, property_obj.price_amount, property_obj.beds,
+                property_obj.city, property_obj.area, property_obj.is_active,
+            ))
+
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+        self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if lengths else 0.0
+        self.filters.build(columns)
+        # Documents arrive newest first; lower rank = newer
+        self.recency = np.arange(len(lengths), dtype=np.int64)
+        self.built_at = time.monotonic()
+
+    def filter_mask(self, filters):
+        """Boolean mask of documents satisfying structured filters"""
+        return self.filters.mask(filters)
+
+    def _expand(self, term):
+        """Exact term, or vocabulary terms it prefixes (so 'mak' still finds 'makati')"""
+        if term in self.postings:
+            return [term]
+        if len(term) < 3:
+            return []
+        start = bisect.bisect_left(self.vocabulary, term)
+        expanded = []
+        for candidate in self.vocabulary[start:start + settings.SEARCH_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            expanded.append(candidate)
+        return expanded
+
+    def score(self, query, mask=None):
+        """BM25 scores for documents matching any query term, as {doc: score}"""
+        scores = {}
+        total = len(self)
+        if not total:
+            return scores
+        for term in set(tokenize(query)):
+            for expanded in self._expand(term):
+                postings = self.postings[expanded]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc, tf in postings:
+                    if mask is not None and not mask[doc]:
+                        continue
+                    norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[doc] / (self.avg_length or 1.0))
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+        return scores
+
+
+class HybridSearchEngine:
+    """Per-scope lexical indexes fused with the vector index by reciprocal rank"""
+
+    RRF_K = 60
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _queryset(self, scope):
+        if scope == PUBLIC_SCOPE:
+            return Property.objects.all()
+        return Property.objects.filter(organization_id=scope)
+
+    def _signature(self, scope):
+        # updated_at moves on every edit, including queryset.update() archives and reprices
+        stats = self._queryset(scope).aggregate(rows=Count('id'), latest=Max('updated_at'))
+        return (stats['rows'], stats['latest'])
+
+    def get_index(self, scope):
+        """Return the scope's lexical index, rebuilding when rows changed or it aged out"""
+        now = time.monotonic()
+        with self._lock:
+            index = self._indexes.get(scope)
+
+        if index is not None:
+            if now - index.built_at < settings.SEARCH_INDEX_MAX_AGE_SECONDS:
+                if now - index.checked_at < settings.SEARCH_INDEX_REFRESH_SECONDS:
+                    return index
+                index.checked_at = now
+                if index.signature == self._signature(scope):
+                    return index
+
+        started = time.monotonic()
+        index = LexicalIndex()
+        index.build(self._queryset(scope).order_by('-created_at').iterator())
+        index.signature = self._signature(scope)
+        index.checked_at = time.monotonic()
+        logger.info(f"Built search index for scope {scope}: {len(index)} properties in {(time.monotonic() - started) * 1000:.0f}ms")
+
+        with self._lock:
+            self._indexes[scope] = index
+        return index
+
+    def invalidate(self, organization_id=None):
+        """Drop an organization's index and the public one that also contains its rows"""
+        with self._lock:
+            if organization_id is not None:
+                self._indexes.pop(str(organization_id), None)
+            self._indexes.pop(PUBLIC_SCOPE, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def _vector_ranking(self, organization, query, index, mask, limit, filtered=False):
+        from .services_vector import vector_service
+        from .services_vector_index import vector_index_registry
+        if not vector_service.provider.available:
+            return []
+        try:
+            vector = vector_service.embed_query(query)
+            allowed = None
+            if filtered:
+                allowed = {index.property_ids[doc] for doc in np.flatnonzero(mask)}
+            ranked = vector_index_registry.search(organization, vector, limit * 4, allowed_property_ids=allowed)
+        except Exception as e:
+            logger.warning(f"Vector ranking unavailable for hybrid search: {e}")
+            return []
+        positions = {property_id: doc for doc, property_id in enumerate(index.property_ids)}
+        docs = []
+        for property_id, _ in ranked:
+            doc = positions.get(property_id)
+            if doc is not None and mask[doc]:
+                docs.append(doc)
+        return docs
+
+    def search(self, query='', filters=None, organization=None, limit=None, use_vector=True):
+        """
+        Rank properties for a free-text query under structured filters
+
+        Args:
+            query: free text; empty means "filters only, newest first"
+            filters: dict with optional price_min, price_max, beds_min, city, is_active
+            organization: restricts to one organization and enables vector fusion;
+                None searches the public catalog lexically
+            limit: max results (None = every match)
+
+        Returns:
+            list: property id strings, best first
+        """
+        scope = str(organization.id) if organization is not None else PUBLIC_SCOPE
+        index = self.get_index(scope)
+        mask = index.filter_mask(filters)
+        if not tokenize(query):
+            docs = np.flatnonzero(mask)
+            if limit is not None:
+                docs = docs[:limit]
+            return [index.property_ids[doc] for doc in docs]
+
+        lexical = index.score(query, mask)
+        rank_limit = limit or len(index)
+        lexical_docs = heapq.nlargest(rank_limit, lexical, key=lambda doc: (lexical[doc], -index.recency[doc]))
+
+        vector_docs = []
+        if use_vector and organization is not None:
+            vector_docs = self._vector_ranking(
+                organization, query, index, mask,
+                min(rank_limit, settings.SEARCH_VECTOR_CANDIDATES),
+                filtered=not mask.all(),
+            )
+
+        fused = {}
+        for ranking in (lexical_docs, vector_docs):
+            for rank, doc in enumerate(ranking):
+                fused[doc] = fused.get(doc, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+
+        ranked = sorted(fused, key=lambda doc: (-fused[doc], index.recency[doc]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [index.property_ids[doc] for doc in ranked]
+
+    def current_ids(self, property_ids, filters=None):
+        """
+        The ids whose rows still satisfy the filters, in the same order
+
+        Another worker's writes reach this process's index only when the
+        signature check runs, so results are re-checked against the table.
+        """
+        if not property_ids:
+            return []
+        matching = {
+            str(pk) for pk in Property.objects.filter(filters_q(filters), pk__in=property_ids).values_list('pk', flat=True)
+        }
+        return [property_id for property_id in property_ids if property_id in matching]
+
+    def search_properties(self, query='', filters=None, **kwargs):
+        """Same as search() but returns Property objects in rank order, re-checked against the filters"""
+        ids = self.search(query, filters=filters, **kwargs)
+        found = {str(prop.pk): prop for prop in Property.objects.filter(filters_q(filters), pk__in=ids)}
+        return [found[property_id] for property_id in ids if property_id in found]
+
+
+# Global instance
+search_engine = HybridSearchEngine()
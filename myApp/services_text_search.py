@@ -0,0 +1,170 @@
+"""
+Indexed substring search over property text columns
+
+``Q(title__icontains=q) | Q(description__icontains=q)`` compiles to
+``LIKE '%q%'``, which no B-tree index can serve, so every keyword lookup
+scanned the whole property table. ``text_search.q(query, fields)`` returns a
+Q with the same "case-insensitive substring in any of these columns" meaning,
+backed by a text index chosen from the database in use:
+
+    postgresql  pg_trgm GIN indexes on UPPER(column), which serve the
+                UPPER(col) LIKE UPPER('%q%') that icontains generates
+    sqlite      an FTS5 table with the trigram tokenizer (SQLite 3.34+),
+                kept in sync with myApp_property by triggers
+    otherwise   plain icontains
+
+Trigram indexes need at least three characters; shorter queries fall back to
+icontains. Organization scoping stays on the queryset the Q is applied to.
+
+The index is created by migrations, never by a request. A later migration
+that rebuilds myApp_property on SQLite drops the FTS triggers; searches then
+fall back to icontains until ``manage.py rebuild_text_index`` reinstalls it.
+"""
+import logging
+import sqlite3
+import threading
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+PROPERTY_TABLE = 'myApp_property'
+FTS_TABLE = 'myApp_property_fts'
+TEXT_FIELDS = ('title', 'area', 'city', 'description', 'badges')
+FTS_TRIGGERS = ('myApp_property_fts_insert', 'myApp_property_fts_update', 'myApp_property_fts_delete')
+MIN_INDEXED_CHARS = 3
+
+
+def fts5_trigram_supported(db_connection):
+    """FTS5 is compiled in and has the trigram tokenizer (SQLite 3.34+)"""
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    with db_connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def install_text_index(db_connection):
+    """Create (or rebuild) the text index for the connection's database; returns the backend name"""
+    if db_connection.vendor == 'postgresql':
+        with db_connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for field in TEXT_FIELDS:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS property_{field}_trgm_idx '
+                    f'ON "{PROPERTY_TABLE}" USING gin ((UPPER("{field}"::text)) gin_trgm_ops)'
+                )
+        return 'trigram'
+    if db_connection.vendor != 'sqlite' or not fts5_trigram_supported(db_connection):
+        return 'like'
+
+    drop_text_index(db_connection)
+    columns = ', '.join(TEXT_FIELDS)
+    new_values = ', '.join(f'NEW.{field}' for field in TEXT_FIELDS)
+    insert_new = f'INSERT INTO {FTS_TABLE}(rowid, property_id, {columns}) VALUES (NEW.rowid, NEW.id, {new_values});'
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(property_id UNINDEXED, {columns}, tokenize='trigram')"
+        )
+        # FTS rows share the property's rowid, so trigger updates and deletes are key lookups
+        cursor.execute(
+            f'CREATE TRIGGER myApp_property_fts_insert AFTER INSERT ON "{PROPERTY_TABLE}" BEGIN {insert_new} END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER myApp_property_fts_update AFTER UPDATE OF {columns} ON "{PROPERTY_TABLE}" BEGIN '
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = OLD.rowid; {insert_new} END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER myApp_property_fts_delete AFTER DELETE ON "{PROPERTY_TABLE}" BEGIN '
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = OLD.rowid; END'
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, property_id, {columns}) '
+            f'SELECT rowid, id, {columns} FROM "{PROPERTY_TABLE}"'
+        )
+    return 'fts5'
+
+
+def drop_text_index(db_connection):
+    with db_connection.cursor() as cursor:
+        if db_connection.vendor == 'postgresql':
+            for field in TEXT_FIELDS:
+                cursor.execute(f'DROP INDEX IF EXISTS property_{field}_trgm_idx')
+        elif db_connection.vendor == 'sqlite':
+            for trigger in FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _fts5_installed(db_connection):
+    """The FTS table and all of its triggers exist (SQLite table rebuilds drop triggers)"""
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE (type = 'table' AND name = %s) OR (type = 'trigger' AND name IN (%s, %s, %s))",
+            [FTS_TABLE, *FTS_TRIGGERS],
+        )
+        return cursor.fetchone()[0] == 1 + len(FTS_TRIGGERS)
+
+
+def _fts5_phrase(query, fields):
+    phrase = '"' + query.replace('"', '""') + '"'
+    if tuple(fields) == TEXT_FIELDS:
+        return phrase
+    return '{' + ' '.join(fields) + '} : ' + phrase
+
+
+class PropertyTextSearch:
+    """Substring matching over property text columns through the database's text index"""
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """'trigram', 'fts5' or 'like', detected once per process"""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._detect()
+        return self._backend
+
+    def _detect(self):
+        if connection.vendor == 'postgresql':
+            return 'trigram'
+        if connection.vendor != 'sqlite' or not fts5_trigram_supported(connection):
+            return 'like'
+        if _fts5_installed(connection):
+            return 'fts5'
+        # A migration that rebuilt the property table dropped the triggers
+        logger.warning("Property FTS5 text index is missing or incomplete, using LIKE scans; run manage.py rebuild_text_index")
+        return 'like'
+
+    def reset(self):
+        self._backend = None
+
+    def q(self, query, fields=TEXT_FIELDS):
+        """Q matching properties whose ``fields`` contain ``query`` (case-insensitive)"""
+        query = (query or '').strip()
+        fields = tuple(fields)
+        if not query:
+            return Q()
+        if self.backend == 'fts5' and len(query) >= MIN_INDEXED_CHARS:
+            return Q(pk__in=RawSQL(
+                f'SELECT property_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [_fts5_phrase(query, fields)],
+            ))
+        # Postgres serves these from the trigram indexes
+        match = Q()
+        for field in fields:
+            match |= Q(**{f'{field}__icontains': query})
+        return match
+
+    def filter(self, queryset, query, fields=TEXT_FIELDS):
+        return queryset.filter(self.q(query, fields))
+
+
+# Global instance
+text_search = PropertyTextSearch()
@@ -1,58 +1,242 @@
 """
 Vector embedding service for property search
 """
-import openai
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from .models import Property, PropertyEmbedding, Organization
+from .services_embeddings import get_embedding_provider
+from .services_fact_sheets import format_fact_sheets
+from .services_filter_index import filter_index_registry
+from .services_query_cache import query_embedding_cache
+from .services_vector_index import vector_index_registry
+from .utils.text_chunker import chunk_document
+import hashlib
 import json
+import logging
+import random
 import re
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class VectorEmbeddingService:
     """Service for managing property embeddings and vector search"""
     
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.embedding_model = settings.EMBEDDING_MODEL
-        self.vector_dimensions = settings.VECTOR_DIMENSIONS
+    def __init__(self, provider=None):
+        self.provider = provider or get_embedding_provider()
+    
+    @property
+    def embedding_model(self):
+        return self.provider.model
+    
+    @property
+    def vector_dimensions(self):
+        return self.provider.dimensions
     
     def create_property_embedding(self, property_obj):
         """Create embeddings for a property"""
         try:
-            # Build canonical document
-            doc_text = self.build_property_document(property_obj)
-            
-            # Chunk the document
-            chunks = self.chunk_text(doc_text)
-            
-            # Create embeddings for each chunk
-            embeddings = []
-            for i, chunk in enumerate(chunks):
-                embedding_response = self.client.embeddings.create(
-                    model=self.embedding_model,
-                    input=chunk
-                )
-                
-                embedding_vector = embedding_response.data[0].embedding
-                
-                # Store embedding
-                PropertyEmbedding.objects.create(
-                    organization=property_obj.organization,
-                    property=property_obj,
-                    doc_id=f"prop:{property_obj.id}",
-                    chunk=i,
-                    embedding=embedding_vector
-                )
-                
-                embeddings.append(embedding_vector)
-            
-            return embeddings
-            
+            vectors = self._embed_properties([property_obj]).get(property_obj.id)
+            return vectors or []
         except Exception as e:
             print(f"Error creating embeddings for property {property_obj.id}: {e}")
             return []
     
+    def _embed_properties(self, properties, progress_callback=None, stats=None, refresh_index=True):
+        """
+        Embed and store chunks for many properties using packed multi-input requests
+        
+        Chunks whose content hash matches an existing row are reused without an
+        API call, and identical chunk texts across the batch are embedded once.
+        The rest are packed across properties into requests up to
+        EMBEDDING_BATCH_MAX_TOKENS / EMBEDDING_BATCH_MAX_INPUTS. A property's rows
+        are replaced as soon as all of its chunks have vectors, so an interrupted
+        run keeps everything finished so far. Failed requests are retried and then
+        split, so one bad chunk does not force its neighbours to be re-embedded.
+        
+        Args:
+            stats: optional dict accumulating skipped/updated/deleted chunk counts
+            refresh_index: patch this process's live vector index per property;
+                batch callers pass False and swap in a rebuilt index instead
+        
+        Returns:
+            dict: property id -> list of vectors, or None if the property failed
+        """
+        pending, work = self.plan_property_embeddings(properties)
+        stats = stats if stats is not None else {}
+        
+        results = {}
+        for property_id, state in pending.items():
+            if state['left'] == 0:
+                results[property_id] = self._store_property_vectors(state, stats, refresh_index)
+        
+        done = 0
+        for batch in self._pack_batches(work):
+            vectors = self._embed_texts_with_retry([text for _, text, _ in batch])
+            for (_, _, waiters), vector in zip(batch, vectors):
+                for property_id, chunk_index in waiters:
+                    state = pending[property_id]
+                    state['vectors'][chunk_index] = vector
+                    state['left'] -= 1
+                    if state['left'] == 0:
+                        results[property_id] = self._store_property_vectors(state, stats, refresh_index)
+            
+            done += len(batch)
+            if progress_callback:
+                progress_callback(done, len(work))
+        
+        return results
+    
+    def plan_property_embeddings(self, properties):
+        """
+        Work out which chunks need an embeddings call
+        
+        A chunk is reusable when any embedding row in the same organizations
+        already has its content hash, including rows of other properties, so
+        boilerplate shared across listings is embedded once.
+        
+        Returns:
+            tuple: (per-property state keyed by id,
+                    list of (content_hash, text, [(property_id, chunk_index), ...]) to embed)
+        """
+        properties = list(properties)
+        documents = {}
+        all_hashes = set()
+        for property_obj in properties:
+            chunks = self.chunk_text(self.build_property_document(property_obj))
+            hashes = [self.content_hash(chunk) for chunk in chunks]
+            documents[property_obj.id] = (chunks, hashes)
+            all_hashes.update(hashes)
+        
+        organization_ids = {property_obj.organization_id for property_obj in properties}
+        known = {}
+        rows = PropertyEmbedding.objects.filter(organization_id__in=organization_ids, content_hash__in=all_hashes)
+        for row in rows.defer('embedding'):
+            known.setdefault(row.content_hash, {})[row.property_id] = row
+        existing_counts = {}
+        for row in PropertyEmbedding.objects.filter(property__in=properties).values_list('property_id', flat=True):
+            existing_counts[row] = existing_counts.get(row, 0) + 1
+        
+        pending = {}
+        work = {}
+        for property_obj in properties:
+            chunks, hashes = documents[property_obj.id]
+            state = {
+                'property': property_obj,
+                'hashes': hashes,
+                'vectors': [None] * len(chunks),
+                'left': 0,
+                'existing': existing_counts.get(property_obj.id, 0),
+            }
+            for i, (chunk, chunk_hash) in enumerate(zip(chunks, hashes)):
+                owners = known.get(chunk_hash)
+                if owners:
+                    # Prefer the property's own row so unchanged properties are recognised as such
+                    state['vectors'][i] = owners.get(property_obj.id) or next(iter(owners.values()))
+                else:
+                    work.setdefault(chunk_hash, (chunk_hash, chunk, []))[2].append((property_obj.id, i))
+                    state['left'] += 1
+            pending[property_obj.id] = state
+        
+        return pending, list(work.values())
+    
+    def content_hash(self, text):
+        """Hash of a chunk's canonical text, scoped to the embedding model"""
+        return hashlib.sha256(f"{self.embedding_model}\n{text}".encode('utf-8')).hexdigest()
+    
+    def _pack_batches(self, work):
+        """Group (content_hash, text, waiters) items into request-sized batches"""
+        batch = []
+        batch_tokens = 0
+        for item in work:
+            tokens = self.estimate_tokens(item[1])
+            if batch and (
+                batch_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS
+                or len(batch) >= settings.EMBEDDING_BATCH_MAX_INPUTS
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(item)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+    
+    def estimate_tokens(self, text):
+        """Cheap upper-bound token estimate (~4 characters per token for English)"""
+        return len(text) // 4 + 1
+    
+    def _embed_texts_with_retry(self, texts):
+        """Embed texts in one request, retrying with backoff and splitting on repeated failure"""
+        attempts = settings.EMBEDDING_BATCH_MAX_RETRIES
+        for attempt in range(attempts):
+            try:
+                return self.provider.embed(texts)
+            except Exception as e:
+                logger.warning(f"Embedding request for {len(texts)} chunks failed (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(min(2 ** attempt, 30) * (0.5 + random.random()))
+        
+        if len(texts) == 1:
+            return [None]
+        middle = len(texts) // 2
+        return self._embed_texts_with_retry(texts[:middle]) + self._embed_texts_with_retry(texts[middle:])
+    
+    def _store_property_vectors(self, state, stats, refresh_index=True):
+        """Replace a property's embedding rows, or leave them untouched if any chunk failed"""
+        property_obj = state['property']
+        vectors = state['vectors']
+        if any(vector is None for vector in vectors):
+            logger.error(f"Error creating embeddings for property {property_obj.id}: some chunks failed")
+            return None
+        
+        reused = [isinstance(vector, PropertyEmbedding) for vector in vectors]
+        skipped = sum(reused)
+        stats['skipped'] = stats.get('skipped', 0) + skipped
+        stats['updated'] = stats.get('updated', 0) + len(vectors) - skipped
+        
+        unchanged = all(reused) and state['existing'] == len(vectors) and all(
+            vector.property_id == property_obj.id and vector.chunk == i for i, vector in enumerate(vectors)
+        )
+        if unchanged:
+            return [vector.get_vector().tolist() for vector in vectors]
+        
+        rows = []
+        for i, (vector, chunk_hash) in enumerate(zip(vectors, state['hashes'])):
+            # Store embedding (packed binary, see EMBEDDING_STORAGE_DTYPE)
+            row = PropertyEmbedding(
+                organization=property_obj.organization,
+                property=property_obj,
+                doc_id=f"prop:{property_obj.id}",
+                chunk=i,
+                content_hash=chunk_hash
+            )
+            if isinstance(vector, PropertyEmbedding):
+                # Reuse the packed bytes as-is; no decode/encode round trip
+                row.vector = vector.vector
+                row.vector_dtype = vector.vector_dtype
+                row.vector_dims = vector.vector_dims
+                row.vector_scale = vector.vector_scale
+            else:
+                row.set_vector(vector)
+            rows.append(row)
+        
+        with transaction.atomic():
+            deleted, _ = PropertyEmbedding.objects.filter(
+                organization=property_obj.organization,
+                property=property_obj
+            ).delete()
+            PropertyEmbedding.objects.bulk_create(rows)
+            # This property's reused chunks are written straight back, so they count as skipped rather than deleted
+            rewritten = {vector.pk for vector in vectors if isinstance(vector, PropertyEmbedding) and vector.property_id == property_obj.id}
+            stats['deleted'] = stats.get('deleted', 0) + deleted - len(rewritten)
+        
+        if refresh_index:
+            vector_index_registry.refresh_property(property_obj.organization, property_obj.id)
+        return [row.get_vector().tolist() for row in rows]
+    
     def build_property_document(self, property_obj):
         """Build a canonical document from property data"""
         parts = []
@@ -93,85 +277,111 @@ class VectorEmbeddingService:
         
         return " | ".join(parts)
     
-    def chunk_text(self, text, chunk_size=500, overlap=60):
-        """Split text into overlapping chunks"""
-        if len(text) <= chunk_size:
-            return [text]
+    def chunk_text(self, text, max_tokens=None):
+        """Split a property document into token-budgeted chunks on field and sentence boundaries"""
+        return chunk_document(text, max_tokens or settings.EMBEDDING_CHUNK_MAX_TOKENS)
+    
+    def embed_query(self, query):
+        """Embedding for a search/chat query, served from the query cache when possible"""
+        return query_embedding_cache.get_or_embed(
+            self.embedding_model,
+            query,
+            lambda text: self.provider.embed([text])[0]
+        )
+    
+    async def aembed_query(self, query):
+        """embed_query() for async views: a cache hit costs no I/O, a miss awaits the provider"""
+        vector = query_embedding_cache.get(self.embedding_model, query)
+        if vector is None:
+            vectors = await self.provider.aembed([query])
+            vector = query_embedding_cache.set(self.embedding_model, query, vectors[0])
+        return vector
+    
+    def search_similar_properties(self, organization, query, limit=5, filters=None, query_embedding=None):
+        """Search for similar properties using vector similarity
         
-        chunks = []
-        start = 0
+        Returns Property objects ranked by cosine similarity, each carrying a
+        ``similarity`` attribute. Falls back to the organization's latest
+        active properties (``similarity=None``) when nothing has been embedded yet.
         
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at word boundary
-            if end < len(text):
-                # Look for the last space before the end
-                last_space = text.rfind(' ', start, end)
-                if last_space > start + chunk_size // 2:  # Don't break too early
-                    end = last_space
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            # Move start position with overlap
-            start = end - overlap
-            if start >= len(text):
-                break
+        ``filters`` (price_min, price_max, beds_min, city) restrict the
+        candidates inside the index, so a selective filter still returns
+        ``limit`` matches instead of whatever survived post-filtering.
+        Archived (inactive) properties are always filtered out.
         
-        return chunks
-    
-    def search_similar_properties(self, organization, query, limit=5):
-        """Search for similar properties using vector similarity"""
+        Pass ``query_embedding`` when the caller has already embedded ``query``
+        (e.g. concurrently in an async view).
+        """
+        allowed = None
         try:
-            # Generate embedding for query
-            query_embedding = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=query
-            ).data[0].embedding
+            allowed = filter_index_registry.allowed_ids(organization, {**(filters or {}), 'is_active': True})
+            if allowed is not None and not allowed:
+                return []
             
-            # For now, return active properties (will implement vector search with pgvector)
-            # This is a placeholder - in production, you'd use pgvector's cosine similarity
-            properties = Property.objects.filter(
-                organization=organization,
-                is_active=True
-            )[:limit]
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
             
-            return properties
+            ranked = vector_index_registry.search(
+                organization, query_embedding, limit, allowed_property_ids=allowed
+            )
+            if ranked:
+                properties = {
+                    str(pk): prop
+                    for pk, prop in Property.objects.filter(organization=organization, is_active=True).in_bulk(
+                        [property_id for property_id, _ in ranked]
+                    ).items()
+                }
+                results = []
+                for property_id, score in ranked:
+                    # Rows deleted or archived since the index was built are skipped
+                    prop = properties.get(property_id)
+                    if prop is not None:
+                        prop.similarity = score
+                        results.append(prop)
+                if results:
+                    return results
             
         except Exception as e:
             print(f"Error searching properties: {e}")
-            return Property.objects.filter(
-                organization=organization,
-                is_active=True
-            )[:limit]
+        
+        return self._fallback_properties(organization, limit, allowed)
+    
+    def _fallback_properties(self, organization, limit, allowed=None):
+        """Latest active properties for an organization when vector search has nothing to offer"""
+        properties = Property.objects.filter(organization=organization, is_active=True)
+        if allowed is not None:
+            properties = properties.filter(id__in=allowed)
+        properties = list(properties[:limit])
+        for prop in properties:
+            prop.similarity = None
+        return properties
     
     def update_property_embeddings(self, property_obj):
-        """Update embeddings for a property"""
-        # Delete existing embeddings
-        PropertyEmbedding.objects.filter(
-            organization=property_obj.organization,
-            property=property_obj
-        ).delete()
-        
-        # Create new embeddings
+        """Update embeddings for a property, re-embedding only chunks whose text changed"""
         return self.create_property_embedding(property_obj)
     
-    def batch_create_embeddings(self, organization, properties=None):
-        """Create embeddings for multiple properties"""
+    def batch_create_embeddings(self, organization, properties=None, progress_callback=None, stats=None,
+                                refresh_index=True):
+        """Create embeddings for multiple properties
+        
+        Args:
+            progress_callback: optional callable(chunks_done, chunks_total)
+            stats: optional dict accumulating skipped/updated/deleted chunk counts
+            refresh_index: see _embed_properties
+        """
         if properties is None:
-            properties = Property.objects.filter(
-                organization=organization,
-                is_active=True
-            )
+            properties = Property.objects.filter(organization=organization)
+        properties = list(properties)
+        
+        embedded = self._embed_properties(properties, progress_callback, stats, refresh_index)
         
         results = []
         for property_obj in properties:
-            embeddings = self.create_property_embedding(property_obj)
+            vectors = embedded.get(property_obj.id)
             results.append({
                 'property': property_obj,
-                'embeddings_count': len(embeddings)
+                'embeddings_count': len(vectors) if vectors else 0,
+                'failed': vectors is None
             })
         
         return results
@@ -180,17 +390,7 @@ class VectorEmbeddingService:
         """Get relevant property context for chat responses"""
         properties = self.search_similar_properties(organization, query, limit)
         
-        context_parts = []
-        for prop in properties:
-            context_parts.append(f"""
-Property: {prop.title}
-Location: {prop.city}, {prop.area}
-Price: ${prop.price_amount:,}
-Details: {prop.beds} bed, {prop.baths} bath, {prop.floor_area_sqm} sqm
-Description: {prop.description[:200] if prop.description else 'No description available'}...
-            """.strip())
-        
-        return "\n\n".join(context_parts) if context_parts else "No properties found matching your criteria."
+        return format_fact_sheets(properties, empty="No properties found matching your criteria.")
 
 
 # Global instance
@@ -0,0 +1,392 @@
+"""
+In-process approximate nearest neighbour index over property embeddings
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+
+from .models import PropertyEmbedding
+from .services_vector_shards import encode_signature, shard_store
+from .utils.vector_storage import load_embedding_matrix
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is listed in requirements.txt
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(matrix):
+    """L2-normalize a 2-D float32 matrix so inner product equals cosine similarity"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyFlatIndex:
+    """Exact inner-product index with the subset of the faiss API we use"""
+
+    def __init__(self, dimensions):
+        self.d = dimensions
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Wrap an existing (possibly memory-mapped) matrix without copying it; row i gets id i"""
+        index = cls(matrix.shape[1])
+        index.vectors = matrix
+        index.ids = np.arange(len(matrix), dtype=np.int64)
+        return index
+
+    @property
+    def ntotal(self):
+        return len(self.ids)
+
+    def add_with_ids(self, vectors, ids):
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.ids = np.concatenate([self.ids, ids])
+
+    def remove_ids(self, ids):
+        keep = ~np.isin(self.ids, ids)
+        removed = int(len(self.ids) - keep.sum())
+        self.vectors = self.vectors[keep]
+        self.ids = self.ids[keep]
+        return removed
+
+    def search(self, queries, k, allowed_ids=None):
+        vectors, ids = self.vectors, self.ids
+        if allowed_ids is not None:
+            keep = np.isin(ids, allowed_ids)
+            vectors, ids = vectors[keep], ids[keep]
+        k = min(k, len(ids))
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        scores = queries @ vectors.T
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), ids[top]
+
+
+class PropertyVectorIndex:
+    """ANN index over one organization's embedding chunks, ranked per property"""
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.index = None
+        self.trained_rows = 0
+        self.row_property = {}
+        self.property_rows = {}
+        self.next_id = 0
+        self.mapped = False
+        self.signature = None
+        self.checked_at = 0.0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.row_property)
+
+    def _new_index(self, vectors):
+        """Pick a flat index for small orgs and IVF once the catalog is large"""
+        if faiss is None:
+            return NumpyFlatIndex(self.dimensions)
+
+        rows = len(vectors)
+        if rows < settings.VECTOR_INDEX_IVF_MIN_ROWS:
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimensions))
+
+        # faiss wants ~39 training points per centroid
+        nlist = max(1, min(int(4 * np.sqrt(rows)), rows // 39))
+        quantizer = faiss.IndexFlatIP(self.dimensions)
+        index = faiss.IndexIVFFlat(quantizer, self.dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = min(nlist, settings.VECTOR_INDEX_NPROBE)
+        return index
+
+    def build(self, property_ids, vectors):
+        """Replace the index contents with the given chunk vectors"""
+        vectors = normalize_rows(vectors) if len(vectors) else np.zeros((0, self.dimensions), dtype=np.float32)
+        with self.lock:
+            self.index = self._new_index(vectors)
+            self.trained_rows = len(vectors)
+            self.row_property = {}
+            self.property_rows = {}
+            self.next_id = 0
+            self._add(property_ids, vectors)
+
+    def build_mapped(self, property_ids, matrix):
+        """
+        Serve a normalized, memory-mapped shard matrix in place
+
+        Exact search over the mapping; nothing is copied into this process's
+        heap. Mapped indexes are read-only and get replaced, not patched.
+        """
+        with self.lock:
+            self.index = NumpyFlatIndex.from_matrix(matrix)
+            self.trained_rows = len(matrix)
+            self.mapped = True
+            self.row_property = dict(enumerate(property_ids))
+            self.property_rows = {}
+            for row_id, property_id in enumerate(property_ids):
+                self.property_rows.setdefault(property_id, []).append(row_id)
+            self.next_id = len(matrix)
+
+    def _add(self, property_ids, vectors):
+        if not len(vectors):
+            return
+        ids = np.arange(self.next_id, self.next_id + len(vectors), dtype=np.int64)
+        self.next_id += len(vectors)
+        self.index.add_with_ids(vectors, ids)
+        for row_id, property_id in zip(ids.tolist(), property_ids):
+            self.row_property[row_id] = property_id
+            self.property_rows.setdefault(property_id, []).append(row_id)
+
+    def remove_property(self, property_id):
+        """Drop every chunk belonging to a property"""
+        with self.lock:
+            row_ids = self.property_rows.pop(property_id, [])
+            if row_ids and self.index is not None:
+                self.index.remove_ids(np.asarray(row_ids, dtype=np.int64))
+            for row_id in row_ids:
+                self.row_property.pop(row_id, None)
+
+    def upsert_property(self, property_id, vectors):
+        """Replace one property's chunks without rebuilding the whole index"""
+        with self.lock:
+            self.remove_property(property_id)
+            if self.index is None:
+                self.build([property_id] * len(vectors), vectors)
+                return
+            if len(vectors):
+                self._add([property_id] * len(vectors), normalize_rows(vectors))
+
+    def needs_retrain(self):
+        """IVF centroids drift once the catalog has grown well past the training set"""
+        return not self.mapped and (
+            len(self) >= settings.VECTOR_INDEX_IVF_MIN_ROWS
+            and len(self) > 2 * max(self.trained_rows, 1)
+        )
+
+    def _search(self, query, k, row_ids=None):
+        """Top-k chunk rows, restricted to row_ids when given"""
+        if row_ids is None:
+            return self.index.search(query, k)
+        if faiss is None:
+            return self.index.search(query, k, allowed_ids=row_ids)
+
+        selector = faiss.IDSelectorBatch(row_ids)
+        if isinstance(self.index, faiss.IndexIVF):
+            # A selective filter leaves few rows per list; probe every list so recall doesn't collapse
+            nprobe = self.index.nprobe
+            if len(row_ids) * 4 < len(self):
+                nprobe = self.index.nlist
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        return self.index.search(query, k, params=params)
+
+    def search(self, query_vector, limit=5, allowed=None):
+        """
+        Return [(property_id, score)] ranked by best chunk cosine similarity
+
+        Args:
+            allowed: optional set of property ids; only their chunks are
+                considered, inside the index rather than by post-filtering
+        """
+        with self.lock:
+            if self.index is None or not len(self):
+                return []
+
+            row_ids = None
+            total = len(self)
+            if allowed is not None:
+                row_ids = [row_id for property_id in allowed for row_id in self.property_rows.get(property_id, ())]
+                if not row_ids:
+                    return []
+                row_ids = np.asarray(row_ids, dtype=np.int64)
+                total = len(row_ids)
+
+            query = normalize_rows(query_vector)
+            k = min(total, max(limit * 4, limit + 16))
+            while True:
+                scores, ids = self._search(query, k, row_ids)
+                best = {}
+                for score, row_id in zip(scores[0].tolist(), ids[0].tolist()):
+                    property_id = self.row_property.get(row_id)
+                    if property_id is None:
+                        continue
+                    if score > best.get(property_id, -2.0):
+                        best[property_id] = score
+                # Chunks of the same property can crowd out the top-k, widen until we have enough
+                if len(best) >= limit or k >= total:
+                    break
+                k = min(total, k * 2)
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+
+class VectorIndexRegistry:
+    """Lazily built per-organization indexes kept in sync with PropertyEmbedding"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+
+    def _signature(self, organization_id):
+        stats = PropertyEmbedding.objects.filter(organization_id=organization_id).aggregate(
+            rows=Count('id'),
+            latest=Max('created_at'),
+        )
+        return (stats['rows'], stats['latest'])
+
+    def _load_rows(self, organization_id, property_id=None):
+        rows = PropertyEmbedding.objects.filter(organization_id=organization_id)
+        if property_id is not None:
+            rows = rows.filter(property_id=property_id)
+
+        property_ids, vectors = load_embedding_matrix(rows)
+        if not len(vectors):
+            return property_ids, np.zeros((0, settings.VECTOR_DIMENSIONS), dtype=np.float32)
+        return property_ids, vectors
+
+    def _build(self, organization_id):
+        started = time.monotonic()
+        if shard_store.enabled:
+            index = self._build_mapped(organization_id)
+        else:
+            property_ids, vectors = self._load_rows(organization_id)
+            dimensions = vectors.shape[1] if len(vectors) else settings.VECTOR_DIMENSIONS
+            index = PropertyVectorIndex(dimensions)
+            index.build(property_ids, vectors)
+            index.signature = self._signature(organization_id)
+        index.checked_at = time.monotonic()
+
+        logger.info(
+            f"Built vector index for organization {organization_id}: "
+            f"{len(index)} chunks in {(time.monotonic() - started) * 1000:.0f}ms"
+        )
+        return index
+
+    def _build_mapped(self, organization_id):
+        """Open the organization's shard, first writing a new one if the rows changed since"""
+        # Under the lock another worker's shard for the same rows is seen and reused, and
+        # no prune can remove the file between reading the manifest and mapping it
+        with shard_store.locked(organization_id):
+            signature = self._signature(organization_id)
+            manifest = shard_store.read_manifest(organization_id)
+            if manifest is None or manifest.get('signature') != encode_signature(signature):
+                property_ids, vectors = self._load_rows(organization_id)
+                if len(vectors):
+                    vectors = normalize_rows(vectors)
+                manifest = shard_store.write(organization_id, property_ids, vectors, signature)
+                logger.info(f"Wrote vector shard v{manifest['version']} for organization {organization_id}")
+
+            property_ids, matrix = shard_store.open(organization_id, manifest)
+        index = PropertyVectorIndex(manifest['dimensions'] or settings.VECTOR_DIMENSIONS)
+        index.build_mapped(property_ids, matrix)
+        index.signature = signature
+        return index
+
+    def get(self, organization):
+        """
+        Return the organization's index
+
+        Only the very first search for an organization waits for a build. When
+        another process has changed the rows, the current index keeps serving
+        while a replacement is built in the background and swapped in.
+        """
+        organization_id = str(organization.id)
+        with self._lock:
+            index = self._indexes.get(organization_id)
+
+        if index is None:
+            return self.rebuild(organization_id)
+
+        if time.monotonic() - index.checked_at < settings.VECTOR_INDEX_REFRESH_SECONDS:
+            return index
+        index.checked_at = time.monotonic()
+        if index.signature != self._signature(organization_id) or index.needs_retrain():
+            self.rebuild_in_background(organization_id)
+        return index
+
+    def rebuild(self, organization_id):
+        """Build a fresh index off to the side and atomically swap it in"""
+        index = self._build(str(organization_id))
+        with self._lock:
+            self._indexes[str(organization_id)] = index
+        return index
+
+    def rebuild_in_background(self, organization_id):
+        """Start a rebuild thread unless one is already running for the organization"""
+        organization_id = str(organization_id)
+        with self._lock:
+            if organization_id in self._rebuilding:
+                return
+            self._rebuilding.add(organization_id)
+
+        def run():
+            try:
+                self.rebuild(organization_id)
+            except Exception as e:
+                logger.error(f"Background vector index rebuild failed for organization {organization_id}: {e}")
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(organization_id)
+                # Each thread gets its own DB connection; don't leak it
+                connection.close()
+
+        threading.Thread(target=run, name=f"vector-index-{organization_id}", daemon=True).start()
+
+    def is_loaded(self, organization_id):
+        with self._lock:
+            return str(organization_id) in self._indexes
+
+    def search(self, organization, query_vector, limit=5, allowed_property_ids=None):
+        """Search an organization's index, returning [(property_id, score)]"""
+        return self.get(organization).search(query_vector, limit, allowed=allowed_property_ids)
+
+    def refresh_property(self, organization, property_id):
+        """Reload one property's chunks after its embeddings were written"""
+        organization_id = str(organization.id)
+        with self._lock:
+            index = self._indexes.get(organization_id)
+        if index is None:
+            # Built lazily on the next search
+            return
+
+        if index.mapped:
+            # Shards are immutable; publish a new version instead of patching this one
+            self.rebuild_in_background(organization_id)
+            return
+
+        property_ids, vectors = self._load_rows(organization_id, property_id=property_id)
+        if len(vectors) and vectors.shape[1] != index.dimensions:
+            self.invalidate(organization)
+            return
+        index.upsert_property(str(property_id), vectors)
+        index.signature = self._signature(organization_id)
+
+    def invalidate(self, organization):
+        """Forget an organization's index so the next search rebuilds it"""
+        with self._lock:
+            self._indexes.pop(str(organization.id), None)
+
+
+# Global instance
+vector_index_registry = VectorIndexRegistry()
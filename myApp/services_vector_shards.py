@@ -0,0 +1,164 @@
+"""
+Per-organization vector shards on disk, opened with mmap
+
+Each organization gets a directory under VECTOR_SHARD_DIR holding
+L2-normalized float32 matrices (``v<version>.f32``) and a ``manifest.json``
+naming the current version, its shape, the row -> property mapping and the
+PropertyEmbedding signature it was built from. Every gunicorn worker maps
+the same file read-only, so the pages live once in the OS page cache rather
+than once per process.
+
+Writers never touch a published shard: a new version is written beside it
+and the manifest is swapped with os.replace, so readers holding the old
+mapping keep working until they reopen. ``locked()`` holds an exclusive
+flock on the organization's directory, so only one process at a time
+checks, writes or prunes its shards. Each shard file name also carries a
+writer token (``v<version>-<token>.f32``), so a manifest only ever points
+at the matrix its own writer produced.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, unique file names still apply
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.lock'
+# Superseded versions kept around for readers that still have them mapped
+KEEP_VERSIONS = 2
+
+
+def encode_signature(signature):
+    """JSON-safe form of a (row count, latest created_at) signature"""
+    rows, latest = signature
+    return [rows, latest.isoformat() if latest else None]
+
+
+class VectorShardStore:
+    """Reads and writes memory-mapped embedding shards"""
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        return self._root if self._root is not None else settings.VECTOR_SHARD_DIR
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    def _directory(self, organization_id):
+        return os.path.join(self.root, str(organization_id))
+
+    @contextmanager
+    def locked(self, organization_id):
+        """Hold the organization's shard lock across processes"""
+        directory = self._directory(organization_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LOCK_NAME), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def read_manifest(self, organization_id):
+        """Return the organization's manifest dict, or None if it has no shard yet"""
+        path = os.path.join(self._directory(organization_id), MANIFEST_NAME)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable vector shard manifest for organization {organization_id}: {e}")
+            return None
+
+    def open(self, organization_id, manifest):
+        """Map a shard read-only, returning (property_ids, matrix)"""
+        rows, dimensions = manifest['rows'], manifest['dimensions']
+        if not rows:
+            return [], np.zeros((0, dimensions), dtype=np.float32)
+        path = os.path.join(self._directory(organization_id), manifest['file'])
+        matrix = np.memmap(path, dtype='<f4', mode='r', shape=(rows, dimensions))
+        return manifest['property_ids'], matrix
+
+    def write(self, organization_id, property_ids, matrix, signature):
+        """
+        Publish a new shard version; call it inside ``locked()``
+
+        Args:
+            matrix: L2-normalized float32 rows, one per embedding chunk
+            signature: PropertyEmbedding (row count, latest created_at) it reflects
+
+        Returns:
+            dict: the new manifest
+        """
+        directory = self._directory(organization_id)
+        os.makedirs(directory, exist_ok=True)
+
+        previous = self.read_manifest(organization_id)
+        version = (previous or {}).get('version', 0) + 1
+        filename = f"v{version}-{uuid.uuid4().hex[:12]}.f32"
+        matrix = np.ascontiguousarray(matrix, dtype='<f4')
+
+        self._atomic_write(os.path.join(directory, filename), matrix.tobytes())
+        manifest = {
+            'version': version,
+            'file': filename,
+            'rows': int(matrix.shape[0]),
+            'dimensions': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            'dtype': 'float32',
+            'property_ids': list(property_ids),
+            'signature': encode_signature(signature),
+            'written_at': time.time(),
+        }
+        self._atomic_write(os.path.join(directory, MANIFEST_NAME), json.dumps(manifest).encode('utf-8'))
+        self._prune(directory, version)
+        return manifest
+
+    def _atomic_write(self, path, data):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _prune(self, directory, current_version):
+        for name in os.listdir(directory):
+            if not (name.startswith('v') and name.endswith('.f32')):
+                continue
+            try:
+                version = int(name[1:-4].split('-')[0])
+            except ValueError:
+                continue
+            if version <= current_version - KEEP_VERSIONS:
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+# Global instance
+shard_store = VectorShardStore()
@@ -0,0 +1,82 @@
+"""
+Non-blocking relay to external chat webhooks
+
+The Katalyst chat views used to call ``requests.post`` inside the request
+thread, so a slow CRM held a worker for up to the full timeout per active
+chatter. ``webhook_relay.post`` awaits the upstream on the shared
+services_http connection pool instead (an ASGI worker keeps serving other
+requests meanwhile) and caps in-flight calls per upstream host: once
+WEBHOOK_RELAY_MAX_CONCURRENCY calls to a host are pending, further callers
+wait at most WEBHOOK_RELAY_QUEUE_TIMEOUT seconds and then get
+``RelayBusy`` rather than piling up behind it. The limit is process-wide,
+so it also holds when each request runs on its own loop under WSGI.
+"""
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from .services_http import acquire_slot, get_async_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class RelayError(Exception):
+    """The upstream webhook failed, timed out or returned something unusable"""
+
+
+class RelayTimeout(RelayError):
+    """The upstream did not answer within the timeout"""
+
+
+class RelayBusy(RelayError):
+    """The upstream is at its concurrency limit; nothing was sent"""
+
+
+class WebhookRelay:
+    """Async POSTs to webhooks with a per-upstream concurrency limit"""
+
+    def __init__(self, max_concurrency=None, queue_timeout=None, timeout=None):
+        self.max_concurrency = max_concurrency or settings.WEBHOOK_RELAY_MAX_CONCURRENCY
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.WEBHOOK_RELAY_QUEUE_TIMEOUT
+        self.timeout = timeout or settings.WEBHOOK_RELAY_TIMEOUT
+        # host -> threading semaphore, shared by every loop in the process
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrency)
+            return self._semaphores[host]
+
+    async def post(self, url, payload, timeout=None):
+        """
+        POST JSON to ``url`` and return the decoded JSON response
+
+        Raises:
+            RelayBusy: the upstream already has max_concurrency calls in flight
+            RelayTimeout: no answer within ``timeout`` (default WEBHOOK_RELAY_TIMEOUT)
+            RelayError: transport error, error status or non-JSON body
+        """
+        host = urlsplit(url).netloc
+        semaphore = self._semaphore(host)
+        if not await acquire_slot(semaphore, self.queue_timeout):
+            raise RelayBusy(f"Webhook upstream {host} is at its concurrency limit")
+        try:
+            response = await get_async_http_client().post(url, json=payload, timeout=timeout or self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except httpx.TimeoutException as e:
+            raise RelayTimeout(f"Webhook upstream {host} timed out") from e
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Webhook relay to {host} failed: {e}")
+            raise RelayError(str(e)) from e
+        finally:
+            semaphore.release()
+
+
+# Global instance
+webhook_relay = WebhookRelay()
@@ -1,12 +1,13 @@
 """
 Custom signals for handling Google OAuth integration with multi-tenancy
 """
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from allauth.account.signals import user_signed_up
 from allauth.socialaccount.signals import social_account_added
-from .models import Company
+from .models import Company, Lead, Property
 from .services import EventLogger
 import logging
 
@@ -137,3 +138,81 @@ def create_default_company_for_user(user):
     except Exception as e:
         logger.error(f"Error creating default company: {str(e)}")
         return None
+
+
+@receiver(pre_save, sender=Property)
+def refresh_property_fact_sheet(sender, instance, **kwargs):
+    """
+    Re-render the prompt fact sheet when a field it is built from changed
+    """
+    from .services_fact_sheets import refresh_fact_sheet
+    refresh_fact_sheet(instance)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_property_search_index(sender, instance, **kwargs):
+    """
+    Drop this process's search index and area comparables for the property's organization
+    """
+    from .services_fact_sheets import area_summaries
+    from .services_filter_index import filter_index_registry
+    from .services_search import search_engine
+    search_engine.invalidate(instance.organization_id)
+    filter_index_registry.invalidate(instance.organization_id)
+    area_summaries.invalidate(instance.organization_id)
+
+
+@receiver(post_save, sender=Property)
+def record_property_saved(sender, instance, **kwargs):
+    """
+    Queue the property for re-embedding; written in the same transaction as the save
+    """
+    from .services_index_worker import record_property_changes
+    record_property_changes(instance.organization_id, [instance.id], 'upsert')
+
+
+@receiver(post_delete, sender=Property)
+def record_property_deleted(sender, instance, **kwargs):
+    from .services_index_worker import record_property_changes
+    record_property_changes(instance.organization_id, [instance.id], 'delete')
+
+
+@receiver(pre_save, sender=Property)
+@receiver(pre_save, sender=Lead)
+def remember_facet_values(sender, instance, **kwargs):
+    from .services_facets import facet_counts
+    facet_counts.before_save(instance)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=Lead)
+def update_facet_counts(sender, instance, created, **kwargs):
+    """
+    Apply the write to this process's filter facet counts
+    """
+    from .services_facets import facet_counts
+    facet_counts.after_save(instance, created)
+
+
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=Lead)
+def remove_facet_counts(sender, instance, **kwargs):
+    from .services_facets import facet_counts
+    facet_counts.after_delete(instance)
+
+
+@receiver(post_save, sender=Property)
+def refresh_property_page_cache(sender, instance, **kwargs):
+    """
+    Write the saved property through to the public page cache once committed
+    """
+    from .services_page_cache import page_cache
+    transaction.on_commit(lambda: page_cache.property_saved(instance))
+
+
+@receiver(post_delete, sender=Property)
+def drop_property_page_cache(sender, instance, **kwargs):
+    from .services_page_cache import page_cache
+    property_id = instance.pk  # delete() clears instance.pk before the commit callback runs
+    transaction.on_commit(lambda: page_cache.invalidate([property_id]))
@@ -0,0 +1,81 @@
+/**
+ * Client for the chat streaming endpoint (/api/chat/stream/)
+ *
+ * The endpoint answers a POST with server-sent events, so this reads the
+ * response body with fetch() rather than EventSource (which is GET-only):
+ *   start  {session_id}            sent before any retrieval work
+ *   token  {text}                  one per completion delta
+ *   done   {response, lead_id}     full answer once the stream ends
+ *   error  {error}
+ */
+
+(function() {
+    function parseEvent(block) {
+        var event = 'message';
+        var data = [];
+        block.split('\n').forEach(function(line) {
+            if (line.indexOf('event:') === 0) {
+                event = line.slice(6).trim();
+            } else if (line.indexOf('data:') === 0) {
+                data.push(line.slice(5).replace(/^ /, ''));
+            }
+        });
+        if (!data.length) return null;
+        try {
+            return { event: event, data: JSON.parse(data.join('\n')) };
+        } catch (e) {
+            return null;
+        }
+    }
+
+    /**
+     * POST a chat message and dispatch streamed events to handlers
+     * (onStart, onToken, onDone, onError). Resolves with the full response text.
+     */
+    async function streamChat(url, fields, handlers) {
+        handlers = handlers || {};
+        var headers = { 'Content-Type': 'application/x-www-form-urlencoded' };
+        if (handlers.csrfToken) headers['X-CSRFToken'] = handlers.csrfToken;
+
+        var response = await fetch(url, {
+            method: 'POST',
+            headers: headers,
+            body: new URLSearchParams(fields).toString()
+        });
+        if (!response.ok || !response.body) {
+            var error = new Error('Chat request failed (' + response.status + ')');
+            if (handlers.onError) handlers.onError(error);
+            throw error;
+        }
+
+        var reader = response.body.getReader();
+        var decoder = new TextDecoder();
+        var buffer = '';
+        var text = '';
+        while (true) {
+            var chunk = await reader.read();
+            if (chunk.done) break;
+            buffer += decoder.decode(chunk.value, { stream: true });
+            var boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                var parsed = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!parsed) continue;
+                if (parsed.event === 'start' && handlers.onStart) {
+                    handlers.onStart(parsed.data);
+                } else if (parsed.event === 'token') {
+                    text += parsed.data.text;
+                    if (handlers.onToken) handlers.onToken(parsed.data.text, text);
+                } else if (parsed.event === 'done') {
+                    text = parsed.data.response || text;
+                    if (handlers.onDone) handlers.onDone(parsed.data);
+                } else if (parsed.event === 'error' && handlers.onError) {
+                    handlers.onError(new Error(parsed.data.error));
+                }
+            }
+        }
+        return text;
+    }
+
+    window.katekStreamChat = streamChat;
+})();
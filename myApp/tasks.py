@@ -60,6 +60,23 @@ def process_webhook_outbox():
     logger.info("Webhook outbox processing complete")
 
 
+@shared_task
+def process_property_index_events():
+    """Re-embed changed properties and refresh their organizations' indexes"""
+    from .services_index_worker import index_worker
+    
+    processed = 0
+    while True:
+        stats = index_worker.process_pending()
+        processed += stats['completed']
+        # Stop once a pass only hit failures; they are retried on the next run
+        if not stats['completed']:
+            break
+    
+    logger.info(f"Processed {processed} property index events")
+    return processed
+
+
 @shared_task
 def send_lead_autoresponder(lead_id):
     """Send autoresponder email to new lead"""
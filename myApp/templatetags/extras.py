@@ -80,3 +80,48 @@ def feature_button(flag_name, button_text, button_class="btn btn-primary", disab
         'flag_name': flag_name,
         **kwargs
     }
+
+@register.inclusion_tag('partials/cursor_pagination.html')
+def cursor_pagination(request, page, noun="results"):
+    """Previous/next links for a keyset page, keeping the current filters"""
+    def href(cursor):
+        params = request.GET.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return f"{request.path}?{params.urlencode()}"
+    
+    return {
+        'page': page,
+        'noun': noun,
+        'previous_href': href(page.previous_cursor) if page.has_previous else '',
+        'next_href': href(page.next_cursor) if page.has_next else '',
+    }
+
+
+class PageCacheNode(template.Node):
+    def __init__(self, nodelist, name, key_parts):
+        self.nodelist = nodelist
+        self.name = name
+        self.key_parts = key_parts
+
+    def render(self, context):
+        from ..services_page_cache import page_cache
+        key_parts = [part.resolve(context) for part in self.key_parts]
+        return mark_safe(page_cache.fragment(
+            self.name.resolve(context), key_parts, lambda: self.nodelist.render(context),
+        ))
+
+@register.tag
+def pagecache(parser, token):
+    """
+    {% pagecache "name" key ... %}...{% endpagecache %}
+
+    Cache the enclosed HTML in page_cache until one of the key parts changes,
+    e.g. {% pagecache "property_card" property.id property.cache_version %}.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a fragment name and at least one key")
+    nodelist = parser.parse(('endpagecache',))
+    parser.delete_first_token()
+    return PageCacheNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
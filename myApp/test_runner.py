@@ -0,0 +1,22 @@
+"""
+Test runner for ``manage.py test``
+
+Runs the suite with QUERY_BUDGET_MODE='raise', so a view that goes over its
+query budget fails its test whatever the environment or DEBUG say.
+"""
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner with the test-only settings applied for the whole run"""
+
+    test_settings = override_settings(QUERY_BUDGET_MODE='raise')
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
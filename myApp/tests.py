@@ -1,3 +1,1351 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import openai
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .models import Campaign, CampaignStep, Company, Conversation, ConversationTurn, Event, Lead, LLMUsage, MessageLog, Organization, Plan, Property, PropertyEmbedding, PropertyIndexEvent, Subscription
+from .services_conversations import ConversationStore
+from .services_embeddings import HashingEmbeddingProvider, OpenAIEmbeddingProvider
+from .services_analytics import analytics_service
+from .services_facets import bed_options, facet_counts, price_bucket_filter
+from .services_fact_sheets import area_summaries, fact_sheet_for
+from .services_http import get_async_http_client
+from .services_filter_index import PropertyFilterIndex
+from .services_llm import CircuitBreaker, LLMGateway, LLMUnavailable, RetryBudget, llm_gateway
+from .services_llm_usage import LLMUsageRecorder
+from .services_query_cache import QueryEmbeddingCache, query_embedding_cache
+from .services_response_cache import PropertyResponseCache, property_response_cache
+from .services_text_search import FTS_TRIGGERS, text_search
+from .services_vector import VectorEmbeddingService, vector_service
+from .services_vector_index import PropertyVectorIndex, VectorIndexRegistry
+from .services_vector_shards import VectorShardStore
+from .services_webhook_relay import RelayBusy, RelayTimeout, WebhookRelay
+from .utils import vector_storage
+from .utils.keyset_pagination import paginate as keyset_paginate
+from .middleware import QueryBudgetMiddleware
+from .utils.query_budget import QueryBudgetExceeded, QueryRecorder, assert_query_budget, query_shape
+from .utils.text_chunker import chunk_document, count_tokens
+
+
+def make_vector(*values, dimensions=8):
+    vector = np.zeros(dimensions, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+class VectorStorageTests(TestCase):
+    def test_round_trips_each_dtype(self):
+        vector = np.linspace(-1, 1, 16, dtype=np.float32)
+        for dtype, tolerance in [('float32', 0), ('float16', 1e-3), ('int8', 1e-2)]:
+            blob, dims, scale = vector_storage.encode_vector(vector, dtype)
+            decoded = vector_storage.decode_vector(blob, dtype, scale)
+            self.assertEqual(dims, 16)
+            self.assertLessEqual(np.abs(decoded - vector).max(), tolerance)
+
+        self.assertEqual(len(vector_storage.encode_vector(vector, 'float32')[0]), 16 * 4)
+        self.assertEqual(len(vector_storage.encode_vector(vector, 'int8')[0]), 16)
+
+
+class PropertyVectorIndexTests(TestCase):
+    def test_ranks_properties_by_best_chunk(self):
+        index = PropertyVectorIndex(8)
+        index.build(
+            ['a', 'a', 'b', 'c'],
+            np.stack([
+                make_vector(1, 0),
+                make_vector(0, 1),
+                make_vector(0.9, 0.1),
+                make_vector(0, 0, 1),
+            ]),
+        )
+
+        ranked = index.search(make_vector(1, 0), limit=2)
+
+        self.assertEqual([property_id for property_id, _ in ranked], ['a', 'b'])
+        self.assertAlmostEqual(ranked[0][1], 1.0, places=5)
+
+    def test_upsert_replaces_property_chunks(self):
+        index = PropertyVectorIndex(8)
+        index.build(['a', 'b'], np.stack([make_vector(1, 0), make_vector(0, 1)]))
+
+        index.upsert_property('a', np.stack([make_vector(0, 0, 1)]))
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search(make_vector(0, 0, 1), limit=1)[0][0], 'a')
+        self.assertEqual(index.search(make_vector(0, 1), limit=1)[0][0], 'b')
+
+        index.remove_property('a')
+        self.assertEqual([property_id for property_id, _ in index.search(make_vector(0, 0, 1), limit=5)], ['b'])
+
+    def test_allow_list_is_applied_inside_the_index(self):
+        index = PropertyVectorIndex(8)
+        index.build(['a', 'b', 'c'], np.stack([make_vector(1, 0), make_vector(0.9, 0.1), make_vector(0, 1)]))
+
+        ranked = index.search(make_vector(1, 0), limit=2, allowed={'c'})
+
+        self.assertEqual([property_id for property_id, _ in ranked], ['c'])
+        self.assertEqual(index.search(make_vector(1, 0), limit=2, allowed={'missing'}), [])
+
+    @override_settings(VECTOR_INDEX_IVF_MIN_ROWS=100)
+    def test_selective_allow_list_keeps_recall_on_ivf(self):
+        rng = np.random.default_rng(7)
+        vectors = rng.normal(size=(800, 8)).astype(np.float32)
+        property_ids = [f"p{row}" for row in range(800)]
+        index = PropertyVectorIndex(8)
+        index.build(property_ids, vectors)
+        allowed = {f"p{row}" for row in range(0, 800, 40)}
+
+        ranked = index.search(vectors[0], limit=5, allowed=allowed)
+
+        self.assertEqual(len(ranked), 5)
+        self.assertTrue({property_id for property_id, _ in ranked} <= allowed)
+        self.assertEqual(ranked[0][0], 'p0')
+
+
+class PropertyFilterIndexTests(TestCase):
+    def setUp(self):
+        self.index = PropertyFilterIndex()
+        self.index.build([
+            ('a', 45000, 2, 'Taguig', 'BGC', True),
+            ('b', 25000, 1, 'Makati', 'Salcedo', True),
+            ('c', 80000, 4, 'Quezon City', 'Diliman', True),
+            ('d', 30000, 3, 'Makati', 'Legaspi', False),
+        ])
+
+    def test_range_and_location_filters_intersect(self):
+        self.assertEqual(self.index.allowed_ids({'price_min': 25000, 'price_max': 45000}), {'a', 'b', 'd'})
+        self.assertEqual(self.index.allowed_ids({'beds_min': 2, 'city': 'makati'}), {'d'})
+        self.assertEqual(self.index.allowed_ids({'city': 'dili'}), {'c'})
+        self.assertEqual(self.index.allowed_ids({'city': 'makati', 'is_active': True}), {'b'})
+
+    def test_empty_filters_are_unrestricted(self):
+        self.assertIsNone(self.index.allowed_ids({'city': None, 'beds_min': None}))
+        self.assertTrue(self.index.mask({}).all())
+
+
+class VectorIndexRegistryTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.condo = Property.objects.create(
+            organization=self.organization, slug='bgc-condo', title='BGC Condo', price_amount=100, city='Taguig'
+        )
+        self.house = Property.objects.create(
+            organization=self.organization, slug='qc-house', title='QC House', price_amount=200, city='Quezon City'
+        )
+
+    def embed(self, prop, chunk, vector, legacy_json=False):
+        row = PropertyEmbedding(organization=self.organization, property=prop, doc_id=f"prop:{prop.id}", chunk=chunk)
+        if legacy_json:
+            row.embedding = vector.tolist()
+        else:
+            row.set_vector(vector)
+        row.save()
+
+    def test_builds_lazily_and_refreshes_single_property(self):
+        self.embed(self.condo, 0, make_vector(1, 0))
+        self.embed(self.house, 0, make_vector(0, 1), legacy_json=True)
+        registry = VectorIndexRegistry()
+
+        ranked = registry.search(self.organization, make_vector(0, 1), limit=1)
+        self.assertEqual(ranked[0][0], str(self.house.id))
+
+        PropertyEmbedding.objects.filter(property=self.condo).delete()
+        self.embed(self.condo, 0, make_vector(0, 1))
+        registry.refresh_property(self.organization, self.condo.id)
+
+        ranked = registry.search(self.organization, make_vector(0, 1), limit=2)
+        self.assertEqual({property_id for property_id, _ in ranked}, {str(self.condo.id), str(self.house.id)})
+
+
+class VectorShardTests(TestCase):
+    def setUp(self):
+        self.shard_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.shard_dir, ignore_errors=True)
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.condo = Property.objects.create(
+            organization=self.organization, slug='bgc-condo', title='BGC Condo', price_amount=100, city='Taguig'
+        )
+        self.house = Property.objects.create(
+            organization=self.organization, slug='qc-house', title='QC House', price_amount=200, city='Quezon City'
+        )
+        for prop, vector in [(self.condo, make_vector(1, 0)), (self.house, make_vector(0, 3))]:
+            row = PropertyEmbedding(organization=self.organization, property=prop, doc_id=f"prop:{prop.id}", chunk=0)
+            row.set_vector(vector)
+            row.save()
+
+    def test_index_is_served_from_a_memory_mapped_shard(self):
+        with override_settings(VECTOR_SHARD_DIR=self.shard_dir):
+            index = VectorIndexRegistry().get(self.organization)
+            manifest = VectorShardStore().read_manifest(self.organization.id)
+
+            self.assertTrue(index.mapped)
+            self.assertIsInstance(index.index.vectors, np.memmap)
+            self.assertEqual(manifest['version'], 1)
+            self.assertEqual(sorted(manifest['property_ids']), sorted([str(self.condo.id), str(self.house.id)]))
+            self.assertEqual(index.search(make_vector(0, 1), limit=1)[0][0], str(self.house.id))
+            self.assertAlmostEqual(index.search(make_vector(0, 1), limit=1)[0][1], 1.0, places=5)
+
+    def test_unchanged_rows_reuse_the_shard_and_changes_publish_a_new_version(self):
+        with override_settings(VECTOR_SHARD_DIR=self.shard_dir):
+            store = VectorShardStore()
+            VectorIndexRegistry().get(self.organization)
+            VectorIndexRegistry().get(self.organization)
+            self.assertEqual(store.read_manifest(self.organization.id)['version'], 1)
+
+            PropertyEmbedding.objects.filter(property=self.condo).delete()
+            index = VectorIndexRegistry().get(self.organization)
+
+            self.assertEqual(store.read_manifest(self.organization.id)['version'], 2)
+            self.assertEqual([property_id for property_id, _ in index.search(make_vector(1, 0), limit=5)], [str(self.house.id)])
+
+
+    def test_writers_from_the_same_version_never_share_a_shard_file(self):
+        store = VectorShardStore(root=self.shard_dir)
+        signature = (1, None)
+        with store.locked(self.organization.id):
+            first = store.write(self.organization.id, ['a'], np.ones((1, 8), dtype=np.float32), signature)
+        # A second writer that read the same manifest before the first one published
+        with mock.patch.object(store, 'read_manifest', return_value=None):
+            second = store.write(self.organization.id, ['a', 'b'], np.ones((2, 8), dtype=np.float32), signature)
+
+        self.assertEqual(first['version'], second['version'])
+        self.assertNotEqual(first['file'], second['file'])
+        property_ids, matrix = store.open(self.organization.id, store.read_manifest(self.organization.id))
+        self.assertEqual((property_ids, matrix.shape), (['a', 'b'], (2, 8)))
+
+
+class SearchBenchmarkTests(TestCase):
+    def test_flat_index_paths_report_perfect_recall_and_leave_no_rows(self):
+        from .utils.search_benchmark import run_benchmark
+
+        reports = run_benchmark(properties=300, queries=20, k=5, dimensions=16)
+
+        self.assertEqual(set(reports), {'index', 'service', 'chat'})
+        for report in reports.values():
+            self.assertEqual(report['queries'], 20)
+            self.assertEqual(report['recall'], 1.0)
+            self.assertLessEqual(report['p50_ms'], report['p99_ms'])
+        self.assertFalse(Property.objects.exists())
+
+
+class FakeEmbeddingsClient:
+    """Stands in for openai.OpenAI; fails any request containing a poisoned text"""
+
+    def __init__(self, poison=None):
+        self.requests = []
+        self.poison = poison
+        self.embeddings = self
+
+    def create(self, model, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.requests.append(texts)
+        if self.poison and any(self.poison in text for text in texts):
+            raise RuntimeError('upstream error')
+        data = [
+            SimpleNamespace(index=i, embedding=make_vector(len(text) % 7 + 1, 1).tolist())
+            for i, text in enumerate(texts)
+        ]
+        return SimpleNamespace(data=data)
+
+
+@override_settings(EMBEDDING_BATCH_MAX_RETRIES=1, EMBEDDING_BATCH_MAX_INPUTS=64)
+class BatchEmbeddingTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.properties = [
+            Property.objects.create(
+                organization=self.organization, slug=f'listing-{i}', title=f'Listing {i}', price_amount=100 + i, city='Makati'
+            )
+            for i in range(5)
+        ]
+        self.service = VectorEmbeddingService()
+
+    def fake_provider(self, poison=None):
+        return OpenAIEmbeddingProvider(model='text-embedding-3-small', dimensions=8, client=FakeEmbeddingsClient(poison))
+
+    def test_packs_chunks_from_many_properties_into_one_request(self):
+        self.service.provider = self.fake_provider()
+        progress = []
+
+        results = self.service.batch_create_embeddings(
+            self.organization, progress_callback=lambda done, total: progress.append((done, total))
+        )
+
+        self.assertEqual(len(self.service.provider.client.requests), 1)
+        self.assertEqual(PropertyEmbedding.objects.filter(organization=self.organization).count(), 5)
+        self.assertTrue(all(not result['failed'] for result in results))
+        self.assertEqual(progress[-1], (5, 5))
+
+    def test_failed_chunk_is_isolated_without_reembedding_the_rest(self):
+        self.service.provider = self.fake_provider(poison='Listing 3')
+
+        results = self.service.batch_create_embeddings(self.organization)
+
+        failed = [result['property'].slug for result in results if result['failed']]
+        self.assertEqual(failed, ['listing-3'])
+        self.assertEqual(PropertyEmbedding.objects.filter(organization=self.organization).count(), 4)
+        embedded_texts = [text for request in self.service.provider.client.requests[1:] for text in request]
+        # Halves are retried once each; no chunk is sent more than twice overall
+        self.assertTrue(all(embedded_texts.count(text) <= 2 for text in embedded_texts))
+
+    def test_unchanged_chunks_are_not_reembedded(self):
+        self.service.provider = self.fake_provider()
+        self.service.batch_create_embeddings(self.organization)
+
+        listing = self.properties[2]
+        listing.narrative = 'Fresh enrichment narrative'
+        listing.save()
+        stats = {}
+        self.service.batch_create_embeddings(self.organization, stats=stats)
+
+        self.assertEqual(len(self.service.provider.client.requests), 2)
+        self.assertEqual(len(self.service.provider.client.requests[1]), 1)
+        self.assertEqual(stats, {'skipped': 4, 'updated': 1, 'deleted': 1})
+        self.assertEqual(PropertyEmbedding.objects.filter(organization=self.organization).count(), 5)
+
+
+    @override_settings(EMBEDDING_CHUNK_MAX_TOKENS=40)
+    def test_identical_chunks_across_properties_are_embedded_once(self):
+        shared = ' '.join(f'Sentence {i} of the developer brochure about amenities and access.' for i in range(8))
+        for listing in self.properties[:2]:
+            listing.narrative = shared
+            listing.save()
+        self.service.provider = self.fake_provider()
+
+        self.service.batch_create_embeddings(self.organization, properties=self.properties[:2])
+
+        sent = [text for request in self.service.provider.client.requests for text in request]
+        stored = PropertyEmbedding.objects.filter(organization=self.organization).count()
+        self.assertEqual(len(sent), len(set(sent)))
+        self.assertLess(len(sent), stored)
+
+
+class TextChunkerTests(TestCase):
+    def test_short_documents_stay_whole(self):
+        self.assertEqual(chunk_document('Property: Loft | Price: $100', 50), ['Property: Loft | Price: $100'])
+        self.assertEqual(chunk_document('   ', 50), [])
+
+    def test_splits_on_field_and_sentence_boundaries_within_budget(self):
+        description = ' '.join(f'Sentence number {i} describes the view.' for i in range(20))
+        text = f'Property: Sky Loft | Location: Makati, Salcedo | Description: {description}'
+
+        chunks = chunk_document(text, 30)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(count_tokens(chunk) <= 30 for chunk in chunks))
+        self.assertTrue(chunks[0].startswith('Property: Sky Loft | Location: Makati, Salcedo'))
+        for chunk in chunks[1:]:
+            self.assertTrue(chunk.startswith('Description (cont.): Sentence number'))
+            self.assertTrue(chunk.endswith('view.'))
+
+    def test_duplicate_chunks_are_dropped(self):
+        sentence = 'Walking distance to the mall and the park.'
+        text = 'Description: ' + ' '.join([sentence] * 12)
+
+        chunks = chunk_document(text, 20)
+
+        self.assertEqual(len(chunks), len({' '.join(chunk.lower().split()) for chunk in chunks}))
+
+
+class EmbeddingProviderTests(TestCase):
+    def test_hashing_provider_drives_the_whole_retrieval_stack_offline(self):
+        organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        for slug, title, description in [
+            ('bgc-condo', 'Modern Condo', 'Rooftop pool and gym near High Street'),
+            ('qc-house', 'Family House', 'Quiet garden with parking for two cars'),
+        ]:
+            Property.objects.create(
+                organization=organization, slug=slug, title=title, description=description, price_amount=100, city='Manila'
+            )
+        service = VectorEmbeddingService(provider=HashingEmbeddingProvider(dimensions=256))
+
+        results = service.batch_create_embeddings(organization)
+        found = service.search_similar_properties(organization, 'garden parking', limit=1)
+
+        self.assertTrue(all(not result['failed'] for result in results))
+        self.assertEqual(PropertyEmbedding.objects.get(property__slug='qc-house').vector_dims, 256)
+        self.assertEqual(found[0].slug, 'qc-house')
+        self.assertIsNotNone(found[0].similarity)
+
+    def test_archived_properties_never_surface(self):
+        organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        Property.objects.create(organization=organization, slug='open', title='Garden House', price_amount=100, city='Manila')
+        Property.objects.create(
+            organization=organization, slug='archived', title='Garden Parking House', price_amount=100, city='Manila', is_active=False
+        )
+        service = VectorEmbeddingService(provider=HashingEmbeddingProvider(dimensions=256))
+
+        self.assertEqual([prop.slug for prop in service.search_similar_properties(organization, 'garden parking')], ['open'])
+        service.batch_create_embeddings(organization)
+        self.assertEqual([prop.slug for prop in service.search_similar_properties(organization, 'garden parking')], ['open'])
+
+    def test_hashing_provider_is_deterministic_and_normalized(self):
+        provider = HashingEmbeddingProvider(dimensions=64)
+        first, second = provider.embed(['two bedroom condo', 'two bedroom condo'])
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+        self.assertEqual(provider.model, 'hashing-64')
+
+
+@override_settings(EMBEDDING_BATCH_MAX_RETRIES=1, INDEX_EVENT_MAX_ATTEMPTS=2)
+class PropertyIndexWorkerTests(TestCase):
+    def setUp(self):
+        from .services_index_worker import PropertyIndexWorker
+        from .services_vector import vector_service
+
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.addCleanup(setattr, vector_service, 'provider', vector_service.provider)
+        self.fake = FakeEmbeddingsClient(poison='Broken')
+        vector_service.provider = OpenAIEmbeddingProvider(dimensions=8, client=self.fake)
+        self.worker = PropertyIndexWorker()
+
+    def create(self, slug, title):
+        return Property.objects.create(organization=self.organization, slug=slug, title=title, price_amount=1, city='Makati')
+
+    def test_saves_are_captured_coalesced_and_embedded_in_one_batch(self):
+        condo = self.create('condo', 'Condo')
+        self.create('house', 'House')
+        condo.description = 'Updated twice before the worker ran'
+        condo.save()
+        self.assertEqual(PropertyIndexEvent.objects.filter(processed_at__isnull=True).count(), 3)
+
+        stats = self.worker.process_pending()
+
+        self.assertEqual((stats['events'], stats['properties'], stats['embedded']), (3, 2, 2))
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertEqual(PropertyEmbedding.objects.filter(organization=self.organization).count(), 2)
+        self.assertFalse(PropertyIndexEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_failed_properties_are_retried_then_given_up(self):
+        self.create('broken', 'Broken listing')
+
+        self.assertEqual(self.worker.process_pending()['completed'], 0)
+        event = PropertyIndexEvent.objects.get()
+        self.assertEqual((event.attempts, event.processed_at), (1, None))
+        self.assertGreater(event.available_at, timezone.now())
+
+        # Not retried before its backoff runs out
+        self.assertEqual(self.worker.process_pending()['events'], 0)
+        PropertyIndexEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(self.worker.process_pending()['completed'], 1)
+        self.assertIsNotNone(PropertyIndexEvent.objects.get().processed_at)
+
+    def test_a_claimed_batch_is_not_processed_by_another_worker(self):
+        from .services_index_worker import PropertyIndexWorker
+
+        self.create('condo', 'Condo')
+        claimed = self.worker._claim(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(PropertyIndexWorker().process_pending()['events'], 0)
+        self.assertEqual(self.fake.requests, [])
+
+        # A crashed worker's claim lapses
+        PropertyIndexEvent.objects.update(claimed_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(PropertyIndexWorker().process_pending()['embedded'], 1)
+
+    def test_deleted_properties_only_refresh_indexes(self):
+        house = self.create('house', 'House')
+        house.delete()
+
+        stats = self.worker.process_pending()
+
+        self.assertEqual((stats['removed'], stats['embedded']), (1, 0))
+        self.assertEqual(self.fake.requests, [])
+
+
+class QueryEmbeddingCacheTests(TestCase):
+    def test_normalized_queries_share_an_entry(self):
+        cache = QueryEmbeddingCache(max_bytes=1024 * 1024, ttl_seconds=60, cache_alias='')
+        calls = []
+
+        def embed(text):
+            calls.append(text)
+            return make_vector(1, 2).tolist()
+
+        cache.get_or_embed('model', '2 bedroom condo in BGC', embed)
+        vector = cache.get_or_embed('model', '  2 Bedroom  condo in bgc? ', embed)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used_past_byte_cap(self):
+        entry_bytes = make_vector().nbytes + len('model:a')
+        cache = QueryEmbeddingCache(max_bytes=2 * entry_bytes, ttl_seconds=60, cache_alias='')
+        cache.set('model', 'a', make_vector(1))
+        cache.set('model', 'b', make_vector(2))
+        cache.get('model', 'a')
+        cache.set('model', 'c', make_vector(3))
+
+        self.assertIsNotNone(cache.get('model', 'a'))
+        self.assertIsNone(cache.get('model', 'b'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expired_entries_miss(self):
+        cache = QueryEmbeddingCache(max_bytes=1024, ttl_seconds=0, cache_alias='')
+        cache.set('model', 'a', make_vector(1))
+        self.assertIsNone(cache.get('model', 'a'))
+
+
+class HybridSearchTests(TestCase):
+    def setUp(self):
+        from .services_search import HybridSearchEngine
+
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        listings = [
+            ('bgc-condo', 'Modern 2BR Condo in BGC', 'Taguig', 'BGC', 2, 45000, 'Pool and gym access'),
+            ('makati-studio', 'Cozy Studio', 'Makati', 'Salcedo', 1, 25000, 'Walk to Ayala'),
+            ('qc-house', 'Family House', 'Quezon City', 'Diliman', 4, 80000, 'Garden, parking, quiet street'),
+        ]
+        for slug, title, city, area, beds, price, description in listings:
+            Property.objects.create(
+                organization=self.organization, slug=slug, title=title, city=city, area=area,
+                beds=beds, price_amount=price, description=description
+            )
+        self.engine = HybridSearchEngine()
+
+    def slugs(self, **kwargs):
+        return [prop.slug for prop in self.engine.search_properties(**kwargs)]
+
+    def test_ranks_text_matches_with_prefix_expansion(self):
+        self.assertEqual(self.slugs(query='condo pool'), ['bgc-condo'])
+        self.assertEqual(self.slugs(query='garden'), ['qc-house'])
+        self.assertEqual(self.slugs(query='salc'), ['makati-studio'])
+
+    def test_structured_filters_apply_before_ranking(self):
+        self.assertEqual(self.slugs(query='', filters={'beds_min': 2, 'price_max': 50000}), ['bgc-condo'])
+        self.assertEqual(self.slugs(query='parking', filters={'city': 'makati'}), [])
+        self.assertEqual(
+            sorted(self.slugs(query='', organization=self.organization, filters={'city': 'diliman'})), ['qc-house']
+        )
+
+    def test_archived_properties_are_excluded_when_filtering_active(self):
+        Property.objects.filter(slug='bgc-condo').update(is_active=False)
+        self.engine.invalidate(self.organization.id)
+        self.assertEqual(self.slugs(query='condo', filters={'is_active': True}), [])
+        self.assertEqual(self.slugs(query='condo'), ['bgc-condo'])
+
+    def test_results_are_rechecked_against_writes_from_other_workers(self):
+        filters = {'is_active': True, 'price_max': 50000}
+        self.assertEqual(self.slugs(query='condo', filters=filters), ['bgc-condo'])
+        # Another worker's writes: this process's index is not invalidated
+        Property.objects.filter(slug='bgc-condo').update(price_amount=90000)
+        self.assertEqual(self.slugs(query='condo', filters=filters), [])
+        Property.objects.filter(slug='makati-studio').update(is_active=False)
+        self.assertEqual(self.engine.current_ids(self.engine.search('cozy', filters=filters), filters), [])
+
+    def test_new_rows_are_picked_up_after_invalidation(self):
+        self.assertEqual(self.slugs(query='penthouse'), [])
+        Property.objects.create(
+            organization=self.organization, slug='rockwell-ph', title='Rockwell Penthouse', city='Makati', price_amount=1
+        )
+        self.engine.invalidate(self.organization.id)
+        self.assertEqual(self.slugs(query='penthouse'), ['rockwell-ph'])
+
+
+class FakeAsyncCompletions:
+    def __init__(self, reply='Try the Modern Condo.'):
+        self.reply = reply
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, messages, stream=False, **kwargs):
+        self.requests.append(messages)
+        if stream:
+            return self._stream()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))])
+
+    async def _stream(self):
+        for word in self.reply.split(' '):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))])
+
+
+class CountingHashingProvider(HashingEmbeddingProvider):
+    def __init__(self, dimensions=64):
+        super().__init__(dimensions)
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return super().embed(texts)
+
+
+class ChatApiAskTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        plan = Plan.objects.create(code='pro', name='Pro', monthly_usd=49)
+        Subscription.objects.create(
+            organization=self.organization, plan=plan, status='active', current_period_end=timezone.now()
+        )
+        Property.objects.create(
+            organization=self.organization, slug='bgc-condo', title='Modern Condo',
+            description='Rooftop pool', price_amount=100, city='Taguig'
+        )
+        self.completions = FakeAsyncCompletions()
+        self.provider = CountingHashingProvider()
+        query_embedding_cache.clear()
+        self.addCleanup(query_embedding_cache.clear)
+        patcher = mock.patch.object(vector_service, 'provider', self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def ask(self, message, endpoint='ask'):
+        with mock.patch.object(llm_gateway, '_async_client', self.completions):
+            response = await self.async_client.post(
+                f'/api/chat/{endpoint}/?org={self.organization.id}',
+                {'message': message, 'session_id': 'visitor-1'},
+            )
+            if response.streaming:
+                response.events = [
+                    (event.split('\n')[0][len('event: '):], json.loads(event.split('\n')[1][len('data: '):]))
+                    async for block in response.streaming_content
+                    for event in block.decode().strip().split('\n\n')
+                ]
+            return response
+
+    async def test_answers_with_property_context_and_logs_both_messages(self):
+        response = await self.ask('condo with a pool')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], 'Try the Modern Condo.')
+        system_prompt = self.completions.requests[0][0]['content']
+        self.assertIn('Modern Condo', system_prompt)
+        kinds = [kind async for kind in Event.objects.filter(organization=self.organization).values_list('kind', flat=True)]
+        self.assertEqual(sorted(kinds), ['chat.message_agent', 'chat.message_user'])
+        # The concurrent embedding is reused by retrieval rather than computed twice
+        self.assertEqual(self.provider.calls, 1)
+
+    async def test_rejects_organizations_without_an_active_subscription(self):
+        await Subscription.objects.filter(organization=self.organization).aupdate(status='canceled')
+
+        response = await self.ask('condo with a pool')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.completions.requests, [])
+
+    async def test_stream_flushes_start_then_tokens_then_the_full_answer(self):
+        response = await self.ask('condo with a pool', endpoint='stream')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        names = [name for name, _ in response.events]
+        self.assertEqual(names[0], 'start')
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(set(names[1:-1]), {'token'})
+        tokens = ''.join(data['text'] for name, data in response.events if name == 'token')
+        self.assertEqual(response.events[-1][1]['response'], tokens)
+        self.assertEqual(tokens.strip(), 'Try the Modern Condo.')
+        self.assertTrue(await Event.objects.filter(kind='chat.message_agent', meta__response=tokens).aexists())
+
+    async def test_stream_reports_validation_errors_as_json(self):
+        await Subscription.objects.filter(organization=self.organization).aupdate(status='canceled')
+
+        response = await self.ask('condo with a pool', endpoint='stream')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+
+
+class ScriptedCompletions:
+    """Sync chat client that raises or answers according to a script"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.calls += 1
+        self.requests.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if not isinstance(outcome, str):
+            return outcome
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))])
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+
+
+@override_settings(LLM_RETRY_BASE_DELAY=0, LLM_MAX_RETRIES=2, LLM_ORG_QUEUE_TIMEOUT=0.01)
+class LLMGatewayTests(TestCase):
+    def gateway(self, *outcomes, threshold=2):
+        client = ScriptedCompletions(*outcomes)
+        return LLMGateway(client=client, breaker=CircuitBreaker(failure_threshold=threshold, reset_seconds=60)), client
+
+    def test_transient_errors_are_retried(self):
+        gateway, client = self.gateway(connection_error(), 'hello')
+
+        self.assertEqual(gateway.complete([{'role': 'user', 'content': 'hi'}]), 'hello')
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_circuit_opens_then_fails_fast_until_a_trial_succeeds(self):
+        gateway, client = self.gateway(*[connection_error()] * 6, 'recovered')
+        messages = [{'role': 'user', 'content': 'hi'}]
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                gateway.complete(messages)
+        calls = client.calls
+
+        with self.assertRaises(LLMUnavailable):
+            gateway.complete(messages)
+        self.assertEqual(client.calls, calls)
+
+        gateway.breaker.opened_at -= 61
+        client.outcomes = ['recovered']
+        self.assertEqual(gateway.complete(messages), 'recovered')
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_rejected_requests_are_not_retried_and_do_not_trip_the_circuit(self):
+        bad_request = openai.BadRequestError(
+            'bad', response=httpx.Response(400, request=httpx.Request('POST', 'https://api.openai.com')), body=None
+        )
+        gateway, client = self.gateway(bad_request, bad_request, threshold=1)
+
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                gateway.complete([{'role': 'user', 'content': 'hi'}])
+
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_retry_budget_caps_retries(self):
+        budget = RetryBudget(ratio=0, capacity=1)
+        gateway = LLMGateway(
+            client=ScriptedCompletions(*[connection_error()] * 6), breaker=CircuitBreaker(10, 60), retry_budget=budget
+        )
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                gateway.complete([{'role': 'user', 'content': 'hi'}])
+        # Three attempts allowed per call, but only one retry in the budget
+        self.assertEqual(gateway.client.calls, 3)
+
+    @override_settings(LLM_ORG_MAX_CONCURRENCY=1)
+    def test_organization_at_its_concurrency_limit_fails_fast(self):
+        gateway, client = self.gateway('hello')
+        held = gateway._org_semaphore('org-1')
+        held.acquire()
+        try:
+            with self.assertRaises(LLMUnavailable):
+                gateway.complete([{'role': 'user', 'content': 'hi'}], organization='org-1')
+            self.assertEqual(gateway.complete([{'role': 'user', 'content': 'hi'}], organization='org-2'), 'hello')
+        finally:
+            held.release()
+
+    @override_settings(OPENAI_API_KEY='test-key')
+    def test_property_chat_falls_back_to_rule_based_answer_when_circuit_is_open(self):
+        from .views import get_ai_property_response, simple_answer
+
+        prop = Property.objects.create(slug='loft', title='Loft', price_amount=25000, city='Makati')
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+        breaker.record_failure()
+        client = ScriptedCompletions('unused')
+
+        with mock.patch.object(llm_gateway, 'breaker', breaker), mock.patch.object(llm_gateway, '_client', client):
+            answer = get_ai_property_response(prop, 'What is the price?')
+
+        self.assertEqual(answer, simple_answer(prop, 'what is the price?'))
+        self.assertEqual(client.calls, 0)
+
+
+class PropertyResponseCacheTests(TestCase):
+    def setUp(self):
+        self.prop = Property.objects.create(slug='loft', title='Loft', price_amount=25000, city='Makati', parking=True)
+        self.cache = PropertyResponseCache(max_properties=10, max_per_property=10, ttl_seconds=60, similarity=0.9, cache_alias='')
+        self.vectors = {
+            'Is there parking?': make_vector(1, 0, 0),
+            'Does it come with a parking slot?': make_vector(0.95, 0.3, 0),
+            'How much is rent?': make_vector(0, 1, 0),
+            'Is it under 30000?': make_vector(0, 0, 1),
+            'Is it under 40000?': make_vector(0, 0, 1),
+        }
+
+    def embed(self, text):
+        return self.vectors[text]
+
+    def test_normalized_and_similar_questions_hit(self):
+        self.cache.set(self.prop, 'Is there parking?', 'Yes, one slot.', embed=self.embed)
+
+        self.assertEqual(self.cache.get(self.prop, '  is there PARKING'), 'Yes, one slot.')
+        self.assertEqual(self.cache.get(self.prop, 'Does it come with a parking slot?', embed=self.embed), 'Yes, one slot.')
+        self.assertIsNone(self.cache.get(self.prop, 'How much is rent?', embed=self.embed))
+        self.assertEqual(self.cache.stats()['semantic_hits'], 1)
+
+    def test_similar_questions_with_different_numbers_miss(self):
+        self.cache.set(self.prop, 'Is it under 30000?', 'Yes.', embed=self.embed)
+        self.assertIsNone(self.cache.get(self.prop, 'Is it under 40000?', embed=self.embed))
+
+    def test_editing_the_property_invalidates_its_answers(self):
+        self.cache.set(self.prop, 'How much is rent?', '25,000 a month.')
+        self.prop.price_amount = 27000
+        self.prop.save()
+
+        self.assertIsNone(self.cache.get(self.prop, 'How much is rent?'))
+        self.assertEqual(self.cache.stats()['properties'], 0)
+
+    def test_answers_are_keyed_on_their_context(self):
+        self.cache.set(self.prop, 'Is it cheaper than the others?', 'Yes.', context='Studio | $30,000')
+        self.assertEqual(self.cache.get(self.prop, 'Is it cheaper than the others?', context='Studio | $30,000'), 'Yes.')
+        self.assertIsNone(self.cache.get(self.prop, 'Is it cheaper than the others?', context='Studio | $20,000'))
+
+    @override_settings(OPENAI_API_KEY='test-key')
+    def test_property_chat_answers_repeat_questions_from_cache(self):
+        from .views import get_ai_property_response
+
+        property_response_cache.clear()
+        self.addCleanup(property_response_cache.clear)
+        client = ScriptedCompletions('There is one parking slot.')
+        with mock.patch.object(llm_gateway, '_client', client), \
+                mock.patch.object(vector_service.provider, 'has_credentials', False, create=True):
+            first = get_ai_property_response(self.prop, 'Is there parking?')
+            second = get_ai_property_response(self.prop, 'is there parking')
+
+        self.assertEqual(first, second)
+        self.assertEqual(client.calls, 1)
+
+        # A new comparable listing changes the prompt, so the cached answer no longer applies
+        Property.objects.create(slug='studio', title='Studio', price_amount=18000, city='Makati')
+        with mock.patch.object(llm_gateway, '_client', client), \
+                mock.patch.object(vector_service.provider, 'has_credentials', False, create=True):
+            get_ai_property_response(self.prop, 'Is there parking?')
+        self.assertEqual(client.calls, 2)
+
+
+class PropertyFactSheetTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.other = Organization.objects.create(name='Other Realty', slug='other')
+        self.prop = Property.objects.create(
+            organization=self.organization, slug='loft', title='Loft', price_amount=25000,
+            city='Makati', area='Poblacion', beds=2, floor_area_sqm=45, parking=True,
+            description='Bright   corner unit\nnear the park.',
+        )
+        Property.objects.create(organization=self.organization, slug='studio', title='Studio', price_amount=18000, city='Makati')
+        Property.objects.create(organization=self.organization, slug='old', title='Archived', price_amount=9000, city='Makati', is_active=False)
+        Property.objects.create(organization=self.other, slug='rival', title='Rival Listing', price_amount=20000, city='Makati')
+        area_summaries.clear()
+        self.addCleanup(area_summaries.clear)
+
+    def test_fact_sheet_is_stored_on_save_and_rerendered_when_stale(self):
+        self.prop.refresh_from_db()
+        self.assertEqual(
+            self.prop.fact_sheet,
+            'Loft | Makati, Poblacion\n$25,000 | 2 bed | 1 bath | 45 sqm | parking\nAbout: Bright corner unit near the park.',
+        )
+        with self.assertNumQueries(0):
+            self.assertIs(fact_sheet_for(self.prop), self.prop.fact_sheet)
+
+        Property.objects.filter(pk=self.prop.pk).update(price_amount=27000)
+        self.prop.refresh_from_db()
+        self.assertIn('$27,000', fact_sheet_for(self.prop))
+
+    def test_comparables_are_scoped_cached_and_invalidated(self):
+        self.assertEqual(area_summaries.comparables(self.prop), ['Studio | $18,000 | 1 bed | 1 bath'])
+        with self.assertNumQueries(0):
+            area_summaries.comparables(self.prop)
+
+        Property.objects.create(organization=self.organization, slug='house', title='House', price_amount=60000, city='Makati')
+        self.assertEqual(len(area_summaries.comparables(self.prop)), 2)
+
+    def test_bulk_archive_drops_the_cached_summary(self):
+        company = Company.objects.create(name='Acme', slug='acme-co')
+        Property.objects.filter(organization=self.organization).update(company=company)
+        self.assertEqual(area_summaries.comparables(self.prop), ['Studio | $18,000 | 1 bed | 1 bath'])
+        self.client.force_login(User.objects.create_user('agent', password='secret'))
+        session = self.client.session
+        session['active_company_id'] = str(company.id)
+        session.save()
+
+        studio = Property.objects.get(slug='studio')
+        self.client.post(
+            '/api/properties/bulk-action/', json.dumps({'action': 'archive', 'property_ids': [str(studio.id)]}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(area_summaries.comparables(self.prop), [])
+
+    @override_settings(OPENAI_API_KEY='test-key')
+    def test_property_chat_prompt_uses_fact_sheet(self):
+        from .views import get_ai_property_response
+
+        property_response_cache.clear()
+        self.addCleanup(property_response_cache.clear)
+        client = ScriptedCompletions('It has parking.')
+        with mock.patch.object(llm_gateway, '_client', client), \
+                mock.patch.object(vector_service.provider, 'has_credentials', False, create=True):
+            get_ai_property_response(self.prop, 'Is there parking?')
+
+        system_prompt = client.requests[0]['messages'][0]['content']
+        self.assertIn(self.prop.fact_sheet, system_prompt)
+        self.assertIn('Studio', system_prompt)
+        self.assertNotIn('Rival Listing', system_prompt)
+
+
+class ConversationStoreTests(TestCase):
+    def test_append_windows_and_caps_turns(self):
+        store = ConversationStore(max_turns=4, max_turn_chars=10, window=3)
+        conversation_id = store.start()
+
+        self.assertEqual(store.append(conversation_id, ('user', 'hi'), ('assistant', 'hello there, friend')), [0, 1])
+        store.append(conversation_id, ('user', 'q2'), ('assistant', 'a2'))
+        store.append(conversation_id, ('user', 'q3'), ('assistant', 'a3'))
+
+        self.assertEqual([turn['content'] for turn in store.recent(conversation_id)], ['a2', 'q3', 'a3'])
+        self.assertEqual(
+            list(ConversationTurn.objects.filter(conversation_id=conversation_id).values_list('seq', flat=True)),
+            [2, 3, 4, 5],
+        )
+        store.append(conversation_id, ('assistant', 'x' * 50))
+        self.assertEqual(store.recent(conversation_id, limit=1)[0]['content'], 'x' * 10)
+
+    def test_webhook_chat_keeps_only_the_conversation_id_in_session(self):
+        upstream = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={'Response': 'Hello!'})))
+        with mock.patch('myApp.services_webhook_relay.get_async_http_client', return_value=upstream):
+            self.client.post('/chat/webhook/init/', {'ai_prompt': 'Any lofts?'})
+            response = self.client.post('/chat/webhook/', {'message': 'In Makati?'})
+
+        self.assertEqual(response.json()['response'], 'Hello!')
+        session = self.client.session
+        self.assertNotIn('chat_history', session)
+        conversation = Conversation.objects.get(pk=session['conversation_id'])
+        self.assertEqual(
+            list(conversation.turns.values_list('role', 'content')),
+            [('user', 'Any lofts?'), ('assistant', 'Hello!'), ('user', 'In Makati?'), ('assistant', 'Hello!')],
+        )
+
+
+class AsyncHttpClientTests(TestCase):
+    def test_client_is_closed_when_its_loop_shuts_down(self):
+        async def fetch_client():
+            client = get_async_http_client()
+            self.assertIs(get_async_http_client(), client)
+            return client
+
+        client = asyncio.run(fetch_client())
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(asyncio.run(fetch_client()), client)
+
+
+class WebhookRelayTests(TestCase):
+    def relay_to(self, handler, **options):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = mock.patch('myApp.services_webhook_relay.get_async_http_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return WebhookRelay(**options)
+
+    def test_calls_beyond_the_upstream_limit_are_turned_away(self):
+        async def slow(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'Response': 'ok'})
+
+        relay = self.relay_to(slow, max_concurrency=1, queue_timeout=0.01, timeout=1)
+
+        async def two_calls():
+            return await asyncio.gather(
+                relay.post('https://crm.example/hook', {}),
+                relay.post('https://crm.example/hook', {}),
+                return_exceptions=True,
+            )
+
+        first, second = asyncio.run(two_calls())
+        self.assertEqual(first, {'Response': 'ok'})
+        self.assertIsInstance(second, RelayBusy)
+
+    def test_limit_holds_across_event_loops(self):
+        relay = self.relay_to(lambda request: httpx.Response(200, json={'Response': 'ok'}), max_concurrency=1, queue_timeout=0.01, timeout=1)
+        held = relay._semaphore('crm.example')
+        held.acquire()  # a call in flight on another loop or thread
+        try:
+            with self.assertRaises(RelayBusy):
+                asyncio.run(relay.post('https://crm.example/hook', {}))
+        finally:
+            held.release()
+        self.assertEqual(asyncio.run(relay.post('https://crm.example/hook', {})), {'Response': 'ok'})
+
+    def test_upstream_timeout_is_reported(self):
+        def timeout(request):
+            raise httpx.ReadTimeout('slow', request=request)
+
+        relay = self.relay_to(timeout, max_concurrency=1, queue_timeout=0.01, timeout=1)
+        with self.assertRaises(RelayTimeout):
+            asyncio.run(relay.post('https://crm.example/hook', {}))
+
+
+class LLMUsageTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.recorder = LLMUsageRecorder(flush_every=1000, flush_seconds=3600)
+        patcher = mock.patch('myApp.services_llm.llm_usage', self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calls_are_aggregated_per_organization_and_call_site(self):
+        reply = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='hi'))],
+            usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30),
+        )
+        client = ScriptedCompletions(reply, reply, openai.BadRequestError(
+            'bad', response=httpx.Response(400, request=httpx.Request('POST', 'https://api.openai.com')), body=None,
+        ))
+        gateway = LLMGateway(client=client, breaker=CircuitBreaker(failure_threshold=5, reset_seconds=60))
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        gateway.complete(messages, organization=self.organization, call_site='chat.widget')
+        self.recorder.flush()
+        gateway.complete(messages, organization=self.organization, call_site='chat.widget')
+        with self.assertRaises(Exception):
+            gateway.complete(messages, organization=self.organization, call_site='chat.widget')
+
+        # One stored row, plus this process's pending calls on read
+        self.assertEqual(LLMUsage.objects.count(), 1)
+        site, = self.recorder.breakdown(self.organization)
+        self.assertEqual((site['requests'], site['errors'], site['total_tokens']), (3, 1, 300))
+        self.assertEqual(sum(site['latency_histogram']), 3)
+
+        self.recorder.flush()
+        row = LLMUsage.objects.get()
+        self.assertEqual((row.requests, row.errors, row.prompt_tokens, row.completion_tokens), (3, 1, 240, 60))
+
+    def test_billing_counts_ai_calls_from_usage(self):
+        from .services_organization import OrganizationService
+
+        self.recorder.record(self.organization, 'import.extract', 800, prompt_tokens=50, completion_tokens=10)
+        self.recorder.record(self.organization, 'chat.widget', 300, prompt_tokens=20, completion_tokens=5)
+        self.recorder.record(None, 'chat.widget', 300, prompt_tokens=20, completion_tokens=5)
+        self.recorder.record(self.organization, 'chat.widget', 0, error=True)  # Refused before dispatch
+
+        with mock.patch('myApp.services_llm_usage.llm_usage', self.recorder):
+            self.assertEqual(OrganizationService.get_current_usage(self.organization, 'ai_calls'), 2)
+            self.assertEqual(OrganizationService.get_current_usage(self.organization, 'ai_tokens'), 85)
+
+    @override_settings(OPENAI_API_KEY='test-key')
+    def test_ai_import_extraction_is_accounted_to_the_organization(self):
+        from .views_properties_import import extract_property_data
+
+        with mock.patch('myApp.views_properties_import.llm_gateway.complete', return_value='{"title": "Loft"}') as complete:
+            self.assertEqual(extract_property_data('Loft in Makati', self.organization)['title'], 'Loft')
+        self.assertEqual(complete.call_args.kwargs['organization'], self.organization)
+
+    def test_validation_chat_is_accounted_to_the_organization(self):
+        from .views_ai_validation import extract_property_data_from_conversation
+
+        chat_history = [{'role': 'user', 'message': 'Loft in Makati'}]
+        with mock.patch('myApp.views_ai_validation.OPENAI_API_KEY', 'test-key'), \
+                mock.patch('myApp.views_ai_validation.llm_gateway.complete', return_value='{"title": "Loft"}') as complete:
+            extract_property_data_from_conversation(chat_history, self.organization)
+        self.assertEqual(complete.call_args.kwargs['organization'], self.organization)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        for index, price in enumerate([30000, 25000, 30000, 18000, 30000, 45000, 25000]):
+            Property.objects.create(
+                organization=self.organization, slug=f'unit-{index}', title=f'Unit {index}', price_amount=price, city='Makati',
+            )
+        self.properties = Property.objects.filter(organization=self.organization)
+
+    def walk(self, ordering):
+        pages, cursor = [], None
+        while True:
+            page = keyset_paginate(self.properties, ordering, cursor=cursor, per_page=3)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order_and_walk_back(self):
+        for ordering in ('price_amount', '-created_at', 'title'):
+            expected = list(self.properties.order_by(ordering, 'pk'))
+            pages = self.walk(ordering)
+            self.assertEqual([prop for page in pages for prop in page], expected)
+            self.assertFalse(pages[0].has_previous)
+
+            back = keyset_paginate(self.properties, ordering, cursor=pages[-1].previous_cursor, per_page=3)
+            self.assertEqual(list(back), list(pages[-2]))
+            self.assertTrue(back.has_next)
+
+    def test_deep_pages_cost_the_same_and_bad_cursors_restart(self):
+        pages = self.walk('-beds')
+        with self.assertNumQueries(2):
+            page = keyset_paginate(self.properties, '-beds', cursor=pages[1].next_cursor, per_page=3, count_cap=5)
+        self.assertEqual((page.count, page.count_is_exact), (5, False))
+
+        restarted = keyset_paginate(self.properties, 'price_amount', cursor=pages[1].next_cursor, per_page=3)
+        self.assertEqual(list(restarted), list(self.properties.order_by('price_amount', 'pk')[:3]))
+        self.assertEqual(list(keyset_paginate(self.properties, '-beds', cursor='tampered', per_page=3)), list(pages[0]))
+
+
+class FacetCountsTests(TestCase):
+    def setUp(self):
+        facet_counts.clear()
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.other = Organization.objects.create(name='Other Realty', slug='other')
+        for city, beds, price in [('Makati', 1, 25000), ('Makati', 2, 450000), ('Taguig', 5, 2000000)]:
+            Property.objects.create(
+                organization=self.organization, slug=f'{city}-{beds}', title=city, city=city, beds=beds, price_amount=price,
+            )
+        Property.objects.create(organization=self.other, slug='other', title='Other', city='Pasig', price_amount=1)
+
+    def tearDown(self):
+        facet_counts.clear()
+
+    def test_counts_are_scoped_and_follow_writes_without_queries(self):
+        facets = facet_counts.properties(self.organization)
+        self.assertEqual(facets['city'], {'Makati': 2, 'Taguig': 1})
+        self.assertEqual(facets['price'], {'0-300000': 1, '300000-500000': 1, '1000000+': 1})
+        self.assertEqual(bed_options(facets['beds']), [('1', 3), ('2', 2), ('3', 1), ('4', 1)])
+        self.assertEqual(facet_counts.public_properties()['city'], {'Makati': 2, 'Taguig': 1, 'Pasig': 1})
+
+        moved = Property.objects.get(slug='Makati-2')
+        moved.city = 'Pasig'
+        moved.save()
+        Property.objects.get(slug='Taguig-5').delete()
+        Property.objects.create(organization=self.organization, slug='new', title='New', city='Makati', price_amount=10)
+        Property.objects.filter(slug='other').update(is_active=False)  # Bypasses signals
+        with self.assertNumQueries(0):
+            facets = facet_counts.properties(self.organization)
+            public = facet_counts.public_properties()
+        self.assertEqual(facets['city'], {'Makati': 2, 'Pasig': 1})
+        self.assertEqual(facets['price'], {'0-300000': 2, '300000-500000': 1})
+        self.assertEqual(public['city'], {'Makati': 2, 'Pasig': 2})
+
+        facet_counts.clear()
+        self.assertEqual(facet_counts.public_properties()['city'], {'Makati': 2, 'Pasig': 1})
+
+    def test_bucket_boundaries_match_the_price_filter(self):
+        Property.objects.create(organization=self.organization, slug='edge', title='Edge', city='Makati', price_amount=300000)
+        facets = facet_counts.properties(self.organization)
+        self.assertEqual(facets['price'], {'0-300000': 1, '300000-500000': 2, '1000000+': 1})
+        for value, count in facets['price'].items():
+            self.assertEqual(Property.objects.filter(organization=self.organization).filter(price_bucket_filter(value)).count(), count)
+        self.assertEqual(
+            Property.objects.filter(organization=self.organization, price_amount__gte=300000, price_amount__lte=499999).count(),
+            facets['price']['300000-500000'],
+        )
+
+    def test_bulk_archive_drops_the_cached_counts(self):
+        company = Company.objects.create(name='Acme', slug='acme-co')
+        Property.objects.filter(organization=self.organization).update(company=company)
+        self.assertEqual(facet_counts.properties(self.organization)['city'], {'Makati': 2, 'Taguig': 1})
+        self.assertEqual(facet_counts.public_properties()['city'], {'Makati': 2, 'Taguig': 1, 'Pasig': 1})
+        self.client.force_login(User.objects.create_user('agent', password='secret'))
+        session = self.client.session
+        session['active_company_id'] = str(company.id)
+        session.save()
+
+        taguig = Property.objects.get(slug='Taguig-5')
+        response = self.client.post(
+            '/api/properties/bulk-action/', json.dumps({'action': 'archive', 'property_ids': [str(taguig.id)]}),
+            content_type='application/json',
+        )
+
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(facet_counts.public_properties()['city'], {'Makati': 2, 'Pasig': 1})
+
+    def test_lead_sources_are_scoped_to_the_company(self):
+        company = Company.objects.create(name='Acme', slug='acme-co')
+        other = Company.objects.create(name='Other', slug='other-co')
+        for lead_company, source in [(company, 'facebook'), (company, 'facebook'), (company, ''), (other, 'google')]:
+            Lead.objects.create(company=lead_company, name='Lead', phone='1', buy_or_rent='rent', utm_source=source)
+        self.assertEqual(facet_counts.leads(company), {'utm_source': {'facebook': 2}})
+
+        Lead.objects.create(company=company, name='Lead', phone='2', buy_or_rent='rent', utm_source='google')
+        self.assertEqual(facet_counts.leads(company)['utm_source'], {'facebook': 2, 'google': 1})
+        self.assertEqual(facet_counts.leads(other)['utm_source'], {'google': 1})
+
+
+class PropertyTextSearchTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        rows = [
+            ('Sunny Loft', 'Makati', 'Poblacion', 'Corner unit near the park', 'REF-1042'),
+            ('Garden Villa', 'Taguig', 'BGC', 'Quiet street, sunny garden', ''),
+            ('City Studio', 'Pasig', 'Kapitolyo', 'Walk to Makati in ten minutes', 'pet friendly'),
+        ]
+        for title, city, area, description, badges in rows:
+            Property.objects.create(
+                organization=self.organization, slug=title.lower().replace(' ', '-'), title=title, city=city,
+                area=area, description=description, badges=badges, price_amount=30000,
+            )
+        self.properties = Property.objects.filter(organization=self.organization)
+
+    def titles(self, query, fields=('title', 'area', 'city', 'description', 'badges')):
+        return sorted(self.properties.filter(text_search.q(query, fields)).values_list('title', flat=True))
+
+    def test_index_matches_icontains_semantics(self):
+        self.assertEqual(text_search.backend, 'fts5')
+        for query, fields in [('akat', ('city', 'area')), ('SUNNY', ('title', 'description')),
+                              ('ref-10', ('badges',)), ('pet friendly', ('badges', 'description')), ('ga', ('title',))]:
+            expected = Q()
+            for field in fields:
+                expected |= Q(**{f'{field}__icontains': query})
+            self.assertEqual(self.titles(query, fields), sorted(self.properties.filter(expected).values_list('title', flat=True)))
+        self.assertEqual(self.titles('akat', ('city', 'area')), ['Sunny Loft'])
+        self.assertEqual(self.titles('akat'), ['City Studio', 'Sunny Loft'])
+
+    def test_index_follows_writes_and_falls_back_after_losing_triggers(self):
+        Property.objects.filter(slug='garden-villa').update(city='Makati')
+        Property.objects.get(slug='sunny-loft').delete()
+        self.assertEqual(self.titles('makati', ('city',)), ['Garden Villa'])
+
+        from django.db import connection
+        with connection.cursor() as cursor:
+            for trigger in FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {trigger}')
+        text_search.reset()
+        with self.assertLogs('myApp.services_text_search', 'WARNING'):
+            self.assertEqual(text_search.backend, 'like')
+        Property.objects.create(organization=self.organization, slug='new', title='New Loft', city='Makati', price_amount=1)
+        self.assertEqual(self.titles('makati', ('city',)), ['Garden Villa', 'New Loft'])
+
+        call_command('rebuild_text_index', stdout=StringIO())
+        self.assertEqual(text_search.backend, 'fts5')
+        self.assertEqual(self.titles('makati', ('city',)), ['Garden Villa', 'New Loft'])
+
+
+class PropertyPageCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.property = Property.objects.create(
+            organization=self.organization, slug='sunny-loft', title='Sunny Loft', city='Makati', price_amount=35000,
+        )
+
+    def test_detail_page_is_served_and_revalidated_without_queries(self):
+        url = '/property/sunny-loft/'
+        first = self.client.get(url)
+        self.assertContains(first, 'Sunny Loft')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), 'Sunny Loft')
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property.title = 'Sunnier Loft'
+            self.property.save()
+        with self.assertNumQueries(0):
+            changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertContains(changed, 'Sunnier Loft')
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_modal_only_keys_on_leads_of_the_organization(self):
+        lead = Lead.objects.create(organization=self.organization, name='Lead', phone='1', buy_or_rent='rent')
+        stranger = Lead.objects.create(name='Other', phone='2', buy_or_rent='rent')
+        url = '/property/sunny-loft/modal'
+
+        self.assertContains(self.client.get(url, {'lead': str(lead.id)}), f'?lead={lead.id}')
+        for bogus in ('junk', str(stranger.id), str(uuid.uuid4())):
+            response = self.client.get(url, {'lead': bogus})
+            self.assertNotContains(response, bogus)
+            self.assertContains(response, '?lead="')
+
+    def test_home_top_picks_follow_catalog_changes(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from .views import home
+
+        def render_home():
+            request = RequestFactory().get('/')
+            request.user = AnonymousUser()
+            return home(request)
+
+        self.assertContains(render_home(), 'Sunny Loft')
+        with self.assertNumQueries(0):
+            self.assertContains(render_home(), 'Sunny Loft')
+        with self.captureOnCommitCallbacks(execute=True):
+            Property.objects.create(
+                organization=self.organization, slug='garden-villa', title='Garden Villa', city='Taguig', price_amount=1,
+            )
+        self.assertContains(render_home(), 'Garden Villa')
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Acme Realty', slug='acme')
+        self.leads = [
+            Lead.objects.create(
+                organization=self.organization, name=f'Lead {i}', phone=str(i), email=f'lead{i}@example.com', buy_or_rent='buy',
+            )
+            for i in range(12)
+        ]
+
+    def test_repeated_query_shapes_are_reported(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            query_shape('SELECT * FROM t WHERE id IN (%s) AND name = %s LIMIT 1'),
+        )
+        with QueryRecorder() as recorder:
+            for lead in self.leads:
+                MessageLog.objects.filter(lead=lead).exists()
+        self.assertEqual(len(recorder), 12)
+        self.assertEqual(len(recorder.repeated(10)), 1)
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'possible N+1: 12 x'):
+            with assert_query_budget(max_repeats=10):
+                for lead in self.leads:
+                    MessageLog.objects.filter(lead=lead).exists()
+
+    def test_campaign_sweeps_stay_within_budget(self):
+        steps = []
+        for i in range(3):
+            campaign = Campaign.objects.create(organization=self.organization, name=f'Campaign {i}', status='active')
+            steps.append(CampaignStep.objects.create(campaign=campaign, subject='Hi', body_template='Hello', order=1))
+        for lead in self.leads[:5]:
+            MessageLog.objects.create(
+                organization=self.organization, campaign=steps[0].campaign, campaign_step=steps[0], lead=lead, status='sent',
+            )
+            MessageLog.objects.create(
+                organization=self.organization, campaign=steps[1].campaign, campaign_step=steps[1], lead=lead, status='opened',
+            )
+
+        # The middleware raises if the view goes over its declared budget
+        response = self.client.get('/webhook/n8n/due-messages/')
+        self.assertEqual(len(response.json()['messages']), 3 * 12 - 5)
+        self.assertLessEqual(int(response['X-Query-Count']), 10)
+
+        with assert_query_budget(max_queries=1):
+            performance = analytics_service.get_campaign_performance_data(
+                self.organization, timezone.now() - timezone.timedelta(days=1), timezone.now() + timezone.timedelta(days=1),
+            )
+        by_name = {row['name']: row for row in performance}
+        self.assertEqual(by_name['Campaign 0']['sent'], 5)
+        self.assertEqual(by_name['Campaign 1']['opened'], 5)
+
+    def test_queries_made_while_streaming_count_towards_the_budget(self):
+        self.assertEqual(settings.QUERY_BUDGET_MODE, 'raise')
+
+        def stream():
+            for lead in self.leads:
+                MessageLog.objects.filter(lead=lead).exists()
+                yield lead.name
+
+        middleware = QueryBudgetMiddleware(lambda request: StreamingHttpResponse(stream()))
+        response = middleware(RequestFactory().get('/stream/'))
+        self.assertEqual(response['X-Query-Count'], '0')
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'possible N+1: 12 x'):
+            b''.join(response.streaming_content)
@@ -26,7 +26,7 @@ from .views_webhook import n8n_property_enrichment_callback, n8n_lead_processing
 from .views_admin import ingestion_health
 from .views_jobs import jobs_next, job_update
 from .views_onboarding import onboarding_wizard, onboarding_step1_brand, onboarding_step2_persona, onboarding_step3_channels, onboarding_step4_plan, onboarding_step5_import, organization_settings, switch_organization
-from .views_chat import public_chat, chat_api_ask, embed_widget_js
+from .views_chat import public_chat, chat_api_ask, chat_api_stream, embed_widget_js
 from .views_social import facebook_webhook, instagram_webhook, connect_facebook_page, connect_instagram_account
 
 urlpatterns = [
@@ -58,9 +58,11 @@ urlpatterns = [
     path("password-reset/", password_reset_request, name="password_reset"),
     path("password-reset-confirm/<str:uidb64>/<str:token>/", password_reset_confirm, name="password_reset_confirm"),
     
-    # Public ChatURL routes
+    # Public ChatURL routes (after chat/webhook/, which the slug pattern would swallow)
+    path("chat/webhook/", webhook_chat, name="webhook_chat"),
     path("chat/<str:org_slug>/", public_chat, name="public_chat"),
     path("api/chat/ask/", chat_api_ask, name="chat_api_ask"),
+    path("api/chat/stream/", chat_api_stream, name="chat_api_stream"),
     path("embed/<str:org_slug>.js", embed_widget_js, name="embed_widget_js"),
     
     # Social Media Integration
@@ -100,7 +102,6 @@ urlpatterns = [
     
     # NEW: Webhook-powered AI chat
     path("chat/webhook/init/", init_webhook_chat, name="init_webhook_chat"),
-    path("chat/webhook/", webhook_chat, name="webhook_chat"),
     
     # API: Property titles for auto-linking in chat
     path("api/properties/titles/", get_property_titles, name="get_property_titles"),
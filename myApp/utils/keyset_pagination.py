@@ -0,0 +1,132 @@
+"""
+Keyset (cursor) pagination for dashboard list pages
+
+Paginator runs COUNT(*) and OFFSET n, so page 200 reads and discards
+everything before it. Keyset pagination orders by one field plus the primary
+key as a tiebreaker and asks for rows strictly after (or before) the last
+row shown:
+
+    ORDER BY price_amount, id
+    WHERE price_amount > 35000 OR (price_amount = 35000 AND id > '...')
+
+With an index on (scope, field, id) every page costs the same as the first.
+
+Cursors are signed, so they are opaque to clients and a tampered or stale
+cursor (one issued for another sort order) simply restarts at page one.
+Totals are optional and capped: counting stops after ``count_cap`` rows, so
+a huge result set reports "1,000+" instead of scanning everything.
+
+The ordering field must be non-nullable.
+"""
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'myApp.keyset'
+
+
+class KeysetPage:
+    """One page of results with cursors for the neighbouring pages"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None, count_is_exact=True):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_exact = count_is_exact
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _split_ordering(ordering):
+    return (ordering[1:], True) if ordering.startswith('-') else (ordering, False)
+
+
+def encode_cursor(ordering, row, direction):
+    field, _ = _split_ordering(ordering)
+    value = getattr(row, field)
+    payload = {
+        'o': ordering,
+        'd': direction,
+        'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+        'pk': str(row.pk),
+    }
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, ordering):
+    """Cursor payload, or None when the cursor is missing, invalid or for another ordering"""
+    if not cursor:
+        return None
+    try:
+        payload = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if payload.get('o') != ordering or payload.get('d') not in ('next', 'prev'):
+        return None
+    return payload
+
+
+def count_upto(queryset, cap):
+    """(count, is_exact): counts at most cap + 1 rows"""
+    count = queryset.order_by()[:cap + 1].count()
+    return (cap, False) if count > cap else (count, True)
+
+
+def paginate(queryset, ordering, cursor=None, per_page=12, count_cap=None):
+    """
+    Return a KeysetPage of ``queryset`` ordered by ``ordering`` (e.g. '-created_at')
+
+    Args:
+        cursor: next_cursor / previous_cursor of a page from the same ordering
+        count_cap: when set, also count matching rows up to this many
+    """
+    field, descending = _split_ordering(ordering)
+    model_field = queryset.model._meta.get_field(field)
+    pk_field = queryset.model._meta.pk
+    payload = decode_cursor(cursor, ordering)
+
+    backwards = payload is not None and payload['d'] == 'prev'
+    # Walking backwards flips the scan direction; rows are reversed again below
+    scan_descending = descending != backwards
+    prefix = '-' if scan_descending else ''
+    rows = queryset.order_by(f'{prefix}{field}', f'{prefix}pk')
+
+    if payload is not None:
+        value = model_field.to_python(payload['v'])
+        pk = pk_field.to_python(payload['pk'])
+        lookup = 'lt' if scan_descending else 'gt'
+        rows = rows.filter(
+            Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk})
+        )
+
+    fetched = list(rows[:per_page + 1])
+    more = len(fetched) > per_page
+    fetched = fetched[:per_page]
+    if backwards:
+        fetched.reverse()
+
+    next_cursor = previous_cursor = None
+    if fetched:
+        # A page reached through a cursor always has the page it came from on that side
+        if more or backwards:
+            next_cursor = encode_cursor(ordering, fetched[-1], 'next')
+        if (more and backwards) or (payload is not None and not backwards):
+            previous_cursor = encode_cursor(ordering, fetched[0], 'prev')
+
+    count, count_is_exact = (None, True)
+    if count_cap:
+        count, count_is_exact = count_upto(queryset, count_cap)
+
+    return KeysetPage(fetched, next_cursor, previous_cursor, count, count_is_exact)
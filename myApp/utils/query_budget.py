@@ -0,0 +1,114 @@
+"""
+Per-request query budgets and N+1 detection
+
+A view that queries inside a loop (``campaign.steps.first()`` per lead, an
+``exists()`` per lead per campaign) looks fine with three rows of test data
+and issues thousands of queries in production. ``QueryRecorder`` records every
+query run on any database connection while it is active and groups them by
+shape, the SQL with parameters, literals and IN lists stripped:
+
+    SELECT ... FROM "myApp_messagelog" WHERE ("campaign_id" = ? AND "lead_id" = ?) LIMIT ?
+
+The same shape repeated many times within one request is the signature of an
+N+1 loop. Two limits are checked:
+
+    max_queries   total queries for the request
+    max_repeats   executions of any single shape
+
+Views declare their limits with ``@query_budget(...)``; QueryBudgetMiddleware
+applies them (or QUERY_BUDGET_DEFAULT / QUERY_BUDGET_MAX_REPEATS) to every
+request, and tests wrap code in ``assert_query_budget(...)``.
+"""
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block ran more queries, or repeated a query more often, than allowed"""
+
+
+def query_shape(sql):
+    """The statement with parameters and literals replaced by ``?`` and IN lists collapsed"""
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _IN_LIST.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryRecorder:
+    """Records the SQL run on every database connection inside the ``with`` block"""
+
+    def __init__(self, using=None):
+        self.using = using
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.using or connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+    def __len__(self):
+        return len(self.queries)
+
+    def shapes(self):
+        """Counter of query shape -> executions"""
+        return Counter(query_shape(sql) for sql in self.queries)
+
+    def repeated(self, max_repeats):
+        """[(shape, executions), ...] for shapes run more than ``max_repeats`` times, most first"""
+        return [(shape, count) for shape, count in self.shapes().most_common() if count > max_repeats]
+
+    def problems(self, max_queries=None, max_repeats=None):
+        """Human-readable budget violations; empty when the block stayed within its budget"""
+        problems = []
+        if max_queries is not None and len(self) > max_queries:
+            problems.append(f"{len(self)} queries, budget is {max_queries}")
+        if max_repeats is not None:
+            for shape, count in self.repeated(max_repeats):
+                problems.append(f"possible N+1: {count} x {shape[:300]}")
+        return problems
+
+    def report(self, limit=10):
+        """The most frequent shapes, for log messages and failed assertions"""
+        lines = [f"{len(self)} queries, {len(self.shapes())} distinct"]
+        for shape, count in self.shapes().most_common(limit):
+            lines.append(f"  {count:>4} x {shape[:300]}")
+        return '\n'.join(lines)
+
+
+def query_budget(max_queries, max_repeats=None):
+    """Declare a view's query budget for QueryBudgetMiddleware"""
+    def decorator(view_func):
+        view_func.query_budget = (max_queries, max_repeats)
+        return view_func
+    return decorator
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, max_repeats=None, using=None):
+    """Fail with QueryBudgetExceeded if the block exceeds either limit"""
+    with QueryRecorder(using=using) as recorder:
+        yield recorder
+    problems = recorder.problems(max_queries, max_repeats)
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems) + '\n' + recorder.report())
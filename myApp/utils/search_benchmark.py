@@ -0,0 +1,232 @@
+"""
+Offline latency and recall benchmark for the vector search path
+
+Everything is synthetic: a clustered random corpus stands in for property
+embeddings and a lookup table stands in for the embeddings API, so runs are
+deterministic and never touch an embeddings backend. Ground truth is exact brute-force
+cosine similarity over the same vectors.
+"""
+import hashlib
+import time
+
+import numpy as np
+from django.db import transaction
+
+from ..services_embeddings import EmbeddingProvider
+
+CITIES = ['Makati', 'Taguig', 'Quezon City', 'Pasig', 'Mandaluyong', 'Manila', 'Paranaque', 'Cebu']
+PATHS = ('index', 'service', 'chat')
+
+
+class SyntheticCorpus:
+    """Clustered unit vectors for N properties plus noisy query vectors near random properties"""
+
+    def __init__(self, properties, dimensions=64, queries=200, chunks=1, seed=0, noise=0.35):
+        rng = np.random.default_rng(seed)
+        clusters = max(1, int(np.sqrt(properties)))
+        centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+
+        self.properties = properties
+        self.dimensions = dimensions
+        self.chunks = chunks
+        owners = rng.integers(0, clusters, size=properties)
+        rows = centers[np.repeat(owners, chunks)] + rng.normal(scale=0.6, size=(properties * chunks, dimensions))
+        self.vectors = _normalize(rows.astype(np.float32))
+        # Chunk rows are grouped per property: rows [i*chunks, (i+1)*chunks) belong to property i
+        self.row_property = np.repeat(np.arange(properties), chunks)
+
+        targets = rng.integers(0, properties * chunks, size=queries)
+        self.queries = _normalize(
+            self.vectors[targets] + rng.normal(scale=noise, size=(queries, dimensions)).astype(np.float32)
+        )
+        self.query_texts = [f"benchmark query {i}: homes similar to listing {target}" for i, target in enumerate(targets)]
+
+    def ground_truth(self, k):
+        """Exact top-k property positions per query, ranked by best chunk"""
+        truth = []
+        for query in self.queries:
+            scores = self.vectors @ query
+            best = np.full(self.properties, -np.inf, dtype=np.float32)
+            np.maximum.at(best, self.row_property, scores)
+            top = np.argpartition(-best, min(k, self.properties) - 1)[:k]
+            truth.append(top[np.argsort(-best[top])].tolist())
+        return truth
+
+
+class LookupEmbeddingProvider(EmbeddingProvider):
+    """Returns the corpus vector registered for each query text; anything else gets a seeded random vector"""
+
+    name = 'benchmark'
+
+    def __init__(self, corpus):
+        super().__init__(f"benchmark-{corpus.dimensions}", corpus.dimensions)
+        self.vectors = dict(zip(corpus.query_texts, corpus.queries))
+
+    def embed(self, texts):
+        vectors = []
+        for text in texts:
+            vector = self.vectors.get(text)
+            if vector is None:
+                seed = int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:4], 'little')
+                vector = np.random.default_rng(seed).normal(size=self.dimensions)
+            vectors.append(np.asarray(vector, dtype=np.float32).tolist())
+        return vectors
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def summarize(latencies, found, truth, k):
+    """p50/p95/p99/mean latency in ms, sequential QPS and mean recall@k"""
+    latencies = np.asarray(latencies, dtype=np.float64)
+    recalls = [
+        len(set(result[:k]) & set(expected[:k])) / max(1, min(k, len(expected)))
+        for result, expected in zip(found, truth)
+    ]
+    total = float(latencies.sum())
+    return {
+        'queries': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+        'qps': len(latencies) / total if total else 0.0,
+        'k': k,
+        'recall': float(np.mean(recalls)) if recalls else 0.0,
+    }
+
+
+def _timed(queries, search):
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        result = search(query)
+        latencies.append(time.perf_counter() - started)
+        found.append(result)
+    return latencies, found
+
+
+def benchmark_index(corpus, truth, k):
+    """PropertyVectorIndex alone: no database, no embedding call"""
+    from ..services_vector_index import PropertyVectorIndex
+
+    index = PropertyVectorIndex(corpus.dimensions)
+    started = time.perf_counter()
+    index.build(corpus.row_property.tolist(), corpus.vectors)
+    build_seconds = time.perf_counter() - started
+
+    latencies, found = _timed(
+        corpus.queries,
+        lambda query: [property_id for property_id, _ in index.search(query, limit=k)],
+    )
+    report = summarize(latencies, found, truth, k)
+    report['build_ms'] = build_seconds * 1000
+    return report
+
+
+def seed_organization(corpus, slug='benchmark', batch_size=5000, progress=None):
+    """Create an organization with one Property and its PropertyEmbedding rows per corpus property"""
+    from ..models import Organization, Property, PropertyEmbedding
+
+    organization = Organization.objects.create(name='Search Benchmark', slug=slug)
+    property_ids = []
+    for start in range(0, corpus.properties, batch_size):
+        end = min(start + batch_size, corpus.properties)
+        batch = [
+            Property(
+                organization=organization,
+                slug=f"{slug}-{i}",
+                title=f"Benchmark listing {i}",
+                price_amount=10000 + (i * 7919) % 990000,
+                city=CITIES[i % len(CITIES)],
+                beds=1 + i % 5,
+            )
+            for i in range(start, end)
+        ]
+        Property.objects.bulk_create(batch)
+        property_ids.extend(prop.id for prop in batch)
+
+        rows = []
+        for i, prop in zip(range(start, end), batch):
+            for chunk in range(corpus.chunks):
+                row = PropertyEmbedding(
+                    organization=organization, property=prop, doc_id=f"prop:{prop.id}", chunk=chunk
+                )
+                row.set_vector(corpus.vectors[i * corpus.chunks + chunk])
+                rows.append(row)
+        PropertyEmbedding.objects.bulk_create(rows)
+        if progress:
+            progress(end, corpus.properties)
+    return organization, [str(property_id) for property_id in property_ids]
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_benchmark(properties=1000, queries=200, k=5, dimensions=64, chunks=1, seed=0, paths=PATHS, progress=None):
+    """
+    Run the selected paths and return {path: report}
+
+    ``index`` measures PropertyVectorIndex directly. ``service`` drives
+    vector_service.search_similar_properties and ``chat`` drives the widget's
+    search_properties_by_message; both run against a seeded organization
+    inside a transaction that is rolled back afterwards.
+    """
+    corpus = SyntheticCorpus(properties, dimensions=dimensions, queries=queries, chunks=chunks, seed=seed)
+    truth = corpus.ground_truth(k)
+    reports = {}
+    if 'index' in paths:
+        reports['index'] = benchmark_index(corpus, truth, k)
+
+    db_paths = [path for path in paths if path in ('service', 'chat')]
+    if db_paths:
+        try:
+            with transaction.atomic():
+                reports.update(_benchmark_database_paths(corpus, truth, k, db_paths, progress))
+                raise _Rollback
+        except _Rollback:
+            pass
+    return reports
+
+
+def _benchmark_database_paths(corpus, truth, k, paths, progress):
+    from ..services_query_cache import query_embedding_cache
+    from ..services_vector import vector_service
+    from ..services_vector_index import vector_index_registry
+    from ..views_chat import search_properties_by_message
+
+    organization, property_ids = seed_organization(corpus, progress=progress)
+    truth_ids = [[property_ids[position] for position in expected] for expected in truth]
+
+    original_provider = vector_service.provider
+    vector_service.provider = LookupEmbeddingProvider(corpus)
+    reports = {}
+    try:
+        # Warm-up builds the index so it is not charged to the first query
+        started = time.perf_counter()
+        vector_index_registry.rebuild(organization.id)
+        build_seconds = time.perf_counter() - started
+
+        searches = {
+            'service': (k, lambda text: vector_service.search_similar_properties(organization, text, limit=k)),
+            # The chat widget always retrieves its top 5
+            'chat': (min(k, 5), lambda text: search_properties_by_message(organization, text)),
+        }
+        for path in paths:
+            path_k, search = searches[path]
+            query_embedding_cache.clear()
+            latencies, found = _timed(
+                corpus.query_texts,
+                lambda text: [str(prop.id) for prop in search(text)],
+            )
+            reports[path] = summarize(latencies, found, truth_ids, path_k)
+            reports[path]['build_ms'] = build_seconds * 1000
+    finally:
+        vector_service.provider = original_provider
+        vector_index_registry.invalidate(organization)
+        query_embedding_cache.clear()
+    return reports
@@ -0,0 +1,120 @@
+"""
+Token-budgeted chunking for property documents
+
+build_property_document() joins labelled fields ("Price: ...", "Description: ...")
+with " | ". Chunks are packed from whole fields first, then whole sentences
+of a field that is too long on its own, and only then whole words, so a chunk
+never starts or ends mid-word and short fields are never split at all.
+"""
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional; falls back to a character estimate
+    tiktoken = None
+
+FIELD_SEPARATOR = ' | '
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=\S)')
+LABEL_RE = re.compile(r'^([A-Z][A-Za-z ]{0,30}):\s')
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            # cl100k_base is the tokenizer of the text-embedding-3 models
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    """Exact token count with tiktoken, otherwise ~4 characters per token"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_RE.split(text.strip()) if sentence]
+
+
+def _split_words(text, max_tokens):
+    """Last resort for a single over-long sentence: windows of whole words"""
+    pieces, current = [], []
+    for word in text.split():
+        candidate = ' '.join(current + [word])
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(' '.join(current))
+            current = [word]
+        else:
+            current.append(word)
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+
+def _field_units(field, max_tokens):
+    """
+    A field as one unit, or its sentences (then word windows) when it exceeds the budget
+
+    Returns:
+        tuple: (units, continuation prefix such as "Description (cont.): ")
+    """
+    if count_tokens(field) <= max_tokens:
+        return [field], ''
+
+    label = LABEL_RE.match(field)
+    prefix = f"{label.group(1)} (cont.): " if label else ''
+    units = []
+    for sentence in split_sentences(field):
+        if count_tokens(prefix + sentence) <= max_tokens:
+            units.append(sentence)
+        else:
+            units.extend(_split_words(sentence, max_tokens - count_tokens(prefix)))
+    return units, prefix
+
+
+def chunk_document(text, max_tokens):
+    """
+    Split a document into chunks of at most ``max_tokens``
+
+    Fields are packed greedily in order; identical chunks (ignoring case and
+    whitespace) are emitted once.
+    """
+    text = (text or '').strip()
+    if not text:
+        return []
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks, current = [], ''
+    for field in text.split(FIELD_SEPARATOR):
+        field = field.strip()
+        if not field:
+            continue
+        units, prefix = _field_units(field, max_tokens)
+        for index, unit in enumerate(units):
+            # Sentences of one field are joined with a space, separate fields with the field separator
+            joiner = ' ' if index else FIELD_SEPARATOR
+            candidate = f"{current}{joiner}{unit}" if current else unit
+            if current and count_tokens(candidate) > max_tokens:
+                chunks.append(current)
+                # A chunk opening mid-field keeps the field label so it still says what it describes
+                current = prefix + unit if index else unit
+            else:
+                current = candidate
+    if current:
+        chunks.append(current)
+
+    unique, seen = [], set()
+    for chunk in chunks:
+        key = ' '.join(chunk.lower().split())
+        if key not in seen:
+            seen.add(key)
+            unique.append(chunk)
+    return unique
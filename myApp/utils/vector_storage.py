@@ -0,0 +1,92 @@
+"""
+Compact binary encoding for PropertyEmbedding vectors
+"""
+import numpy as np
+
+FLOAT32 = 'float32'
+FLOAT16 = 'float16'
+INT8 = 'int8'
+
+DTYPE_CHOICES = [
+    (FLOAT32, 'float32'),
+    (FLOAT16, 'float16'),
+    (INT8, 'int8 (per-row scale)'),
+]
+
+_NUMPY_DTYPES = {
+    FLOAT32: np.float32,
+    FLOAT16: np.float16,
+    INT8: np.int8,
+}
+
+
+def encode_vector(vector, dtype=FLOAT32):
+    """Encode a vector as little-endian bytes, returning (blob, dims, scale)"""
+    if dtype not in _NUMPY_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    values = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == INT8:
+        # Symmetric per-row quantization; cosine ranking survives the rounding well
+        peak = float(np.abs(values).max()) if len(values) else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        values = np.clip(np.rint(values / scale), -127, 127)
+
+    encoded = values.astype(np.dtype(_NUMPY_DTYPES[dtype]).newbyteorder('<'))
+    return encoded.tobytes(), len(values), scale
+
+
+def decode_vector(blob, dtype=FLOAT32, scale=1.0):
+    """Decode bytes produced by encode_vector back into a float32 array"""
+    if dtype not in _NUMPY_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    values = np.frombuffer(bytes(blob), dtype=np.dtype(_NUMPY_DTYPES[dtype]).newbyteorder('<'))
+    values = values.astype(np.float32)
+    if dtype == INT8:
+        values *= scale
+    return values
+
+
+def load_embedding_matrix(queryset, dimensions=None):
+    """
+    Read embedding rows into one contiguous float32 matrix with a single query
+
+    Rows still stored in the legacy JSON column are decoded too, so callers
+    work before and after the conversion migration has run.
+
+    Returns:
+        tuple: (property_ids as strings, matrix of shape (rows, dims))
+    """
+    rows = list(queryset.values_list('property_id', 'vector', 'vector_dtype', 'vector_scale', 'embedding'))
+    if dimensions is None:
+        dimensions = _first_dimensions(rows)
+
+    property_ids = []
+    matrix = np.empty((len(rows), dimensions or 0), dtype=np.float32)
+    filled = 0
+    for property_id, blob, dtype, scale, legacy in rows:
+        if blob:
+            values = decode_vector(blob, dtype, scale)
+        elif legacy:
+            values = np.asarray(legacy, dtype=np.float32)
+        else:
+            continue
+        if len(values) != dimensions:
+            # Mixed models or a half-finished migration; skip rather than fail the whole load
+            continue
+        matrix[filled] = values
+        property_ids.append(str(property_id))
+        filled += 1
+
+    return property_ids, matrix[:filled]
+
+
+def _first_dimensions(rows):
+    for _, blob, dtype, scale, legacy in rows:
+        if blob:
+            return len(decode_vector(blob, dtype, scale))
+        if legacy:
+            return len(legacy)
+    return 0
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.db.models import Exists, OuterRef, Q
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.db import connection
 from django.contrib import messages
@@ -20,7 +20,10 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
 from django.conf import settings
+# The settings() view below rebinds ``settings`` in this module; this name stays the Django settings
+from django.conf import settings as django_settings
 import os
+import uuid
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 import json
@@ -29,15 +32,26 @@ from .models import Property, Lead, PropertyUpload, Company, HiddenProperty, Ema
 from .forms import LeadForm, PropertyUploadForm, LoginForm, PropertyForm
 from django.forms import ModelForm
 from .webhook import send_chat_inquiry_webhook, send_property_listing_webhook, send_property_chat_webhook, send_prompt_search_webhook
+from .services_conversations import conversation_store
+from .services_facets import bed_options, facet_counts, price_options, sorted_options
+from .services_fact_sheets import area_summaries, fact_sheet_for
+from .services_llm import llm_gateway
+from .services_page_cache import page_cache
+from .services_response_cache import property_response_cache
+from .services_search import search_engine
+from .services_text_search import text_search
+from .services_vector import vector_service
+from .services_webhook_relay import RelayBusy, RelayError, RelayTimeout, webhook_relay
+from .utils.keyset_pagination import paginate as keyset_paginate
 
 
 def home(request: HttpRequest) -> HttpResponse:
+    # Lazy: only evaluated when the cached top picks fragment is stale
     top_picks = Property.objects.all()[:6]
-    return render(request, "home.html", {"top_picks": top_picks})
+    return render(request, "home.html", {"top_picks": top_picks, "catalog_version": page_cache.catalog_version()})
 
 
 def results(request: HttpRequest) -> HttpResponse:
-    qs = Property.objects.all()
     q = request.GET.get("q", "").strip()
     city = request.GET.get("city", "").strip()
     beds = request.GET.get("beds", "").strip()
@@ -49,22 +63,22 @@ def results(request: HttpRequest) -> HttpResponse:
         # Use AI prompt to enhance search
         enhanced_search = process_ai_search_prompt(ai_prompt)
         
-        # Apply enhanced search filters
-        if enhanced_search.get("city"):
-            qs = qs.filter(Q(city__icontains=enhanced_search["city"]) | Q(area__icontains=enhanced_search["city"]))
-        if enhanced_search.get("beds"):
-            qs = qs.filter(beds__gte=enhanced_search["beds"])
-        if enhanced_search.get("price_max"):
-            qs = qs.filter(price_amount__lte=enhanced_search["price_max"])
-        if enhanced_search.get("keywords"):
-            for keyword in enhanced_search["keywords"]:
-                qs = qs.filter(Q(title__icontains=keyword) | Q(description__icontains=keyword) | Q(badges__icontains=keyword))
+        # Extracted constraints become pre-filters; keywords are ranked
+        qs = search_engine.search_properties(
+            " ".join(enhanced_search.get("keywords") or []),
+            filters={
+                "city": enhanced_search.get("city") or None,
+                "beds_min": enhanced_search.get("beds"),
+                "price_max": enhanced_search.get("price_max"),
+                "is_active": True,
+            },
+        )
         
         # Send webhook for prompt-based search
         try:
             search_webhook_data = {
                 "prompt": ai_prompt,
-                "results_count": qs.count(),
+                "results_count": len(qs),
                 "session_id": request.session.session_key or "anonymous",
                 "buy_or_rent": enhanced_search.get("buy_or_rent", ""),
                 "budget_max": enhanced_search.get("price_max"),
@@ -83,25 +97,62 @@ def results(request: HttpRequest) -> HttpResponse:
     
     # Handle traditional search
     else:
-        if q:
-            qs = qs.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(badges__icontains=q) | Q(city__icontains=q))
-        if city:
-            qs = qs.filter(Q(city__iexact=city) | Q(area__icontains=city))
-        if beds and beds.isdigit():
-            qs = qs.filter(beds__gte=int(beds))
-        if price_max and price_max.isdigit():
-            qs = qs.filter(price_amount__lte=int(price_max))
+        qs = search_engine.search_properties(
+            q,
+            filters={
+                "city": city or None,
+                "beds_min": int(beds) if beds.isdigit() else None,
+                "price_max": int(price_max) if price_max.isdigit() else None,
+                "is_active": True,
+            },
+        )
 
     return render(request, "results.html", {
         "properties": qs, 
-        "count": qs.count(),
+        "count": len(qs),
+        "cities": sorted_options(facet_counts.public_properties()["city"]),
         "ai_prompt": ai_prompt,
         "search_type": "ai_prompt" if ai_prompt else "traditional"
     })
 
 
+def _public_property(request: HttpRequest, slug: str):
+    """Cached snapshot of the property, looked up once per request"""
+    if getattr(request, "_public_property_slug", None) != slug:
+        request._public_property = page_cache.snapshot(slug)
+        request._public_property_slug = slug
+    return request._public_property
+
+
+def _public_property_etag(request: HttpRequest, slug: str):
+    prop = _public_property(request, slug)
+    return page_cache.etag(prop, request) if prop else None
+
+
+def _public_property_last_modified(request: HttpRequest, slug: str):
+    prop = _public_property(request, slug)
+    return prop.updated_at if prop else None
+
+
+def _property_lead_id(request: HttpRequest, prop) -> str:
+    """The ``lead`` query parameter if it is a lead of the property's organization (or company), else ''"""
+    lead_id = request.GET.get("lead", "")
+    try:
+        uuid.UUID(lead_id)
+    except ValueError:
+        return ""
+    if prop.organization_id:
+        leads = Lead.objects.filter(organization_id=prop.organization_id)
+    else:
+        leads = Lead.objects.filter(company_id=prop.company_id)
+    return lead_id if leads.filter(id=lead_id).exists() else ""
+
+
+@condition(etag_func=_public_property_etag, last_modified_func=_public_property_last_modified)
 def property_detail(request: HttpRequest, slug: str) -> HttpResponse:
-    prop = get_object_or_404(Property, slug=slug)
+    prop = _public_property(request, slug)
+    if prop is None:
+        raise Http404("No Property matches the given query.")
     return render(request, "property_detail.html", {"property": prop})
 
 
@@ -369,6 +420,9 @@ def dashboard(request: HttpRequest) -> HttpResponse:
     import json
     timeseries_json = json.dumps(timeseries_data)
     
+    # LLM usage for the same window
+    llm_usage = analytics_service.get_llm_metrics(organization, timezone.now() - timedelta(days=range_days))
+    
     context = {
         'leads_today': leads_today,
         'leads_delta': leads_delta,
@@ -379,6 +433,7 @@ def dashboard(request: HttpRequest) -> HttpResponse:
         'recent_properties': recent_properties,
         'timeseries_data': timeseries_data,
         'timeseries_json': timeseries_json,
+        'llm_usage': llm_usage,
         'channel_connections': ChannelConnection.objects.filter(organization=organization),
         'organization': organization,
     }
@@ -588,7 +643,6 @@ def process_ai_search_prompt(prompt: str) -> dict:
 
 def get_ai_property_response(property_obj: Property, message: str) -> str:
     """AI-powered response that can query database and provide intelligent answers"""
-    import openai
     from django.conf import settings
     
     # Check if OpenAI API key is available
@@ -596,46 +650,24 @@ def get_ai_property_response(property_obj: Property, message: str) -> str:
         # Fallback to simple answer if no API key
         return simple_answer(property_obj, message.lower())
     
+    # Precomputed fact sheet and cached same-city comparables keep the prompt small
+    comparables = "\n".join(area_summaries.comparables(property_obj)) or "None listed."
+    
+    # Repeated (or near-identical) questions about this version of the listing and its comparables
+    embed = vector_service.embed_query if vector_service.provider.available else None
+    cached = property_response_cache.get(property_obj, message, embed=embed, context=comparables)
+    if cached is not None:
+        return cached
+    
     try:
-        # Prepare comprehensive property data for AI context
-        property_data = {
-            "title": property_obj.title,
-            "description": property_obj.description,
-            "price_amount": property_obj.price_amount,
-            "city": property_obj.city,
-            "area": property_obj.area,
-            "beds": property_obj.beds,
-            "baths": property_obj.baths,
-            "floor_area_sqm": property_obj.floor_area_sqm,
-            "parking": property_obj.parking,
-            "property_type": property_obj.property_type,
-            "badges": property_obj.badges,
-            "hero_image": str(property_obj.hero_image) if property_obj.hero_image else None,
-        }
-        
-        # Get related properties for comparison context
-        related_properties = Property.objects.filter(
-            city=property_obj.city
-        ).exclude(id=property_obj.id)[:5]
-        
-        related_data = []
-        for prop in related_properties:
-            related_data.append({
-                "title": prop.title,
-                "price": prop.price_amount,
-                "beds": prop.beds,
-                "baths": prop.baths,
-                "area": prop.area
-            })
-        
         # Create AI system prompt
         system_prompt = f"""You are an intelligent real estate assistant with access to comprehensive property data. 
 
-CURRENT PROPERTY DATA:
-{property_data}
+CURRENT PROPERTY:
+{fact_sheet_for(property_obj)}
 
-RELATED PROPERTIES IN SAME AREA:
-{related_data}
+OTHER LISTINGS IN {property_obj.city.upper()}:
+{comparables}
 
 You can answer questions about:
 - Property details, pricing, and features
@@ -645,23 +677,26 @@ You can answer questions about:
 - Investment potential and rental estimates
 - Any other property-related questions
 
-Be helpful, accurate, and conversational. Use the data provided to give specific, detailed answers. If you need to make comparisons, use the related properties data. Always be honest about what information is available vs. what might need further research.
+Be helpful, accurate, and conversational. Use the data provided to give specific, detailed answers. If you need to make comparisons, use the other listings. Always be honest about what information is available vs. what might need further research.
 
 Respond naturally and helpfully to the user's question."""
 
         # Call OpenAI API
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        response = client.chat.completions.create(
+        response = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": message}
             ],
+            organization=property_obj.organization_id,
+            call_site="property_chat",
             temperature=0.7,
             max_tokens=500
         )
         
-        return response.choices[0].message.content.strip()
+        answer = response.strip()
+        property_response_cache.set(property_obj, message, answer, embed=embed, context=comparables)
+        return answer
         
     except Exception as e:
         print(f"AI chat error: {e}")
@@ -729,7 +764,7 @@ def upload_listing(request: HttpRequest) -> HttpResponse:
             upload.save()
             
             # Start AI validation process
-            validate_property_with_ai(upload)
+            validate_property_with_ai(upload, getattr(request, 'organization', None))
             
             return redirect('processing_listing', upload_id=upload.id)
     else:
@@ -767,7 +802,7 @@ def validation_chat(request: HttpRequest, upload_id: str) -> HttpResponse:
             })
             
             # Get AI response
-            ai_response = get_ai_validation_response(upload, user_message)
+            ai_response = get_ai_validation_response(upload, user_message, getattr(request, 'organization', None))
             chat_history.append({
                 'role': 'assistant',
                 'content': ai_response,
@@ -813,7 +848,7 @@ def validation_chat(request: HttpRequest, upload_id: str) -> HttpResponse:
             if check_validation_complete(upload):
                 upload.status = 'complete'
                 # Create the actual Property object
-                create_property_from_upload(upload)
+                create_property_from_upload(upload, getattr(request, 'organization', None))
                 upload.save()
                 return redirect('property_detail', slug=upload.property.slug)
     
@@ -833,15 +868,11 @@ def validation_chat(request: HttpRequest, upload_id: str) -> HttpResponse:
     return render(request, 'validation_chat.html', context)
 
 
-def validate_property_with_ai(upload: PropertyUpload):
-    """Send property data to OpenAI for validation"""
-    import openai
+def validate_property_with_ai(upload: PropertyUpload, organization=None):
+    """Send property data to OpenAI for validation; legacy uploads without an organization bill ``organization``"""
     import json
     from django.conf import settings
     
-    # Set OpenAI API key
-    openai.api_key = settings.OPENAI_API_KEY
-    
     # Prepare property data for AI validation
     property_data = {
         'title': upload.title,
@@ -975,19 +1006,19 @@ Please respond with a JSON object containing:
 
     try:
         # Call OpenAI API
-        response = openai.ChatCompletion.create(
+        ai_response = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": f"Please validate this property data: {json.dumps(property_data, indent=2)}"}
             ],
+            organization=upload.organization_id or organization,
+            call_site="upload.validate",
             temperature=0.1,
             max_tokens=2000
         )
         
         # Parse the AI response
-        ai_response = response.choices[0].message.content
-        
         try:
             # Try to parse as JSON
             parsed_response = json.loads(ai_response)
@@ -1076,15 +1107,11 @@ Please respond with a JSON object containing:
         upload.save()
 
 
-def get_ai_validation_response(upload: PropertyUpload, user_message: str) -> str:
+def get_ai_validation_response(upload: PropertyUpload, user_message: str, organization=None) -> str:
     """Get AI response for validation chat"""
-    import openai
     import json
     from django.conf import settings
     
-    # Set OpenAI API key
-    openai.api_key = settings.OPENAI_API_KEY
-    
     # Get the next missing field to ask about
     missing_fields = upload.missing_fields or []
     chat_history = upload.validation_chat_history or []
@@ -1145,7 +1172,7 @@ Be thorough, professional, and ensure we get ALL the information needed for a co
 
     try:
         # Call OpenAI API for chat response
-        response = openai.ChatCompletion.create(
+        ai_response = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": chat_system_message.format(
@@ -1156,11 +1183,12 @@ Be thorough, professional, and ensure we get ALL the information needed for a co
                 )},
                 {"role": "user", "content": user_message}
             ],
+            organization=upload.organization_id or organization,
+            call_site="upload.validation_chat",
             temperature=0.3,  # Lower temperature for more consistent, thorough responses
             max_tokens=800
         )
         
-        ai_response = response.choices[0].message.content
         return ai_response
         
     except Exception as e:
@@ -1276,7 +1304,7 @@ def check_validation_complete(upload: PropertyUpload) -> bool:
     return substantial_engagement
 
 
-def create_property_from_upload(upload: PropertyUpload):
+def create_property_from_upload(upload: PropertyUpload, organization=None):
     """Create Property object from validated upload"""
     from django.utils.text import slugify
     import uuid
@@ -1292,7 +1320,7 @@ def create_property_from_upload(upload: PropertyUpload):
         counter += 1
     
     # Consolidate all information from chat history
-    consolidated_info = consolidate_property_information(upload)
+    consolidated_info = consolidate_property_information(upload, organization)
     
     property_obj = Property.objects.create(
         title=upload.title,
@@ -1363,9 +1391,8 @@ def create_property_from_upload(upload: PropertyUpload):
     return property_obj
 
 
-def consolidate_property_information(upload: PropertyUpload):
+def consolidate_property_information(upload: PropertyUpload, organization=None):
     """Consolidate all property information from chat history and upload data"""
-    import openai
     import json
     from django.conf import settings
     
@@ -1413,20 +1440,18 @@ def consolidate_property_information(upload: PropertyUpload):
     """
     
     try:
-        openai.api_key = settings.OPENAI_API_KEY
-        
-        response = openai.ChatCompletion.create(
+        consolidated_description = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are a professional real estate copywriter who creates compelling property descriptions."},
                 {"role": "user", "content": consolidation_prompt}
             ],
+            organization=upload.organization_id or organization,
+            call_site="upload.consolidate",
             temperature=0.7,
             max_tokens=500
         )
         
-        consolidated_description = response.choices[0].message.content
-        
         # Store the consolidated information in the upload model
         try:
             upload.consolidated_information = consolidated_description
@@ -1450,15 +1475,11 @@ def consolidate_property_information(upload: PropertyUpload):
         return fallback_description.strip()
 
 
-def process_ai_prompt_with_validation(upload: PropertyUpload, property_description: str, additional_info: str = ""):
+def process_ai_prompt_with_validation(upload: PropertyUpload, property_description: str, additional_info: str = "", organization=None):
     """Process AI prompt description against comprehensive checklist"""
-    import openai
     import json
     from django.conf import settings
     
-    # Set OpenAI API key
-    openai.api_key = settings.OPENAI_API_KEY
-    
     # Combine all input information
     full_description = f"{property_description}\n\nAdditional Information: {additional_info}"
     
@@ -1487,18 +1508,18 @@ When a user asks a question about a property, first check if the necessary field
 
     try:
         # Send to OpenAI for validation
-        response = openai.ChatCompletion.create(
+        ai_response = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": checklist_system_message},
                 {"role": "user", "content": f"Please analyze this property description against the checklist:\n\n{full_description}"}
             ],
+            organization=upload.organization_id or organization,
+            call_site="upload.prompt_validation",
             temperature=0.3,
             max_tokens=1000
         )
         
-        ai_response = response.choices[0].message.content
-        
         # Parse the AI response to extract information
         # Try to extract basic information from the description
         extracted_info = extract_basic_info_from_description(full_description)
@@ -1704,7 +1725,7 @@ def ai_prompt_listing(request):
         # Process with AI to extract information and create preview
         try:
             print("🤖 Starting AI preview generation...")
-            ai_preview_data = generate_ai_listing_preview(upload, property_description, additional_info)
+            ai_preview_data = generate_ai_listing_preview(upload, property_description, additional_info, getattr(request, 'organization', None))
             print(f"✅ AI preview data generated: {ai_preview_data}")
             print("🎯 Rendering preview template...")
             
@@ -1763,9 +1784,8 @@ def handle_final_listing_creation(request):
     return redirect('validation_chat', upload_id=upload.id)
 
 
-def generate_ai_listing_preview(upload, property_description, additional_info):
+def generate_ai_listing_preview(upload, property_description, additional_info, organization=None):
     """Generate AI preview of the listing with extracted data"""
-    import openai
     from django.conf import settings
     
     # Prepare the AI prompt for listing generation
@@ -1812,19 +1832,20 @@ Please analyze this property description and generate a complete listing with al
         return generate_demo_ai_preview(property_description, additional_info)
     
     try:
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        response = client.chat.completions.create(
+        response = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
+            organization=upload.organization_id or organization,
+            call_site="upload.listing_preview",
             temperature=0.3,
             max_tokens=1000
         )
         
         # Parse the AI response
-        ai_response = response.choices[0].message.content.strip()
+        ai_response = response.strip()
         
         # Try to extract JSON from the response
         import json
@@ -2260,31 +2281,25 @@ def home_chat(request: HttpRequest) -> HttpResponse:
     # Process the conversational query using existing AI search helper
     enhanced_search = process_ai_search_prompt(message)
     
-    # Query properties based on extracted parameters
-    qs = Property.objects.all()
-    
-    if enhanced_search.get("city"):
-        qs = qs.filter(Q(city__icontains=enhanced_search["city"]) | Q(area__icontains=enhanced_search["city"]))
-    if enhanced_search.get("beds"):
-        qs = qs.filter(beds__gte=enhanced_search["beds"])
-    if enhanced_search.get("price_max"):
-        qs = qs.filter(price_amount__lte=enhanced_search["price_max"])
-    if enhanced_search.get("keywords"):
-        for keyword in enhanced_search["keywords"]:
-            qs = qs.filter(Q(title__icontains=keyword) | Q(description__icontains=keyword) | Q(badges__icontains=keyword))
-    
-    # Limit to top 6 results for chat suggestions
-    top_results = qs[:6]
+    # Rank properties for the message under the extracted constraints; top 6 for chat suggestions
+    chat_filters = {
+        "city": enhanced_search.get("city") or None,
+        "beds_min": enhanced_search.get("beds"),
+        "price_max": enhanced_search.get("price_max"),
+        "is_active": True,
+    }
+    ranked_ids = search_engine.search(" ".join(enhanced_search.get("keywords") or []), filters=chat_filters, limit=6)
+    top_results = page_cache.snapshots(search_engine.current_ids(ranked_ids, chat_filters))
     
     # Generate conversational response
-    response_text = generate_chat_response(message, enhanced_search, top_results.count())
+    response_text = generate_chat_response(message, enhanced_search, len(top_results))
     
     # Send webhook for buyer chat interaction
     try:
         chat_data = {
             "type": "buyer_chat",
             "message": message,
-            "results_count": top_results.count(),
+            "results_count": len(top_results),
             "session_id": request.session.session_key or "anonymous",
             "timestamp": timezone.now().isoformat(),
             "extracted_params": enhanced_search,
@@ -2349,7 +2364,9 @@ def property_modal(request: HttpRequest, slug: str) -> HttpResponse:
     NEW FEATURE: Allows buyers to preview properties without leaving homepage
     Different from full property_detail page - this is a lightweight popup
     """
-    property_obj = get_object_or_404(Property, slug=slug)
+    property_obj = _public_property(request, slug)
+    if property_obj is None:
+        raise Http404("No Property matches the given query.")
     
     # Track modal view
     try:
@@ -2367,7 +2384,9 @@ def property_modal(request: HttpRequest, slug: str) -> HttpResponse:
         print(f"Webhook error: {e}")
     
     context = {
-        "property": property_obj
+        "property": property_obj,
+        # Part of the fragment's cache key, so only ids of real leads may create entries
+        "lead_id": _property_lead_id(request, property_obj),
     }
     
     return render(request, "partials/property_modal.html", context)
@@ -2399,14 +2418,14 @@ def ai_prompt_search(request: HttpRequest) -> HttpResponse:
     qs = Property.objects.all()
     
     if enhanced_search.get("city"):
-        qs = qs.filter(Q(city__icontains=enhanced_search["city"]) | Q(area__icontains=enhanced_search["city"]))
+        qs = text_search.filter(qs, enhanced_search["city"], fields=("city", "area"))
     if enhanced_search.get("beds"):
         qs = qs.filter(beds__gte=enhanced_search["beds"])
     if enhanced_search.get("price_max"):
         qs = qs.filter(price_amount__lte=enhanced_search["price_max"])
     if enhanced_search.get("keywords"):
         for keyword in enhanced_search["keywords"]:
-            qs = qs.filter(Q(title__icontains=keyword) | Q(description__icontains=keyword) | Q(badges__icontains=keyword))
+            qs = text_search.filter(qs, keyword, fields=("title", "description", "badges"))
     
     # Get top properties
     top_properties = qs[:6]
@@ -2516,73 +2535,56 @@ def ai_prompt_search(request: HttpRequest) -> HttpResponse:
     return redirect(f"{reverse('results')}?ai_prompt={ai_prompt}")
 
 
+async def _relay_chat_message(message: str, session_id: str) -> tuple[dict | None, str]:
+    """
+    Forward one visitor message to the Katalyst chat webhook
+
+    Returns (webhook JSON or None, text to show the visitor). Awaited on the
+    shared connection pool, so a slow CRM does not hold a worker.
+    """
+    try:
+        webhook_response = await webhook_relay.post(
+            django_settings.KATALYST_CHAT_WEBHOOK_URL,
+            {"message": message, "sessionID": session_id},
+        )
+    except RelayBusy:
+        return None, "Error: The AI service is busy. Please try again in a moment."
+    except RelayTimeout:
+        return None, "Error: Request timed out. Please try again."
+    except RelayError as e:
+        print(f"Webhook error: {e}")
+        return None, "Error: Unable to connect to AI service."
+    
+    if webhook_response and "Response" in webhook_response:
+        return webhook_response, webhook_response["Response"]
+    return webhook_response, "Error: No response from AI service."
+
+
 @require_POST
-def init_webhook_chat(request: HttpRequest) -> HttpResponse:
+async def init_webhook_chat(request: HttpRequest) -> HttpResponse:
     """
     Initialize the chatbox with the first user message
     Transforms the search form into a chat interface
     """
-    import requests
-    
     initial_message = request.POST.get("ai_prompt", "").strip()
     
     if not initial_message:
         return HttpResponseBadRequest("Message required")
     
-    # Initialize chat history in session
-    request.session["chat_history"] = []
-    
-    # Add user message to history
-    request.session["chat_history"].append({
-        "role": "user",
-        "message": initial_message,
-        "timestamp": timezone.now().isoformat()
-    })
-    
     # Ensure we have a session ID
     if not request.session.session_key:
-        request.session.create()
+        await request.session.acreate()
     
     session_id = request.session.session_key
     
-    # Send to webhook - only forward the user message with sessionID
-    webhook_url = "https://katalyst-crm.fly.dev/webhook/ca05d7c5-984c-4d95-8636-1ed3d80f5545"
+    # Start a fresh server-side transcript; the session only keeps its id
+    await request.session.apop("chat_history", None)
+    conversation_id = await conversation_store.astart(request.session)
     
-    webhook_payload = {
-        "message": initial_message,
-        "sessionID": session_id
-    }
+    # Send to webhook - only forward the user message with sessionID, NO fallback message
+    webhook_response, ai_response = await _relay_chat_message(initial_message, session_id)
     
-    # Get webhook response - NO fallback message
-    ai_response = None
-    
-    try:
-        response = requests.post(
-            webhook_url,
-            json=webhook_payload,
-            timeout=10,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        webhook_response = response.json()
-        
-        if webhook_response and "Response" in webhook_response:
-            ai_response = webhook_response["Response"]
-        else:
-            ai_response = "I'm having trouble connecting. Please try again."
-            
-    except Exception as e:
-        print(f"Webhook error: {e}")
-        ai_response = f"Error connecting to AI service. Please try again."
-    
-    # Add AI response to history
-    request.session["chat_history"].append({
-        "role": "assistant",
-        "message": ai_response,
-        "timestamp": timezone.now().isoformat()
-    })
-    
-    request.session.modified = True
+    await conversation_store.aappend(conversation_id, ("user", initial_message), ("assistant", ai_response))
     
     # Return chatbox interface
     return render(request, "partials/chatbox_interface.html", {
@@ -2592,13 +2594,11 @@ def init_webhook_chat(request: HttpRequest) -> HttpResponse:
 
 
 @require_POST
-def webhook_chat(request: HttpRequest) -> HttpResponse:
+async def webhook_chat(request: HttpRequest) -> HttpResponse:
     """
     Handle AI chat conversation via webhook
     Sends user messages to webhook and returns AI responses
     """
-    import requests
-    
     user_message = request.POST.get("message", "").strip()
     
     if not user_message:
@@ -2606,66 +2606,18 @@ def webhook_chat(request: HttpRequest) -> HttpResponse:
     
     # Ensure we have a session ID
     if not request.session.session_key:
-        request.session.create()
+        await request.session.acreate()
     
     session_id = request.session.session_key
     
-    # Store conversation history in session
-    if "chat_history" not in request.session:
-        request.session["chat_history"] = []
-    
-    # Add user message to history
-    request.session["chat_history"].append({
-        "role": "user",
-        "message": user_message,
-        "timestamp": timezone.now().isoformat()
-    })
-    
-    # Prepare webhook payload - send user message with sessionID
-    webhook_url = "https://katalyst-crm.fly.dev/webhook/ca05d7c5-984c-4d95-8636-1ed3d80f5545"
-    
-    webhook_payload = {
-        "message": user_message,
-        "sessionID": session_id
-    }
+    # Conversation history lives server-side; the session only keeps its id
+    await request.session.apop("chat_history", None)
+    conversation_id = await conversation_store.afor_session(request.session)
     
     # Send to webhook and get response - NO fallback message
-    webhook_response = None
-    webhook_success = False
-    ai_response = None
+    webhook_response, ai_response = await _relay_chat_message(user_message, session_id)
     
-    try:
-        response = requests.post(
-            webhook_url,
-            json=webhook_payload,
-            timeout=10,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        webhook_response = response.json()
-        webhook_success = True
-        
-        # Extract AI response from webhook
-        if webhook_response and "Response" in webhook_response:
-            ai_response = webhook_response["Response"]
-        else:
-            ai_response = "Error: No response from AI service."
-        
-    except requests.exceptions.Timeout:
-        ai_response = "Error: Request timed out. Please try again."
-    except requests.exceptions.RequestException as e:
-        print(f"Webhook error: {e}")
-        ai_response = f"Error: Unable to connect to AI service."
-    
-    # Add AI response to history
-    request.session["chat_history"].append({
-        "role": "assistant",
-        "message": ai_response,
-        "timestamp": timezone.now().isoformat()
-    })
-    
-    # Save session
-    request.session.modified = True
+    await conversation_store.aappend(conversation_id, ("user", user_message), ("assistant", ai_response))
     
     # Return response for HTMX
     if request.headers.get('HX-Request'):
@@ -2677,7 +2629,7 @@ def webhook_chat(request: HttpRequest) -> HttpResponse:
     
     # JSON response for non-HTMX requests
     return JsonResponse({
-        "success": webhook_success,
+        "success": webhook_response is not None,
         "response": ai_response,
         "webhook_data": webhook_response
     })
@@ -3040,6 +2992,7 @@ def properties(request: HttpRequest) -> HttpResponse:
     status = request.GET.get("status", "").strip()
     sort = request.GET.get("sort", "-created_at")
     page = int(request.GET.get("page", 1))
+    cursor = request.GET.get("cursor", "")
     per = min(int(request.GET.get("per", 12)), 48)
     
     # Get organization
@@ -3061,20 +3014,20 @@ def properties(request: HttpRequest) -> HttpResponse:
         else:
             properties = Property.objects.none()
     
-    # Exclude properties hidden by current user
+    # Exclude properties hidden by current user (NOT EXISTS anti-join on the user/property index)
     if request.user.is_authenticated:
-        hidden_property_ids = HiddenProperty.objects.filter(user=request.user).values_list('property_id', flat=True)
-        properties = properties.exclude(id__in=hidden_property_ids)
-    
-    # Search filter
-    if q:
-        properties = properties.filter(
-            Q(title__icontains=q) | 
-            Q(area__icontains=q) | 
-            Q(city__icontains=q) | 
-            Q(description__icontains=q)
+        properties = properties.exclude(
+            Exists(HiddenProperty.objects.filter(user=request.user, property=OuterRef('pk')))
         )
     
+    # Search filter: ranked hybrid search within the organization
+    ranked_ids = None
+    if q and organization:
+        ranked_ids = search_engine.search(q, organization=organization, limit=django_settings.SEARCH_MAX_RESULTS)
+        properties = properties.filter(id__in=ranked_ids)
+    elif q:
+        properties = text_search.filter(properties, q, fields=("title", "area", "city", "description"))
+    
     # City filter
     if city:
         properties = properties.filter(city__iexact=city)
@@ -3111,23 +3064,37 @@ def properties(request: HttpRequest) -> HttpResponse:
         "beds_desc": "-beds",
         "title_asc": "title"
     }
-    properties = properties.order_by(sort_options.get(sort, "-created_at"))
-    
-    # Pagination
-    paginator = Paginator(properties, per)
-    page_obj = paginator.get_page(page)
+    if ranked_ids is not None and "sort" not in request.GET:
+        # No explicit sort: keep relevance order (at most SEARCH_MAX_RESULTS rows, numbered pages)
+        rank = {property_id: position for position, property_id in enumerate(ranked_ids)}
+        properties = sorted(properties, key=lambda prop: rank[str(prop.id)])
+        paginator = Paginator(properties, per)
+        page_obj = paginator.get_page(page)
+        total_count, total_count_is_exact = paginator.count, True
+    else:
+        # Keyset pagination: every page costs the same as the first
+        page_obj = keyset_paginate(
+            properties, sort_options.get(sort, "-created_at"), cursor=cursor, per_page=per,
+            count_cap=django_settings.LIST_PAGE_COUNT_CAP,
+        )
+        total_count, total_count_is_exact = page_obj.count, page_obj.count_is_exact
     
-    # Get distinct cities for filter dropdown (from organization properties)
-    if organization:
-        cities = Property.objects.filter(organization=organization).values_list("city", flat=True).distinct().order_by("city")
+    # Filter dropdown options with counts (precomputed per organization)
+    facets = facet_counts.properties(organization) if organization else {"city": {}, "beds": {}, "price": {}}
+    if price_max:
+        current_price = f"{price_min or 0}-{price_max}"
     else:
-        cities = Property.objects.none()
+        current_price = f"{price_min}+" if price_min else ""
     
     context = {
         "properties": page_obj,  # For backward compatibility
         "page_obj": page_obj,     # For pagination template
-        "cities": cities,
-        "total_count": paginator.count,
+        "cities": sorted_options(facets["city"]),
+        "price_options": price_options(facets["price"]),
+        "bed_options": bed_options(facets["beds"]),
+        "current_price": current_price,
+        "total_count": total_count,
+        "total_count_is_exact": total_count_is_exact,
         "current_filters": {
             "q": q,
             "city": city,
@@ -3239,7 +3206,7 @@ def leads(request: HttpRequest) -> HttpResponse:
     date_range = request.GET.get("date_range", "").strip()
     owner = request.GET.get("owner", "").strip()
     sort = request.GET.get("sort", "-created_at")
-    page = int(request.GET.get("page", 1))
+    cursor = request.GET.get("cursor", "")
     per = min(int(request.GET.get("per", 12)), 48)
     
     # Company-scoped queryset
@@ -3287,19 +3254,22 @@ def leads(request: HttpRequest) -> HttpResponse:
         "email_asc": "email",
         "email_desc": "-email"
     }
-    leads = leads.order_by(sort_options.get(sort, "-created_at"))
     
-    # Pagination
-    paginator = Paginator(leads, per)
-    page_obj = paginator.get_page(page)
+    # Keyset pagination: every page costs the same as the first
+    page_obj = keyset_paginate(
+        leads, sort_options.get(sort, "-created_at"), cursor=cursor, per_page=per,
+        count_cap=django_settings.LIST_PAGE_COUNT_CAP,
+    )
     
-    # Get distinct sources for filter dropdown
-    sources = Lead.objects.values_list("utm_source", flat=True).distinct().order_by("utm_source")
+    # Source dropdown options with counts (precomputed per company)
+    sources = sorted_options(facet_counts.leads(request.company)["utm_source"])
     
     context = {
         "leads": page_obj,
+        "page_obj": page_obj,
         "sources": sources,
-        "total_count": paginator.count,
+        "total_count": page_obj.count,
+        "total_count_is_exact": page_obj.count_is_exact,
         "current_filters": {
             "q": q,
             "source": source,
@@ -4,7 +4,6 @@ Uses OpenAI to validate property descriptions and guide users through missing de
 """
 import os
 import json
-import requests
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_POST
@@ -12,38 +11,20 @@ from django.utils import timezone
 from django.conf import settings
 
 from .models import Property
+from .services_llm import llm_gateway
 
 # OpenAI API configuration - use Django settings
 OPENAI_API_KEY = settings.OPENAI_API_KEY
-OPENAI_BASE_URL = "https://api.openai.com/v1"
 
 
-def call_openai(messages, temperature=0.7):
-    """Call OpenAI API using requests"""
+def call_openai(messages, temperature=0.7, call_site="validation_chat", organization=None):
+    """Call OpenAI through the shared LLM gateway, accounted to ``organization``"""
     if not OPENAI_API_KEY:
         raise Exception("OpenAI API key not configured. Please add OPENAI_API_KEY to your .env file")
     
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "gpt-4o-mini",
-        "messages": messages,
-        "temperature": temperature
-    }
-    
-    response = requests.post(
-        f"{OPENAI_BASE_URL}/chat/completions",
-        headers=headers,
-        json=data
+    return llm_gateway.complete(
+        messages, model="gpt-4o-mini", temperature=temperature, call_site=call_site, organization=organization,
     )
-    
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
-    else:
-        raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
 
 # Load system prompt
 SYSTEM_PROMPT_PATH = "attached_assets/property_validation_system_prompt.txt"
@@ -87,7 +68,7 @@ def init_ai_validation_chat(request: HttpRequest) -> HttpResponse:
             ai_response = call_openai([
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": property_description}
-            ])
+            ], organization=getattr(request, 'organization', None))
             
             # Store conversation
             request.session['validation_chat_history'].append({
@@ -147,7 +128,7 @@ def ai_validation_chat(request: HttpRequest) -> HttpResponse:
     messages.append({"role": "user", "content": user_message})
     
     try:
-        ai_response = call_openai(messages)
+        ai_response = call_openai(messages, organization=getattr(request, 'organization', None))
         
         # Update chat history
         chat_history.append({
@@ -172,7 +153,7 @@ def ai_validation_chat(request: HttpRequest) -> HttpResponse:
             # Auto-save property to database
             try:
                 from django.utils.text import slugify
-                property_data = extract_property_data_from_conversation(chat_history)
+                property_data = extract_property_data_from_conversation(chat_history, getattr(request, 'organization', None))
                 
                 # Validate required fields
                 title = property_data.get('title', 'New Property')
@@ -250,7 +231,7 @@ def ai_validation_chat(request: HttpRequest) -> HttpResponse:
         return JsonResponse({"error": str(e)}, status=500)
 
 
-def extract_property_data_from_conversation(chat_history):
+def extract_property_data_from_conversation(chat_history, organization=None):
     """
     Extract property data from the conversation history
     Uses OpenAI to parse the final complete property details
@@ -284,7 +265,7 @@ Return ONLY the JSON, no other text."""
     try:
         json_str = call_openai([
             {"role": "user", "content": extraction_prompt}
-        ], temperature=0.3).strip()
+        ], temperature=0.3, call_site="validation_chat.extract", organization=organization).strip()
         # Remove markdown code blocks if present
         if json_str.startswith('```'):
             json_str = json_str.split('```')[1]
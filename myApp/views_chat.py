@@ -1,19 +1,30 @@
 """
 Public ChatURL and embeddable widget views
 """
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.templatetags.static import static
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.conf import settings
+import asyncio
 import json
-import openai
+import logging
 import uuid
 import re
 
-from .models import Organization, Lead, Event, PropertyEmbedding, Property
+from .models import Organization, Lead, Event, PropertyEmbedding, Property, Subscription
+from .services_fact_sheets import format_fact_sheets
+from .services_llm import llm_gateway
 from .services_organization import OrganizationService
+from .services_vector import vector_service
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETION_OPTIONS = {'model': 'gpt-4o-mini', 'max_tokens': 500, 'temperature': 0.7}
+CHAT_FALLBACK_RESPONSE = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
 
 
 def public_chat(request, org_slug):
@@ -49,6 +60,7 @@ def public_chat(request, org_slug):
         'is_embedded': is_embedded,
         'chat_url': f'/chat/{org_slug}',
         'api_url': f'/api/chat/ask?org={organization.id}',
+        'stream_url': f'/api/chat/stream/?org={organization.id}',
     }
     
     if is_embedded:
@@ -59,8 +71,14 @@ def public_chat(request, org_slug):
 
 @csrf_exempt
 @require_POST
-def chat_api_ask(request):
-    """API endpoint for chat messages"""
+async def chat_api_ask(request):
+    """API endpoint for chat messages
+    
+    Async so one ASGI worker carries many conversations instead of one
+    blocked thread each. The user-message event, the lead upsert and the
+    query embedding run concurrently; retrieval then reuses that embedding
+    and the completion goes out over the shared connection pool.
+    """
     try:
         org_id = request.GET.get('org')
         message = request.POST.get('message', '').strip()
@@ -69,31 +87,17 @@ def chat_api_ask(request):
         if not org_id or not message:
             return JsonResponse({'error': 'Missing required parameters'}, status=400)
         
-        organization = get_object_or_404(Organization, id=org_id)
-        
-        # Check subscription status
-        try:
-            subscription = organization.subscription
-            if subscription.status not in ['active', 'trialing']:
-                return JsonResponse({'error': 'Service unavailable'}, status=503)
-        except Subscription.DoesNotExist:
+        organization = await aget_object_or_404(Organization, id=org_id)
+        if not await _achat_available(organization):
             return JsonResponse({'error': 'Service unavailable'}, status=503)
         
-        # Log user message event
-        Event.objects.create(
-            organization=organization,
-            kind='chat.message_user',
-            meta={'message': message, 'session_id': session_id}
-        )
-        
-        # Get or create lead
-        lead = get_or_create_lead_from_session(organization, session_id, message)
+        lead, query_embedding = await _abegin_chat(organization, message, session_id)
         
         # Generate AI response
-        response = generate_ai_response(organization, message, lead)
+        response = await agenerate_ai_response(organization, message, query_embedding)
         
         # Log agent response event
-        Event.objects.create(
+        await Event.objects.acreate(
             organization=organization,
             kind='chat.message_agent',
             meta={'response': response, 'session_id': session_id}
@@ -106,7 +110,121 @@ def chat_api_ask(request):
         })
         
     except Exception as e:
+        logger.error(f"Chat request failed: {e}", exc_info=True)
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+
+
+@csrf_exempt
+@require_POST
+async def chat_api_stream(request):
+    """Streaming variant of chat_api_ask using server-sent events
+    
+    Validation errors still come back as JSON with a status code. Otherwise
+    a ``start`` event is flushed before any retrieval work, then one
+    ``token`` event per completion delta and a final ``done`` event, so the
+    widget renders the answer as it is generated instead of after it.
+    """
+    try:
+        org_id = request.GET.get('org')
+        message = request.POST.get('message', '').strip()
+        session_id = request.POST.get('session_id', '')
+        
+        if not org_id or not message:
+            return JsonResponse({'error': 'Missing required parameters'}, status=400)
+        
+        organization = await aget_object_or_404(Organization, id=org_id)
+        if not await _achat_available(organization):
+            return JsonResponse({'error': 'Service unavailable'}, status=503)
+    except Exception as e:
+        logger.error(f"Chat stream request failed: {e}", exc_info=True)
         return JsonResponse({'error': 'Internal server error'}, status=500)
+    
+    response = StreamingHttpResponse(
+        _chat_event_stream(organization, message, session_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    # The widget snippet runs on customer sites; the request carries no credentials
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+def sse_event(event, data):
+    """Encode one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _chat_event_stream(organization, message, session_id):
+    yield sse_event('start', {'session_id': session_id})
+    try:
+        lead, query_embedding = await _abegin_chat(organization, message, session_id)
+        
+        parts = []
+        async for delta in astream_ai_response(organization, message, query_embedding):
+            parts.append(delta)
+            yield sse_event('token', {'text': delta})
+        response = ''.join(parts)
+        
+        # Log agent response event
+        await Event.objects.acreate(
+            organization=organization,
+            kind='chat.message_agent',
+            meta={'response': response, 'session_id': session_id}
+        )
+        yield sse_event('done', {
+            'response': response,
+            'session_id': session_id,
+            'lead_id': str(lead.id) if lead else None
+        })
+    except Exception as e:
+        logger.error(f"Chat stream failed for organization {organization.id}: {e}", exc_info=True)
+        yield sse_event('error', {'error': 'Internal server error'})
+
+
+async def _achat_available(organization):
+    """Whether the organization's subscription allows serving chat"""
+    return await Subscription.objects.filter(
+        organization=organization, status__in=['active', 'trialing']
+    ).aexists()
+
+
+async def _abegin_chat(organization, message, session_id):
+    """
+    Log the user's message, upsert the lead and embed the query concurrently
+    
+    Returns:
+        tuple: (lead or None, query embedding or None)
+    """
+    _, lead, query_embedding = await asyncio.gather(
+        # Log user message event
+        Event.objects.acreate(
+            organization=organization,
+            kind='chat.message_user',
+            meta={'message': message, 'session_id': session_id}
+        ),
+        _aget_or_create_lead(organization, session_id, message),
+        _aembed_message(message),
+    )
+    return lead, query_embedding
+
+
+async def _aget_or_create_lead(organization, session_id, message):
+    """Lead upsert off the event loop; a failure here must not cost the visitor their answer"""
+    try:
+        return await sync_to_async(get_or_create_lead_from_session)(organization, session_id, message)
+    except Exception as e:
+        logger.warning(f"Could not record chat lead for organization {organization.id}: {e}")
+        return None
+
+
+async def _aembed_message(message):
+    """Query embedding for retrieval, or None to let the search embed (or fall back) itself"""
+    try:
+        return await vector_service.aembed_query(message)
+    except Exception as e:
+        logger.warning(f"Async query embedding failed: {e}")
+        return None
 
 
 def embed_widget_js(request, org_slug):
@@ -125,6 +243,9 @@ def embed_widget_js(request, org_slug):
         'org_slug': org_slug,
         'chat_url': f'/chat/{org_slug}',
         'api_url': f'/api/chat/ask?org={organization.id}',
+        # Absolute: the snippet calls these from the customer's page
+        'stream_url': request.build_absolute_uri(f'/api/chat/stream/?org={organization.id}'),
+        'stream_client_url': request.build_absolute_uri(static('js/chat-stream.js')),
         'brand_primary': organization.brand_primary,
         'brand_accent': organization.brand_accent,
         'greeting': organization.chat_greeting
@@ -220,6 +341,36 @@ def embed_widget_js(request, org_slug):
     // Add to page
     document.body.appendChild(widget);
     document.body.appendChild(toggleBtn);
+    
+    // Streaming API for host pages that render answers themselves:
+    // KatekChat.ask(message, {{onToken: function(delta, text) {{}}, onDone: function(data) {{}}}})
+    // One conversation per page view, the same role the chat page's session id plays
+    var sessionId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : Date.now() + '-' + Math.random().toString(16).slice(2);
+    var streamClient = null;
+    function loadStreamClient() {{
+        if (!streamClient) {{
+            streamClient = new Promise(function(resolve, reject) {{
+                if (window.katekStreamChat) return resolve(window.katekStreamChat);
+                var script = document.createElement('script');
+                script.src = config.stream_client_url;
+                script.onload = function() {{ resolve(window.katekStreamChat); }};
+                script.onerror = reject;
+                document.head.appendChild(script);
+            }});
+        }}
+        return streamClient;
+    }}
+    window.KatekChat = {{
+        open: function() {{ widget.style.display = 'block'; toggleBtn.style.display = 'none'; }},
+        close: function() {{ widget.style.display = 'none'; toggleBtn.style.display = 'flex'; }},
+        ask: function(message, handlers) {{
+            return loadStreamClient().then(function(streamChat) {{
+                return streamChat(config.stream_url, {{message: message, session_id: sessionId}}, handlers);
+            }});
+        }}
+    }};
+    // Fetch the client while the page is idle so the first question does not wait for it
+    setTimeout(loadStreamClient, 0);
 }})();
 """
     
@@ -266,73 +417,98 @@ def generate_ai_response(organization, message, lead):
         # Get relevant properties using vector search
         relevant_properties = search_properties_by_message(organization, message)
         
-        # Build context from properties
-        context = build_property_context(relevant_properties)
-        
-        # Build persona prompt
-        persona_prompt = build_persona_prompt(organization, context)
-        
         # Generate response using OpenAI
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": persona_prompt},
-                {"role": "user", "content": message}
-            ],
-            max_tokens=500,
-            temperature=0.7
+        return llm_gateway.complete(
+            build_chat_messages(organization, message, relevant_properties),
+            organization=organization,
+            call_site="chat.widget",
+            **CHAT_COMPLETION_OPTIONS
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
-        return f"I'm sorry, I'm having trouble processing your request right now. Please try again later."
+        return CHAT_FALLBACK_RESPONSE
 
 
-def search_properties_by_message(organization, message):
-    """Search for relevant properties using vector similarity"""
+async def agenerate_ai_response(organization, message, query_embedding=None):
+    """generate_ai_response() for async views, reusing an already computed query embedding"""
     try:
-        # Generate embedding for the message
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Vector search is in-process and the ORM is sync; run both off the event loop
+        relevant_properties = await sync_to_async(search_properties_by_message)(
+            organization, message, query_embedding
+        )
         
-        embedding_response = client.embeddings.create(
-            model=settings.EMBEDDING_MODEL,
-            input=message
+        return await llm_gateway.acomplete(
+            build_chat_messages(organization, message, relevant_properties),
+            organization=organization,
+            call_site="chat.widget",
+            **CHAT_COMPLETION_OPTIONS
         )
         
-        query_embedding = embedding_response.data[0].embedding
+    except Exception as e:
+        logger.warning(f"Chat completion failed for organization {organization.id}: {e}")
+        return CHAT_FALLBACK_RESPONSE
+
+
+async def astream_ai_response(organization, message, query_embedding=None):
+    """Yield completion text as it arrives; a failure before the first delta yields the fallback reply"""
+    streamed = False
+    try:
+        relevant_properties = await sync_to_async(search_properties_by_message)(
+            organization, message, query_embedding
+        )
         
-        # For now, return active properties (vector search will be implemented with pgvector)
-        return Property.objects.filter(
+        async for delta in llm_gateway.astream(
+            build_chat_messages(organization, message, relevant_properties),
             organization=organization,
-            is_active=True
-        )[:5]
+            call_site="chat.widget_stream",
+            **CHAT_COMPLETION_OPTIONS
+        ):
+            streamed = True
+            yield delta
         
     except Exception as e:
-        return Property.objects.filter(
-            organization=organization,
-            is_active=True
-        )[:5]
+        logger.warning(f"Streaming chat completion failed for organization {organization.id}: {e}")
+        if not streamed:
+            yield CHAT_FALLBACK_RESPONSE
 
 
-def build_property_context(properties):
-    """Build context string from properties"""
-    if not properties:
-        return "No properties are currently available."
-    
-    context_parts = []
-    for prop in properties:
-        context_parts.append(f"""
-Property: {prop.title}
-Location: {prop.city}, {prop.area}
-Price: ${prop.price_amount:,}
-Details: {prop.beds} bed, {prop.baths} bath, {prop.floor_area_sqm} sqm
-Description: {prop.description[:200]}...
-        """.strip())
+def build_chat_messages(organization, message, properties):
+    """System prompt (persona plus property context) and the user's message"""
+    persona_prompt = build_persona_prompt(organization, build_property_context(properties))
+    return [
+        {"role": "system", "content": persona_prompt},
+        {"role": "user", "content": message}
+    ]
+
+
+def search_properties_by_message(organization, message, query_embedding=None):
+    """Search for relevant properties using vector similarity
     
-    return "\n\n".join(context_parts)
+    Constraints stated in the message (city, beds, budget) are applied as
+    pre-filters inside the vector index; archived listings never surface.
+    """
+    from .views import process_ai_search_prompt
+    constraints = process_ai_search_prompt(message)
+    filters = {
+        'city': constraints.get('city') or None,
+        'beds_min': constraints.get('beds'),
+        'price_max': constraints.get('price_max'),
+        'is_active': True,
+    }
+    properties = vector_service.search_similar_properties(
+        organization, message, limit=5, filters=filters, query_embedding=query_embedding
+    )
+    if properties or not any(filters[key] for key in ('city', 'beds_min', 'price_max')):
+        return properties
+    # Nothing meets every stated constraint; offer the closest active listings instead
+    return vector_service.search_similar_properties(
+        organization, message, limit=5, filters={'is_active': True}, query_embedding=query_embedding
+    )
+
+
+def build_property_context(properties):
+    """Build context string from the properties' fact sheets"""
+    return format_fact_sheets(properties)
 
 
 def build_persona_prompt(organization, context):
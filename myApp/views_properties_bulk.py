@@ -10,6 +10,12 @@ import csv
 import json
 
 from .models import Property, Company, HiddenProperty
+from .services_facets import facet_counts, price_bucket_filter
+from .services_fact_sheets import area_summaries
+from .services_filter_index import filter_index_registry
+from .services_index_worker import record_property_changes
+from .services_page_cache import page_cache
+from .services_search import search_engine
 
 
 def get_company(request: HttpRequest) -> Company:
@@ -75,7 +81,18 @@ def bulk_properties_action(request: HttpRequest) -> JsonResponse:
         
         elif action == 'archive':
             # Archive properties (set is_active=False)
-            properties.update(is_active=False)
+            archived = {}
+            for property_id, organization_id in properties.values_list('id', 'organization_id'):
+                archived.setdefault(organization_id, []).append(property_id)
+            properties.update(is_active=False, updated_at=timezone.now())
+            # update() skips post_save: queue the change and drop the cached indexes, facet counts and area summaries here
+            for organization_id, property_ids in archived.items():
+                record_property_changes(organization_id, property_ids)
+                search_engine.invalidate(organization_id)
+                filter_index_registry.invalidate(organization_id)
+                facet_counts.invalidate(('properties', str(organization_id)), ('public', None))
+                area_summaries.invalidate(organization_id)
+                page_cache.invalidate(property_ids)
             return JsonResponse({
                 'success': True,
                 'message': f'Archived {count} property(ies)'
@@ -119,14 +136,10 @@ def export_properties(request: HttpRequest) -> HttpResponse:
                 pass
         
         if price_range:
-            if price_range == '0-300000':
-                properties = properties.filter(price_amount__lte=300000)
-            elif price_range == '300000-500000':
-                properties = properties.filter(price_amount__gte=300000, price_amount__lte=500000)
-            elif price_range == '500000-1000000':
-                properties = properties.filter(price_amount__gte=500000, price_amount__lte=1000000)
-            elif price_range == '1000000+':
-                properties = properties.filter(price_amount__gte=1000000)
+            # Same buckets as the facet counts on the properties page
+            price_filter = price_bucket_filter(price_range)
+            if price_filter is not None:
+                properties = properties.filter(price_filter)
         
         # Exclude hidden properties for current user
         if request.user.is_authenticated:
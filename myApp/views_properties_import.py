@@ -17,6 +17,7 @@ import logging
 
 from .models import Property, PropertyUpload, Company
 from .forms import PropertyUploadForm, PropertyForm
+from .services_llm import llm_gateway
 from .utils.cloudinary_utils import upload_to_cloudinary
 
 logger = logging.getLogger(__name__)
@@ -273,14 +274,16 @@ def import_ai(request: HttpRequest) -> HttpResponse:
             }, status=400)
         
         # Create PropertyUpload
+        organization = getattr(request, 'organization', None)
         upload = PropertyUpload.objects.create(
             company=company,
+            organization=organization,
             status='uploading',
             description=property_text[:5000]  # Limit length
         )
         
         # Extract data using lightweight extraction
-        extracted_data = extract_property_data(property_text)
+        extracted_data = extract_property_data(property_text, organization)
         
         upload.title = extracted_data.get('title') or 'Untitled Property'
         upload.price_amount = extracted_data.get('price_amount')
@@ -415,6 +418,7 @@ def import_csv(request: HttpRequest) -> HttpResponse:
                 # Extract data from row
                 upload_data = {
                     'company': company,
+                    'organization': getattr(request, 'organization', None),
                     'status': 'uploading',
                     'title': str(row.get(normalized_columns.get('title', ''), '')).strip() if normalized_columns.get('title') else None,
                     'description': str(row.get(normalized_columns.get('description', ''), '')).strip() if normalized_columns.get('description') else '',
@@ -747,14 +751,14 @@ def import_success(request: HttpRequest, property_id: str) -> HttpResponse:
 
 # Helper functions
 
-def extract_property_data(text: str) -> dict:
-    """Extract property data from text using OpenAI if available, fallback to regex"""
+def extract_property_data(text: str, organization=None) -> dict:
+    """Extract property data from text using OpenAI if available, fallback to regex
+
+    The OpenAI call is accounted to ``organization`` for usage and concurrency limits.
+    """
     # Try OpenAI extraction first if API key is available
     if settings.OPENAI_API_KEY:
         try:
-            import openai
-            client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            
             extraction_prompt = f"""Extract property information from this real estate listing text. Return ONLY a valid JSON object with no additional text or markdown.
 
 Property Text:
@@ -780,17 +784,19 @@ Instructions:
 - Title should be concise and descriptive
 - Return ONLY valid JSON, no markdown code blocks"""
 
-            response = client.chat.completions.create(
+            response = llm_gateway.complete(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are a real estate data extraction assistant. Extract property information from text and return ONLY valid JSON."},
                     {"role": "user", "content": extraction_prompt}
                 ],
+                organization=organization,
+                call_site="import.extract",
                 temperature=0.3,
                 max_tokens=500
             )
             
-            json_str = response.choices[0].message.content.strip()
+            json_str = response.strip()
             
             # Remove markdown code blocks if present
             if json_str.startswith('```'):
@@ -1058,9 +1064,6 @@ def enrich_property_with_ai(upload: PropertyUpload):
         return
     
     try:
-        import openai
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        
         # Build property context
         property_context = {
             'title': upload.title or 'Untitled Property',
@@ -1101,17 +1104,19 @@ Return ONLY a valid JSON object with these fields:
 
 Return ONLY valid JSON, no markdown code blocks."""
         
-        response = client.chat.completions.create(
+        response = llm_gateway.complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are a real estate data enrichment assistant. Generate detailed property information in JSON format."},
                 {"role": "user", "content": enrichment_prompt}
             ],
+            organization=upload.organization_id,
+            call_site="import.enrich",
             temperature=0.7,
             max_tokens=800
         )
         
-        json_str = response.choices[0].message.content.strip()
+        json_str = response.strip()
         
         # Remove markdown code blocks if present
         if json_str.startswith('```'):
@@ -6,6 +6,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.conf import settings
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 import hmac
 import hashlib
 import json
@@ -14,6 +16,8 @@ import re
 import requests
 from email.utils import parseaddr
 
+from .utils.query_budget import query_budget
+
 logger = logging.getLogger(__name__)
 
 
@@ -393,6 +397,7 @@ def n8n_fail(request):
 
 
 @csrf_exempt
+@query_budget(max_queries=10)
 def n8n_due_messages(request):
     """Return a small list of due messages not yet sent (safety sweep).
     For MVP, we include immediate first steps (delay_hours == 0) not yet sent.
@@ -406,15 +411,38 @@ def n8n_due_messages(request):
         from .models import Campaign, CampaignStep, Lead, MessageLog
         due = []
 
-        active_campaigns = Campaign.objects.filter(status='active')
+        active_campaigns = Campaign.objects.filter(status='active').select_related('organization').prefetch_related(
+            Prefetch('steps', queryset=CampaignStep.objects.order_by('order'))
+        )
+        due_campaigns = []
         for campaign in active_campaigns:
-            first_step = CampaignStep.objects.filter(campaign=campaign).order_by('order').first()
+            first_step = next(iter(campaign.steps.all()), None)
             if not first_step or (hasattr(first_step, 'delay_hours') and first_step.delay_hours > 0):
                 continue
-            leads = Lead.objects.filter(organization=campaign.organization, email__isnull=False).exclude(email='')
-            for lead in leads[:50]:  # limit to keep response small
-                already_sent = MessageLog.objects.filter(campaign=campaign, campaign_step=first_step, lead=lead, status='sent').exists()
-                if not already_sent:
+            due_campaigns.append((campaign, first_step))
+
+        # First 50 leads of each organization (limit to keep response small) in one query
+        leads_by_organization = {}
+        if due_campaigns:
+            leads = Lead.objects.filter(
+                organization__in={campaign.organization_id for campaign, _ in due_campaigns},
+                email__isnull=False,
+            ).exclude(email='').annotate(
+                organization_rank=Window(RowNumber(), partition_by=F('organization'), order_by=F('created_at').desc())
+            ).filter(organization_rank__lte=50)
+            for lead in leads:
+                leads_by_organization.setdefault(lead.organization_id, []).append(lead)
+
+        # Every (step, lead) pair already sent, instead of an exists() per lead per campaign
+        sent = set(MessageLog.objects.filter(
+            campaign_step__in=[first_step for _, first_step in due_campaigns],
+            lead__in=[lead for leads in leads_by_organization.values() for lead in leads],
+            status='sent',
+        ).values_list('campaign_id', 'campaign_step_id', 'lead_id')) if leads_by_organization else set()
+
+        for campaign, first_step in due_campaigns:
+            for lead in leads_by_organization.get(campaign.organization_id, []):
+                if (campaign.id, first_step.id, lead.id) not in sent:
                     due.append({
                         'message_log_id': '',
                         'campaign_id': str(campaign.id),
@@ -71,11 +71,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'myApp.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'allauth.account.middleware.AccountMiddleware',
+    'allauth.account.middleware.AccountMiddleware',  # sync-only; allauth requires this exact path
     'myApp.middleware_organization.OrganizationContextMiddleware',
     'myApp.middleware_organization.OrganizationRequiredMiddleware',
     'myApp.middleware_organization.OrganizationPermissionsMiddleware',
@@ -108,6 +109,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'myProject.wsgi.application'
+TEST_RUNNER = 'myApp.test_runner.TestRunner'
+# Served by daphne (`daphne myProject.asgi:application`) so async views such as chat_api_ask share one event loop.
+# Under gunicorn/WSGI they still work, but each request runs its own loop (and HTTP pool, closed with the loop).
+ASGI_APPLICATION = 'myProject.asgi.application'
 
 
 # Database
@@ -185,7 +190,7 @@ else:
     STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 
 # WhiteNoise middleware for serving static files in production
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')  # right after SecurityMiddleware
+MIDDLEWARE.insert(1, 'myApp.middleware.WhiteNoiseMiddleware')  # right after SecurityMiddleware; WhiteNoise with an async path
 
 # Storage configuration
 STORAGES = {
@@ -256,8 +261,100 @@ AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY', '')
 AWS_SES_REGION = os.getenv('AWS_SES_REGION', 'us-east-1')
 
 # Vector Database Configuration
-VECTOR_DIMENSIONS = 1536  # OpenAI text-embedding-3-small
-EMBEDDING_MODEL = 'text-embedding-3-small'
+# Embedding backend (myApp/services_embeddings.py): openai, local, http or hashing
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'openai')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+VECTOR_DIMENSIONS = int(os.getenv('VECTOR_DIMENSIONS', '1536'))  # text-embedding-3-small is natively 1536
+EMBEDDING_HTTP_URL = os.getenv('EMBEDDING_HTTP_URL', 'http://localhost:8080/v1/embeddings')
+EMBEDDING_HTTP_TIMEOUT = float(os.getenv('EMBEDDING_HTTP_TIMEOUT', '30'))
+EMBEDDING_LOCAL_DEVICE = os.getenv('EMBEDDING_LOCAL_DEVICE', '')  # e.g. cpu, cuda; empty lets the library pick
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv('EMBEDDING_LOCAL_BATCH_SIZE', '64'))
+EMBEDDING_STORAGE_DTYPE = os.getenv('EMBEDDING_STORAGE_DTYPE', 'float32')  # float32, float16 or int8
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', '100000'))  # API cap is 300k per request
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv('EMBEDDING_BATCH_MAX_INPUTS', '512'))  # API cap is 2048 per request
+EMBEDDING_BATCH_MAX_RETRIES = int(os.getenv('EMBEDDING_BATCH_MAX_RETRIES', '3'))
+EMBEDDING_CHUNK_MAX_TOKENS = int(os.getenv('EMBEDDING_CHUNK_MAX_TOKENS', '384'))  # Most listings fit in one chunk
+
+# In-process ANN index (myApp/services_vector_index.py)
+VECTOR_INDEX_IVF_MIN_ROWS = int(os.getenv('VECTOR_INDEX_IVF_MIN_ROWS', '4096'))  # Below this, exact flat search
+VECTOR_INDEX_NPROBE = int(os.getenv('VECTOR_INDEX_NPROBE', '16'))
+VECTOR_INDEX_REFRESH_SECONDS = int(os.getenv('VECTOR_INDEX_REFRESH_SECONDS', '30'))  # Staleness check interval
+# When set, indexes are persisted as per-org mmap shards here and shared by all workers via the page cache
+VECTOR_SHARD_DIR = os.getenv('VECTOR_SHARD_DIR', '')
+
+# Property change outbox drained by `manage.py process_index_events` (myApp/services_index_worker.py)
+INDEX_EVENT_BATCH_SIZE = int(os.getenv('INDEX_EVENT_BATCH_SIZE', '500'))
+INDEX_EVENT_MAX_ATTEMPTS = int(os.getenv('INDEX_EVENT_MAX_ATTEMPTS', '5'))
+INDEX_EVENT_CLAIM_SECONDS = int(os.getenv('INDEX_EVENT_CLAIM_SECONDS', '900'))  # A crashed worker's batch is picked up again after this
+INDEX_EVENT_RETRY_BASE_SECONDS = int(os.getenv('INDEX_EVENT_RETRY_BASE_SECONDS', '30'))  # Failed events wait this long, doubling per attempt
+INDEX_EVENT_RETRY_MAX_SECONDS = int(os.getenv('INDEX_EVENT_RETRY_MAX_SECONDS', '3600'))
+
+# Query embedding cache (myApp/services_query_cache.py)
+QUERY_EMBEDDING_CACHE_MAX_BYTES = int(os.getenv('QUERY_EMBEDDING_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL_SECONDS', str(24 * 60 * 60)))
+QUERY_EMBEDDING_CACHE_ALIAS = os.getenv('QUERY_EMBEDDING_CACHE_ALIAS', '')  # Optional shared Django cache alias
+
+# Answers to property Q&A (myApp/services_response_cache.py)
+PROPERTY_RESPONSE_CACHE_MAX_PROPERTIES = int(os.getenv('PROPERTY_RESPONSE_CACHE_MAX_PROPERTIES', '2000'))
+PROPERTY_RESPONSE_CACHE_MAX_PER_PROPERTY = int(os.getenv('PROPERTY_RESPONSE_CACHE_MAX_PER_PROPERTY', '64'))
+PROPERTY_RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('PROPERTY_RESPONSE_CACHE_TTL_SECONDS', str(24 * 60 * 60)))
+PROPERTY_RESPONSE_CACHE_SIMILARITY = float(os.getenv('PROPERTY_RESPONSE_CACHE_SIMILARITY', '0.92'))  # Cosine; 1.0 disables semantic hits
+PROPERTY_RESPONSE_CACHE_ALIAS = os.getenv('PROPERTY_RESPONSE_CACHE_ALIAS', '')  # Optional shared Django cache alias
+
+# Property fact sheets (myApp/services_fact_sheets.py)
+AREA_SUMMARY_TTL_SECONDS = int(os.getenv('AREA_SUMMARY_TTL_SECONDS', '600'))  # Per-city comparables cache
+
+# Server-side chat transcripts (myApp/services_conversations.py)
+CONVERSATION_MAX_TURNS = int(os.getenv('CONVERSATION_MAX_TURNS', '200'))  # Older turns are pruned
+CONVERSATION_MAX_TURN_CHARS = int(os.getenv('CONVERSATION_MAX_TURN_CHARS', '4000'))  # Longer messages are truncated
+CONVERSATION_WINDOW_TURNS = int(os.getenv('CONVERSATION_WINDOW_TURNS', '20'))  # Default read window
+
+# Katalyst chat webhook relay (myApp/services_webhook_relay.py)
+KATALYST_CHAT_WEBHOOK_URL = os.getenv('KATALYST_CHAT_WEBHOOK_URL', 'https://katalyst-crm.fly.dev/webhook/ca05d7c5-984c-4d95-8636-1ed3d80f5545')
+WEBHOOK_RELAY_TIMEOUT = float(os.getenv('WEBHOOK_RELAY_TIMEOUT', '10'))
+WEBHOOK_RELAY_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_RELAY_MAX_CONCURRENCY', '20'))  # In-flight calls per upstream host, per process
+WEBHOOK_RELAY_QUEUE_TIMEOUT = float(os.getenv('WEBHOOK_RELAY_QUEUE_TIMEOUT', '2'))  # Wait for a slot before answering "busy"
+
+# Hybrid property search (myApp/services_search.py)
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', '30'))  # Row-count staleness check interval
+SEARCH_INDEX_MAX_AGE_SECONDS = int(os.getenv('SEARCH_INDEX_MAX_AGE_SECONDS', '300'))  # Rebuild to pick up in-place edits
+SEARCH_PREFIX_EXPANSIONS = 20  # Vocabulary terms a partial word may expand to
+SEARCH_VECTOR_CANDIDATES = 50  # Vector hits fused with BM25 per query
+SEARCH_MAX_RESULTS = 500  # Cap for ranked dashboard searches
+LIST_PAGE_COUNT_CAP = int(os.getenv('LIST_PAGE_COUNT_CAP', '1000'))  # Totals above this show as "1,000+"
+
+# Filter dropdown facet counts (myApp/services_facets.py)
+FACET_TTL_SECONDS = int(os.getenv('FACET_TTL_SECONDS', '300'))  # Rebuild to pick up other workers' writes
+
+# Public property page fragments (myApp/services_page_cache.py)
+PAGE_CACHE_ALIAS = os.getenv('PAGE_CACHE_ALIAS', 'default')  # Use a shared cache so invalidations reach every worker
+PAGE_CACHE_TTL_SECONDS = int(os.getenv('PAGE_CACHE_TTL_SECONDS', '3600'))
+
+# Per-request query budgets and N+1 detection (myApp/utils/query_budget.py)
+# raise | log | off; myApp.test_runner.TestRunner sets 'raise' for manage.py test
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'log' if DEBUG else 'off')
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '50'))  # Queries per request for views without @query_budget
+QUERY_BUDGET_MAX_REPEATS = int(os.getenv('QUERY_BUDGET_MAX_REPEATS', '10'))  # Executions of one query shape before flagging N+1
+
+# Shared async HTTP client for ASGI views (myApp/services_http.py)
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', '100'))
+ASYNC_HTTP_MAX_KEEPALIVE = int(os.getenv('ASYNC_HTTP_MAX_KEEPALIVE', '20'))
+ASYNC_HTTP_TIMEOUT = float(os.getenv('ASYNC_HTTP_TIMEOUT', '30'))
+ASYNC_HTTP_CONNECT_TIMEOUT = float(os.getenv('ASYNC_HTTP_CONNECT_TIMEOUT', '5'))
+
+# LLM gateway (myApp/services_llm.py)
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))  # Per attempt
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '8'))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv('LLM_RETRY_BUDGET_RATIO', '0.2'))  # Retries allowed per request, sustained
+LLM_RETRY_BUDGET_CAPACITY = int(os.getenv('LLM_RETRY_BUDGET_CAPACITY', '20'))  # Burst of retries allowed
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30'))
+LLM_ORG_MAX_CONCURRENCY = int(os.getenv('LLM_ORG_MAX_CONCURRENCY', '8'))  # In-flight calls per organization, per process
+LLM_ORG_QUEUE_TIMEOUT = float(os.getenv('LLM_ORG_QUEUE_TIMEOUT', '5'))  # Wait for a slot before failing fast
+LLM_USAGE_FLUSH_EVERY = int(os.getenv('LLM_USAGE_FLUSH_EVERY', '50'))  # Pending calls that trigger a usage flush
+LLM_USAGE_FLUSH_SECONDS = float(os.getenv('LLM_USAGE_FLUSH_SECONDS', '60'))  # Max age of unflushed usage
 
 # Social Media Integration
 FACEBOOK_VERIFY_TOKEN = os.getenv('FACEBOOK_VERIFY_TOKEN', 'your-facebook-verify-token')